@@ -0,0 +1,56 @@
+"""
+Operator endpoints for diagnosing a running worker
+"""
+import hmac
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from config import Config
+from loop_monitor import loop_monitor
+from profiler import profiler, ProfilerBusy, SamplingProfiler
+import logging
+
+logger = logging.getLogger(__name__)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Fails closed: without ADMIN_TOKEN every request is refused, unless ADMIN_OPEN is on"""
+    if not Config.ADMIN_TOKEN:
+        if Config.ADMIN_OPEN:
+            return
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest(x_admin_token or "", Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/event-loop")
+async def event_loop_stats():
+    """Event-loop lag and the call sites that blocked it"""
+    return JSONResponse(loop_monitor.get_stats())
+
+@router.post("/event-loop/reset")
+async def reset_event_loop_stats():
+    """Clear collected stalls, e.g. after deploying a fix"""
+    loop_monitor.reset()
+    return JSONResponse({"status": "reset"})
+
+@router.post("/profile")
+async def run_profile(seconds: float = 10, rate: int = 100, include_idle: bool = False, format: str = "collapsed"):
+    """Sample all threads for `seconds`; collapsed stacks by default, JSON summary with format=json"""
+    if profiler.busy:
+        return JSONResponse({"error": "A profile is already running"}, status_code=409)
+    try:
+        result = await asyncio.to_thread(profiler.profile, seconds, rate, include_idle)
+    except ProfilerBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    logger.info(f"[PROFILER] {result['samples']} samples, overhead {result['overhead_pct']}%")
+    
+    if format == "json":
+        stacks = result.pop("stacks")
+        result["top_stacks"] = [
+            {"stack": ";".join(stack), "samples": count} for stack, count in stacks.most_common(20)
+        ]
+        return JSONResponse(result)
+    
+    return PlainTextResponse(SamplingProfiler.to_collapsed(result["stacks"]))
@@ -1,25 +1,46 @@
 """
 WebSocket-based Realtime API with Dynamic RAG
 """
-import os
 import asyncio
 import json
 import base64
+import time
+from typing import Optional
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel
 import websockets
 from dotenv import load_dotenv
 from rag_service import DynamicRAG
 from config import Config
 from monitoring import metrics
 from resilience import retry_async, azure_circuit, init_circuit_breakers
-from cost_tracker import CostTracker
-from conversation_logger import ConversationLogger
+from cost_tracker import CostTracker, prompt_cache_stats
+from cost_ledger import cost_ledger
+from conversation_logger import ConversationLogger, find_orphaned_journals
+from persistence import persistence
+from session_index import session_index
+from cost_rollups import summarize_rollups
+from archive import ArchiveCompactor, read_session
+from session_manager import session_registry, IdleReaper, is_client_activity
+from turn_timeline import TurnTimeline
+from token_profiler import TokenProfiler, composition_by_kb, get_encoding, instruction_tokens
+from session_config import build_session_config, build_farewell_events
+from session_budget import SessionBudget, EXHAUSTED, parse_steps
+from text_qa import TextAnswerer
+from audio_gate import SilenceGate
+from barge_in import ResponseTracker
+from prometheus_exporter import PrometheusExporter, CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from slo import evaluate_slos
+from loop_monitor import loop_monitor
+from admin_api import router as admin_router
+from export_api import router as export_router
+from log_pipeline import setup_logging, session_id_var
 import logging
 import uuid
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv('.env')
@@ -35,35 +56,81 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(admin_router)
+app.include_router(export_router)
 
 rag = None  # Lazy load
+answerer = None  # Lazy load
+idle_reaper = IdleReaper(session_registry, Config.SESSION_IDLE_TIMEOUT, Config.IDLE_REAPER_INTERVAL)
+archive_compactor = ArchiveCompactor(
+    session_index, "conversations", Config.ARCHIVE_DIR, Config.ARCHIVE_COMPACT_AFTER,
+    Config.ARCHIVE_RETENTION_DAYS, Config.ARCHIVE_SEGMENT_SESSIONS
+)
+prometheus_exporter = PrometheusExporter(metrics, session_registry, Config.PROMETHEUS_CACHE_SECONDS)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    idle_reaper.start()
+    persistence.start()
+    # Load the tokenizer (may download its BPE file) before the first session needs it
+    await asyncio.to_thread(get_encoding)
+    await asyncio.to_thread(instruction_tokens)
+    if await asyncio.to_thread(session_index.count) == 0:
+        await asyncio.to_thread(session_index.rebuild, "conversations", Config.ARCHIVE_DIR)  # first start with existing files
+    orphans = await asyncio.to_thread(find_orphaned_journals, Config.JOURNAL_DIR, older_than=Config.JOURNAL_RECOVER_AFTER)
+    for document, filepath, journal in orphans:
+        logger.warning(f"[CONVO] Recovering session {document['session_id']} from its journal")
+        persistence.submit(document, filepath, journal)
+    archive_compactor.start(Config.ARCHIVE_INTERVAL)
+    cost_ledger.load()
+    cost_ledger.start(Config.COST_LEDGER_FLUSH_INTERVAL)
+    if Config.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await idle_reaper.stop()
+    await loop_monitor.stop()
+    await cost_ledger.stop()
+    await archive_compactor.stop()
+    await persistence.stop()
 
 def get_rag():
     global rag
     if rag is None:
         try:
-            metrics.start_timer("rag_init")
-            rag = DynamicRAG()
-            metrics.end_timer("rag_init")
+            with metrics.timer("rag_init"):
+                rag = DynamicRAG()
         except Exception as e:
             logger.error(f"Failed to initialize RAG: {e}")
             metrics.record_error("rag_init_failed")
             raise
     return rag
 
-async def connect_to_azure_realtime(kb_id: str):
+def get_answerer():
+    global answerer
+    if answerer is None:
+        try:
+            answerer = TextAnswerer()
+        except Exception as e:
+            logger.error(f"Failed to initialize text answerer: {e}")
+            metrics.record_error("answerer_init_failed")
+            raise
+    return answerer
+
+async def connect_to_azure_realtime(kb_id: str, deployment: str = None):
     """Connect to Azure OpenAI Realtime API via WebSocket with retry"""
-    url = f"wss://{Config.AZURE_RESOURCE}.openai.azure.com/openai/realtime?api-version=2024-10-01-preview&deployment={Config.AZURE_OPENAI_DEPLOYMENT_NAME}"
+    deployment = deployment or Config.AZURE_OPENAI_DEPLOYMENT_NAME
+    url = f"wss://{Config.AZURE_RESOURCE}.openai.azure.com/openai/realtime?api-version=2024-10-01-preview&deployment={deployment}"
     headers = {"api-key": Config.AZURE_OPENAI_API_KEY}
     
     async def _connect():
         try:
-            metrics.start_timer("azure_connect")
-            conn = await asyncio.wait_for(
-                websockets.connect(url, extra_headers=headers, ping_interval=20, ping_timeout=10),
-                timeout=Config.AZURE_CONNECTION_TIMEOUT
-            )
-            metrics.end_timer("azure_connect")
+            with metrics.timer("azure_connect"):
+                conn = await asyncio.wait_for(
+                    websockets.connect(url, extra_headers=headers, ping_interval=20, ping_timeout=10),
+                    timeout=Config.AZURE_CONNECTION_TIMEOUT
+                )
             metrics.increment("azure_connections")
             return conn
         except asyncio.TimeoutError:
@@ -91,8 +158,11 @@ async def connect_to_azure_realtime(kb_id: str):
 async def websocket_endpoint(websocket: WebSocket):
     azure_ws = None
     session_id = str(uuid.uuid4())
+    session_id_var.set(session_id)
     cost_tracker = None
     convo_logger = None
+    session = None
+    audio_gate = None
     
     try:
         await websocket.accept()
@@ -105,131 +175,100 @@ async def websocket_endpoint(websocket: WebSocket):
         
         logger.info(f"[WS] KB ID: {kb_id}")
         
+        # Fleet budget: refuse the session or fall back to the economy profile
+        deployment = Config.AZURE_OPENAI_DEPLOYMENT_NAME
+        prices = None
+        max_output_tokens = None
+        if cost_ledger.over_budget():
+            if Config.COST_BUDGET_ACTION == "economy":
+                metrics.increment("sessions_economy", labels={"kb_id": kb_id})
+                max_output_tokens = Config.ECONOMY_MAX_OUTPUT_TOKENS
+                if Config.AZURE_OPENAI_ECONOMY_DEPLOYMENT:
+                    deployment = Config.AZURE_OPENAI_ECONOMY_DEPLOYMENT
+                    prices = CostTracker.ECONOMY_PRICES
+                logger.warning(f"[BUDGET] Over budget, session {session_id} uses economy profile ({deployment})")
+            else:
+                metrics.increment("sessions_refused_budget", labels={"kb_id": kb_id})
+                logger.warning(f"[BUDGET] Over budget, refusing session {session_id}")
+                await websocket.send_json({"error": "The assistant is busy right now, please try again later"})
+                return
+        
         # Initialize cost tracker and conversation logger
-        cost_tracker = CostTracker(session_id)
+        metrics.increment("sessions_started", labels={"kb_id": kb_id})
+        cost_tracker = CostTracker(session_id, kb_id, deployment, prices)
+        budget = SessionBudget(
+            session_id,
+            max_usd=Config.SESSION_BUDGET_USD,
+            max_tokens=Config.SESSION_BUDGET_TOKENS,
+            steps=parse_steps(Config.SESSION_BUDGET_STEPS),
+            max_output_tokens=max_output_tokens
+        )
         convo_logger = ConversationLogger(session_id, kb_id)
+        session = session_registry.register(session_id, kb_id)
+        session.budget = budget
+        timeline = TurnTimeline(session_id)
+        token_profiler = TokenProfiler(session_id, kb_id)
+        responses = ResponseTracker(session_id, Config.AUDIO_SAMPLE_RATE)
+        if Config.AUDIO_GATE_ENABLED:
+            audio_gate = SilenceGate(
+                sample_rate=Config.AUDIO_SAMPLE_RATE,
+                rms_threshold=Config.AUDIO_GATE_RMS_THRESHOLD,
+                max_zcr=Config.AUDIO_GATE_MAX_ZCR,
+                preroll_ms=Config.AUDIO_GATE_PREROLL_MS,
+                hangover_ms=Config.AUDIO_GATE_HANGOVER_MS,
+                tokens_per_second=Config.AUDIO_INPUT_TOKENS_PER_SECOND
+            )
         logger.info(f"[SESSION] Started tracking for {session_id}")
         
         # Connect to Azure with error handling
         try:
-            azure_ws = await connect_to_azure_realtime(kb_id)
+            azure_ws = await connect_to_azure_realtime(kb_id, deployment)
             logger.info("[WS] Connected to Azure Realtime API")
+            metrics.record_event("session_connect")
         except Exception as e:
             logger.error(f"Azure connection failed: {e}")
             metrics.record_error("azure_connection_error")
+            metrics.record_event("session_connect", ok=False)
             await websocket.send_json({"error": f"Azure connection failed: {str(e)}"})
             await websocket.close(code=1011)
             return
         
         # Configure session
-        session_config = {
-            "type": "session.update",
-            "session": {
-                "instructions":"""CRITICAL: You MUST ALWAYS call the search_knowledge_base function for EVERY question about myCoach, Shriram Finance, or Shriram Group. NEVER answer from memory or the instructions below. ALWAYS search FIRST, then answer based on search results.
-
-You are myCoach Assistant at the 10-year myCoach Celebration Event for Shriram Group.
-
-EVENT CONTEXT: This is myCoach's 10th anniversary celebration. You help visitors learn about myCoach, Shriram Finance, and the entire Shriram Group.
-
-LANGUAGE: Respond ONLY in English , Tamil , Telugu and Hindi . Based on the input of the language you get
-
-PERSONALITY: Enthusiastic event guide. Knowledgeable about myCoach, Shriram Finance, and Shriram Group. Proud of the 10-year milestone. Helpful and engaging.
-
-TONE: Warm, celebratory, and conversational. Professional but approachable. Energetic for the event.
-
-LENGTH: Keep responses SHORT - 2-3 sentences per turn. Expand only when asked. Never overwhelm.
-
-PRONUNCIATIONS (CRITICAL for voice):
-- "myCoach" as "my coach" (two words)
-- "Shriram" as "SHREE-ram" (emphasize first syllable)
-- "lakh" as "lack" (Indian numbering: 100,000)
-
-MANDATORY RAG RULES - NO EXCEPTIONS:
-- ALWAYS call search_knowledge_base function FIRST before answering ANY question
-- NEVER answer without searching, even if you think you know from these instructions
-- This applies to ALL questions: simple, complex, yes/no, numbers, features, people, quotes
-- Synthesize retrieved information naturally in your own words
-- DO NOT copy-paste or quote directly from search results
-- DO NOT say "According to documents" or "The search shows"
-- Keep it conversational - no bullet points in speech
-- Vary your phrases - don't repeat the same patterns
-- Respond ONLY in English
-
-YOU CAN ANSWER ABOUT (but ALWAYS search first):
-
-1. **myCoach Platform** (Primary focus - celebrating 10 years!)
-   - Platform history, vision, and achievements
-   - Courses, modules, certifications
-   - Languages, accessibility, features
-   - Awards and recognition
-   - Team members and leadership
-   - User testimonials and success stories
-
-2. **Shriram Finance**
-   - Loans: Two-wheeler, personal, gold, business, commercial vehicle
-   - Investments: Fixed Deposits, Flexible Income Plan
-   - Insurance: Life and general insurance distribution
-   - Digital services: Shriram One app, BBPS, UPI
-   - Branch network and presence
-
-3. **Shriram Group Companies**
-   - Shriram Life Insurance (SLIC)
-   - Shriram General Insurance (SGI)
-   - Way2Wealth (wealth management)
-   - Shriram AMC (mutual funds)
-   - Shriram Insight (trading platform)
-   - Novac Technology (MIGOTO AI, ZIVA)
-
-WHAT NOT TO DO:
-- DO NOT provide login credentials or passwords
-- DO NOT access personal account information
-- DO NOT make guarantees about loan approvals or outcomes
-- DO NOT give specific financial/legal advice
-- DO NOT sound like reading documentation
-- DO NOT use bullet points when speaking
-
-GREETING EXAMPLES (vary these naturally):
-- "Hi! I'm myCoach Assistant. Welcome to our 10-year celebration! I can tell you about myCoach, Shriram Finance, or any Shriram Group company. What interests you?"
-- "Hello! Thanks for coming to our anniversary event! Whether you want to know about our learning platform or Shriram's financial services, I'm here to help. What can I tell you?"
-- "Welcome to the myCoach 10-year celebration! We're celebrating a decade of empowering learners across Shriram Group. What would you like to know?"
-
-RESPONSE STYLE BY TOPIC:
-- myCoach questions: Enthusiastic and celebratory about the 10-year milestone
-- Shriram Finance: Helpful and informative about products and services
-- Shriram Group: Knowledgeable about all companies and their offerings
-- Certifications: Encouraging about learning achievements
-- Leadership/testimonials: Respectful and inspiring
-
-REMEMBER: ALWAYS search FIRST using search_knowledge_base, then answer naturally based on retrieved information. Never skip the search step, even for questions that seem simple!""",               "voice": "alloy",
-                "input_audio_transcription": {"model": "whisper-1"},
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.7,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 1000
-                },
-                "tools": [{
-                    "type": "function",
-                    "name": "search_knowledge_base",
-                    "description": "Search the myCoach knowledge base for information about courses, features, awards, history, and platform details",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {"type": "string", "description": "The search query or topic to find information about"}
-                        },
-                        "required": ["query"]
-                    }
-                }],
-                "tool_choice": "auto"
-            }
-        }
+        session_config = build_session_config(kb_id, budget.max_output_tokens)
         
         await azure_ws.send(json.dumps(session_config))
+        session.azure_ws = azure_ws
         logger.info("[WS] Session configured")
         
+        async def resume_azure():
+            """Re-open the Azure socket of an idle-reaped session"""
+            nonlocal azure_ws
+            logger.info(f"[WS] Visitor active again, reconnecting session {session_id}")
+            azure_ws = await connect_to_azure_realtime(kb_id, deployment)
+            await azure_ws.send(json.dumps(build_session_config(kb_id, budget.max_output_tokens)))
+            token_profiler.reset_conversation()
+            session.mark_resumed(azure_ws)
+        
         async def forward_to_azure():
             try:
                 async for message in websocket.iter_text():
+                    if audio_gate:
+                        message = audio_gate.filter_message(message)
+                        if message is None:
+                            continue
+                    if budget.exhausted:
+                        continue  # Farewell in progress; don't start another turn
+                    if session.reaped:
+                        if not Config.IDLE_RECONNECT_ON_ACTIVITY:
+                            break
+                        if not is_client_activity(message, Config.IDLE_VOICE_THRESHOLD):
+                            continue
+                        try:
+                            await resume_azure()
+                        except Exception as e:
+                            logger.error(f"[WS] Idle reconnect failed: {e}")
+                            metrics.record_error("idle_reconnect_failed")
+                            break
                     if azure_ws and not azure_ws.closed:
                         try:
                             await asyncio.wait_for(azure_ws.send(message), timeout=5.0)
@@ -241,95 +280,177 @@ REMEMBER: ALWAYS search FIRST using search_knowledge_base, then answer naturally
                 logger.info("[WS] Client disconnected")
             except Exception as e:
                 logger.error(f"[WS] Client error: {e}")
+            finally:
+                # Client gone: release the Azure socket so forward_to_client unwinds
+                session.close()
+                if azure_ws and not azure_ws.closed:
+                    await azure_ws.close()
         
         async def forward_to_client():
             nonlocal azure_ws  # Allow modification of outer scope variable
-            try:
-                async for message in azure_ws:
-                    data = json.loads(message)
-                    event_type = data.get("type")
+            while True:
+                try:
+                    async for message in azure_ws:
+                        data = json.loads(message)
+                        event_type = data.get("type")
+                        end_after_playback = None
                     
-                    # Track usage for cost calculation
-                    if event_type == "response.done":
-                        usage = data.get("response", {}).get("usage")
-                        if usage and cost_tracker:
-                            cost_tracker.add_usage(usage)
-                            response = data.get("response", {})
-                            output_items = response.get("output", [])
-
-                            for item in output_items:
-                                role = item.get("role")
-                                content_list = item.get("content", [])
-
-                                for content in content_list:
-                                    if content.get("type") == "audio":
-                                        transcript = content.get("transcript", "")
-                                        convo_logger.log_message(role, transcript)
+                        # Barge-in: cut the assistant off when the visitor starts talking
+                        if event_type == "response.created":
+                            responses.on_response_created(data)
+                        elif event_type in ("response.audio.delta", "response.audio_transcript.delta"):
+                            if responses.is_cancelled(data.get("response_id")):
+                                continue  # Late audio from a cancelled response, nobody will hear it
+                            if event_type == "response.audio.delta":
+                                responses.on_audio_delta(data)
+                        elif event_type == "input_audio_buffer.speech_started" and Config.BARGE_IN_ENABLED:
+                            interrupt_events = responses.interrupt()
+                            for interrupt_event in interrupt_events:
+                                await azure_ws.send(json.dumps(interrupt_event))
+                            if interrupt_events:
+                                await websocket.send_json(responses.flush_event())
+                        elif event_type == "response.done":
+                            playback_remaining = max(0, responses.sent_ms() - responses.played_ms()) / 1000
+                            responses.on_response_done(data)
+                        
+                        # Activity tracking for the idle reaper
+                        if event_type in ("response.created", "response.done"):
+                            session.touch_response()
+                        if event_type == "input_audio_buffer.speech_started":
+                            session.touch_user()
+                        
+                        # Per-turn latency timeline
+                        if event_type == "input_audio_buffer.speech_stopped":
+                            timeline.start()
+                        elif event_type == "response.audio.delta":
+                            timeline.mark("first_audio_delta")
+                        elif event_type == "response.done":
+                            turn = timeline.finish()
+                            if turn and convo_logger:
+                                convo_logger.log_event("turn_latency", turn)
+                        
+                        # Track usage for cost calculation
+                        if event_type == "response.done":
+                            usage = data.get("response", {}).get("usage")
+                            if usage and cost_tracker:
+                                cost_tracker.add_usage(usage)
+                                composition = token_profiler.on_response_done(usage)
+                                if composition and convo_logger:
+                                    convo_logger.log_event("token_composition", composition)
+                                response = data.get("response", {})
+                                output_items = response.get("output", [])
+
+                                for item in output_items:
+                                    role = item.get("role")
+                                    content_list = item.get("content", [])
+
+                                    for content in content_list:
+                                        if content.get("type") == "audio":
+                                            transcript = content.get("transcript", "")
+                                            convo_logger.log_message(role, transcript)
+                        
+                        # Per-session budget: shorten responses, then say goodbye at the limit
+                        if event_type == "response.done" and budget.enabled:
+                            if budget.exhausted:
+                                end_after_playback = playback_remaining
+                            else:
+                                budget_action = budget.update(cost_tracker)
+                                if budget_action == EXHAUSTED:
+                                    for farewell_event in build_farewell_events(Config.PROMPT_CACHE_STABLE_PREFIX):
+                                        await azure_ws.send(json.dumps(farewell_event))
+                                elif budget_action:
+                                    await azure_ws.send(json.dumps({
+                                        "type": "session.update",
+                                        "session": {"max_response_output_tokens": budget_action}
+                                    }))
                             
-                    if event_type == "conversation.item.input_audio_transcription.completed":
-                        role = item.get("role")
-                        convo_logger.log_message(role, data.get("transcript"))
-                    # Log conversation events
-                    if event_type == "conversation.item.created":
-                        item = data.get("item", {})
-                        role = item.get("role")
-                        content_list = item.get("content", [])
-                        if content_list and convo_logger:
-                            for content in content_list:
-                                if content.get("type") == "text":
-                                    convo_logger.log_message(role, content.get("text", ""))
-                                elif content.get("type") == "audio":
-                                    convo_logger.log_message(role, "[Audio]", message_type="audio")
+                        if event_type == "conversation.item.input_audio_transcription.completed":
+                            session.touch_user()
+                            timeline.mark("transcription_completed")
+                            convo_logger.log_message("user", data.get("transcript"))
+                        # Log conversation events
+                        if event_type == "conversation.item.created":
+                            item = data.get("item", {})
+                            role = item.get("role")
+                            content_list = item.get("content", [])
+                            if content_list and convo_logger:
+                                for content in content_list:
+                                    if content.get("type") == "text":
+                                        convo_logger.log_message(role, content.get("text", ""))
+                                    elif content.get("type") == "audio":
+                                        convo_logger.log_message(role, "[Audio]", message_type="audio")
                     
-                    if event_type == "response.function_call_arguments.done":
-                        call_id = data.get("call_id")
-                        function_name = data.get("name")
-                        args = json.loads(data.get("arguments", "{}"))
+                        if event_type == "response.function_call_arguments.done":
+                            call_id = data.get("call_id")
+                            function_name = data.get("name")
+                            args = json.loads(data.get("arguments", "{}"))
+                            timeline.mark("function_call_done")
                         
-                        logger.info(f"[FUNCTION] {function_name}: {args}")
+                            logger.info(f"[FUNCTION] {function_name}: {args}")
                         
-                        if function_name == "search_knowledge_base":
-                            try:
-                                metrics.start_timer("rag_search")
-                                metrics.increment("rag_searches")
-                                context = get_rag().search(args.get("query", ""), kb_id)
-                                metrics.end_timer("rag_search")
-                                output = context or "No relevant information found."
+                            if function_name == "search_knowledge_base":
+                                try:
+                                    metrics.increment("rag_searches", labels={"kb_id": kb_id})
+                                    context = get_rag().search(args.get("query", ""), kb_id)
+                                    output = context or "No relevant information found."
                                 
-                                # Log function call
-                                if convo_logger:
-                                    convo_logger.log_function_call(function_name, args, output)
-                            except Exception as e:
-                                logger.error(f"[RAG] Search failed: {e}")
-                                metrics.record_error("rag_search_failed")
-                                output = "Search temporarily unavailable."
+                                    # Log function call
+                                    if convo_logger:
+                                        convo_logger.log_function_call(function_name, args, output)
+                                except Exception as e:
+                                    logger.error(f"[RAG] Search failed: {e}")
+                                    metrics.record_error("rag_search_failed", operation="rag_search")
+                                    output = "Search temporarily unavailable."
+                                timeline.mark("rag_done")
+                                token_profiler.add_rag_context(output)
                             
-                            function_result = {
-                                "type": "conversation.item.create",
-                                "item": {
-                                    "type": "function_call_output",
-                                    "call_id": call_id,
-                                    "output": output
+                                function_result = {
+                                    "type": "conversation.item.create",
+                                    "item": {
+                                        "type": "function_call_output",
+                                        "call_id": call_id,
+                                        "output": output
+                                    }
                                 }
-                            }
-                            await azure_ws.send(json.dumps(function_result))
-                            await azure_ws.send(json.dumps({"type": "response.create"}))
+                                await azure_ws.send(json.dumps(function_result))
+                                await azure_ws.send(json.dumps({"type": "response.create"}))
+                                timeline.mark("response_create_sent")
                     
-                    await websocket.send_text(message)
+                        await websocket.send_text(message)
+                        
+                        if end_after_playback is not None:
+                            # Let the farewell finish playing before the client is disconnected
+                            await websocket.send_json({"type": "relay.session.ended", "reason": "budget"})
+                            await asyncio.sleep(end_after_playback + 0.5)
+                            logger.info(f"[BUDGET] Ending session {session_id}")
+                            await websocket.close(code=1000)
+                            await azure_ws.close()
+                            return
                     
-            except websockets.exceptions.ConnectionClosed as e:
-                logger.info(f"[WS] Azure disconnected: {e}")
-                metrics.record_error("azure_disconnected")
-                # Attempt reconnection
-                try:
-                    logger.info("[WS] Attempting to reconnect to Azure...")
-                    azure_ws = await connect_to_azure_realtime(kb_id)
-                    logger.info("[WS] Reconnected to Azure")
-                    metrics.increment("azure_reconnections")
-                except Exception as reconnect_error:
-                    logger.error(f"[WS] Reconnection failed: {reconnect_error}")
-            except Exception as e:
-                logger.error(f"[WS] Azure error: {e}")
+                except websockets.exceptions.ConnectionClosed as e:
+                    if session.reaped:
+                        logger.info(f"[WS] Azure socket closed by idle reaper: {e}")
+                    else:
+                        logger.info(f"[WS] Azure disconnected: {e}")
+                        metrics.record_error("azure_disconnected")
+                        # Attempt reconnection
+                        try:
+                            logger.info("[WS] Attempting to reconnect to Azure...")
+                            azure_ws = await connect_to_azure_realtime(kb_id, deployment)
+                            session.azure_ws = azure_ws
+                            logger.info("[WS] Reconnected to Azure")
+                            metrics.increment("azure_reconnections")
+                        except Exception as reconnect_error:
+                            logger.error(f"[WS] Reconnection failed: {reconnect_error}")
+                except Exception as e:
+                    logger.error(f"[WS] Azure error: {e}")
+                
+                if not session.reaped or not Config.IDLE_RECONNECT_ON_ACTIVITY:
+                    break
+                # Idle-reaped: wait until forward_to_azure reconnects
+                await session.resumed.wait()
+                if session.reaped:
+                    break
         
         await asyncio.gather(
             forward_to_azure(),
@@ -355,6 +476,14 @@ REMEMBER: ALWAYS search FIRST using search_knowledge_base, then answer naturally
         # Save conversation and cost summary
         if cost_tracker and convo_logger:
             try:
+                if audio_gate:
+                    gate_stats = audio_gate.get_stats()
+                    logger.info(f"[AUDIO] Session {session_id}: dropped {gate_stats['dropped_seconds']}s silence")
+                    convo_logger.log_event("audio_gate", gate_stats)
+                if budget.enabled:
+                    convo_logger.log_event("budget", budget.remaining())
+                convo_logger.log_event("token_composition_summary", token_profiler.get_summary())
+
                 cost_summary = cost_tracker.get_summary()
                 logger.info(f"[COST] Session {session_id}: ${cost_summary['cost_usd']:.6f}")
                 logger.info(f"[COST] Tokens: {cost_summary['tokens']}")
@@ -365,6 +494,9 @@ REMEMBER: ALWAYS search FIRST using search_knowledge_base, then answer naturally
             except Exception as e:
                 logger.error(f"[SESSION] Failed to save: {e}")
         
+        if session:
+            session_registry.unregister(session_id)
+        
         if azure_ws and not azure_ws.closed:
             await azure_ws.close()
             logger.info("[WS] Azure connection closed")
@@ -373,6 +505,83 @@ REMEMBER: ALWAYS search FIRST using search_knowledge_base, then answer naturally
         except:
             pass
 
+class AskRequest(BaseModel):
+    question: str
+    kb_id: Optional[str] = None
+    stream: bool = False
+
+async def search_kb_async(query: str, kb_id: str) -> Optional[str]:
+    """RAG search off the event loop, sharing the voice path's cache and metrics"""
+    try:
+        metrics.increment("rag_searches", labels={"kb_id": kb_id})
+        return await asyncio.to_thread(get_rag().search, query, kb_id)
+    except Exception as e:
+        logger.error(f"[RAG] Search failed: {e}")
+        metrics.record_error("rag_search_failed", operation="rag_search")
+        return None
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+async def ask_event_stream(text_answerer: TextAnswerer, question: str, context: Optional[str], kb_id: str):
+    """Server-sent events: start, delta..., done (or error)"""
+    answer_timer = metrics.start_timer("ask_answer")
+    first_token = True
+    yield sse_event({"type": "start", "kb_id": kb_id, "context_found": bool(context)})
+    try:
+        async for event in text_answerer.stream(question, context):
+            if "delta" in event:
+                if first_token:
+                    metrics.record_latency("ask_first_token", time.perf_counter() - answer_timer.started)
+                    first_token = False
+                yield sse_event({"type": "delta", "text": event["delta"]})
+            else:
+                metrics.end_timer(answer_timer)
+                yield sse_event({"type": "done", "usage": event["usage"]})
+    except Exception as e:
+        logger.error(f"[ASK] Streaming answer failed: {e}")
+        metrics.record_error("ask_failed")
+        yield sse_event({"type": "error", "error": "Answer generation failed"})
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    """Text question answering over the KB (JSON, or SSE when stream=true)"""
+    question = request.question.strip()
+    if not question:
+        return JSONResponse({"error": "question is required"}, status_code=400)
+    kb_id = (request.kb_id or "").strip() or Config.DEFAULT_KB_ID
+    metrics.increment("ask_requests", labels={"kb_id": kb_id})
+    
+    try:
+        text_answerer = get_answerer()
+    except Exception as e:
+        return JSONResponse({"error": f"Text answering unavailable: {e}"}, status_code=503)
+    
+    context = await search_kb_async(question, kb_id)
+    
+    if request.stream:
+        return StreamingResponse(
+            ask_event_stream(text_answerer, question, context, kb_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    try:
+        with metrics.timer("ask_answer"):
+            result = await text_answerer.answer(question, context)
+    except Exception as e:
+        logger.error(f"[ASK] Answer failed: {e}")
+        metrics.record_error("ask_failed")
+        return JSONResponse({"error": "Answer generation failed"}, status_code=502)
+    
+    return JSONResponse({
+        "kb_id": kb_id,
+        "question": question,
+        "answer": result["answer"],
+        "context_found": bool(context),
+        "usage": result["usage"]
+    })
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -380,17 +589,22 @@ async def health_check():
         from resilience import azure_circuit, rag_circuit
         
         rag_status = "healthy" if rag else "not_initialized"
+        slos = evaluate_slos(metrics)
+        breached = [name for name, result in slos.items() if result["status"] == "breach"]
         
         return JSONResponse({
-            "status": "healthy",
+            "status": "degraded" if breached else "healthy",
             "environment": Config.ENV,
             "rag_service": rag_status,
             "circuit_breakers": {
                 "azure": azure_circuit.state.value,
                 "rag": rag_circuit.state.value
             },
+            "slo": slos,
+            "event_loop": loop_monitor.get_stats(top=5),
+            "persistence": persistence.get_stats(),
             "metrics": metrics.get_stats()
-        })
+        }, status_code=503 if breached and Config.HEALTH_FAIL_ON_SLO_BREACH else 200)
     except Exception as e:
         return JSONResponse(
             {"status": "unhealthy", "error": str(e)},
@@ -398,36 +612,22 @@ async def health_check():
         )
 
 @app.get("/sessions")
-async def list_sessions():
-    """List all saved conversation sessions"""
+async def list_sessions(limit: int = 100, offset: int = 0, kb_id: Optional[str] = None):
+    """List saved conversation sessions, newest first"""
     try:
-        log_dir = "conversations"
-        if not os.path.exists(log_dir):
-            return JSONResponse({"sessions": []})
-        
-        sessions = []
-        for filename in os.listdir(log_dir):
-            if filename.endswith(".json"):
-                filepath = os.path.join(log_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        data = json.load(f)
-                        sessions.append({
-                            "session_id": data.get("session_id"),
-                            "kb_id": data.get("kb_id"),
-                            "start_time": data.get("start_time"),
-                            "duration_seconds": data.get("duration_seconds"),
-                            "message_count": data.get("message_count"),
-                            "cost_usd": data.get("cost", {}).get("cost_usd", 0),
-                            "filename": filename
-                        })
-                except Exception as e:
-                    logger.error(f"Failed to read {filename}: {e}")
-        
-        # Sort by start time (newest first)
-        sessions.sort(key=lambda x: x.get("start_time", ""), reverse=True)
-        
-        return JSONResponse({"sessions": sessions, "total": len(sessions)})
+        limit = max(1, min(limit, 1000))
+        sessions = await asyncio.to_thread(session_index.list, limit, max(0, offset), kb_id)
+        total = await asyncio.to_thread(session_index.count, kb_id)
+        return JSONResponse({"sessions": sessions, "total": total, "limit": limit, "offset": offset})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.get("/sessions/search")
+async def search_sessions(q: str, limit: int = 20, kb_id: Optional[str] = None):
+    """Sessions whose visitor transcript or search queries contain every word of q, best match first"""
+    try:
+        hits = await asyncio.to_thread(session_index.search, q, max(1, min(limit, 100)), kb_id)
+        return JSONResponse({"query": q, "sessions": hits})
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -435,52 +635,38 @@ async def list_sessions():
 async def get_session(session_id: str):
     """Get full conversation details for a session"""
     try:
-        log_dir = "conversations"
-        for filename in os.listdir(log_dir):
-            if filename.startswith(session_id) and filename.endswith(".json"):
-                filepath = os.path.join(log_dir, filename)
-                with open(filepath, 'r') as f:
-                    return JSONResponse(json.load(f))
+        entry = await asyncio.to_thread(session_index.get, session_id)
+        if not entry:
+            return JSONResponse({"error": "Session not found"}, status_code=404)
         
-        return JSONResponse({"error": "Session not found"}, status_code=404)
+        try:
+            document = await asyncio.to_thread(read_session, entry, "conversations")
+        except FileNotFoundError:
+            # Rolled into the archive between the lookup and the read
+            entry = await asyncio.to_thread(session_index.get, session_id)
+            document = await asyncio.to_thread(read_session, entry, "conversations")
+        return JSONResponse(document)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/cost-summary")
-async def get_cost_summary():
-    """Get cost summary for all sessions"""
+async def get_cost_summary(since: Optional[str] = None, until: Optional[str] = None, kb_id: Optional[str] = None):
+    """Cost summary for saved sessions from the day/KB rollups (days are YYYY-MM-DD, inclusive)"""
     try:
-        log_dir = "conversations"
-        if not os.path.exists(log_dir):
-            return JSONResponse({"total_cost": 0, "sessions": 0})
-        
-        total_cost = 0
-        total_tokens = {"text_input": 0, "text_output": 0, "audio_input": 0, "audio_output": 0}
-        session_count = 0
-        
-        for filename in os.listdir(log_dir):
-            if filename.endswith(".json"):
-                try:
-                    with open(os.path.join(log_dir, filename), 'r') as f:
-                        data = json.load(f)
-                        cost = data.get("cost", {})
-                        total_cost += cost.get("cost_usd", 0)
-                        tokens = cost.get("tokens", {})
-                        for key in total_tokens:
-                            total_tokens[key] += tokens.get(key, 0)
-                        session_count += 1
-                except:
-                    pass
-        
-        return JSONResponse({
-            "total_cost_usd": round(total_cost, 6),
-            "total_sessions": session_count,
-            "total_tokens": total_tokens,
-            "average_cost_per_session": round(total_cost / session_count, 6) if session_count > 0 else 0
-        })
+        rows = await asyncio.to_thread(session_index.cost_rollups, since, until, kb_id)
+        return JSONResponse(summarize_rollups(rows))
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.get("/cost-ledger")
+async def get_cost_ledger(hours: int = 24):
+    """Live hourly spend per KB and deployment, plus budget status"""
+    hours = max(1, min(hours, Config.COST_LEDGER_RETENTION_HOURS))
+    return JSONResponse({
+        "budget": cost_ledger.budget_status(),
+        "rollups": cost_ledger.rollups(hours)
+    })
+
 @app.get("/sessions-ui")
 async def sessions_ui():
     """Sessions dashboard UI"""
@@ -493,7 +679,17 @@ async def sessions_ui():
 @app.get("/metrics")
 async def get_metrics():
     """Metrics endpoint"""
-    return JSONResponse(metrics.get_stats())
+    stats = metrics.get_stats()
+    stats["budget"] = cost_ledger.budget_status()
+    stats["prompt_cache"] = prompt_cache_stats()
+    stats["token_composition"] = composition_by_kb()
+    stats["sessions"] = session_registry.get_stats()
+    return JSONResponse(stats)
+
+@app.get("/metrics/prometheus")
+async def get_prometheus_metrics():
+    """Prometheus text-format metrics"""
+    return Response(prometheus_exporter.render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 # @app.get("/ui")
 # async def get():
@@ -0,0 +1,220 @@
+"""
+Compressed, date-partitioned conversation archive
+
+Saved sessions are rolled into gzip JSONL segments under <archive_dir>/YYYY/MM/DD/.
+Every session is its own gzip member, so a segment reads as an ordinary
+.jsonl.gz file, while a single session can be read by seeking to its
+(offset, length) recorded in the session index.
+
+Session files whose name carries no date are filed under the day of their
+modification time. UNKNOWN_PARTITION ("0000/00/00") is only left for segments
+written before that, and retention never removes it since its age is unknown.
+"""
+import os
+import fcntl
+import json
+import gzip
+import zlib
+import glob
+import time
+import uuid
+import shutil
+import asyncio
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+UNKNOWN_PARTITION = "0000/00/00"
+
+def day_partition(day: str) -> str:
+    """"2024-01-31" or "20240131" -> "2024/01/31" """
+    digits = day.replace("-", "")[:8]
+    if len(digits) == 8 and digits.isdigit():
+        return f"{digits[:4]}/{digits[4:6]}/{digits[6:]}"
+    return UNKNOWN_PARTITION
+
+def parse_session_filename(filename: str) -> Tuple[str, str]:
+    """"<session_id>_<YYYYmmdd>_<HHMMSS>.json" -> (session_id, partition)"""
+    parts = filename[:-len(".json")].rsplit("_", 2)
+    if len(parts) != 3:
+        return parts[0], UNKNOWN_PARTITION
+    return parts[0], day_partition(parts[1])
+
+def remove_if_exists(path: str):
+    """os.remove that tolerates a file another worker (or an interrupted run) already removed"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def write_segment(path: str, documents: Iterable[dict]) -> list:
+    """Write documents as one gzip member each; returns [(offset, length)] in order"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    positions = []
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        for document in documents:
+            member = gzip.compress((json.dumps(document, ensure_ascii=False) + "\n").encode("utf-8"))
+            positions.append((f.tell(), len(member)))
+            f.write(member)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return positions
+
+def read_member(path: str, offset: int, length: int) -> dict:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))
+
+def iter_segment(path: str) -> Iterator[Tuple[int, int, dict]]:
+    """(offset, length, document) for every session in a segment"""
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)  # gzip framing
+        text = decompressor.decompress(data[offset:]) + decompressor.flush()
+        length = len(data) - offset - len(decompressor.unused_data)
+        yield offset, length, json.loads(text)
+        offset += length
+
+def list_segments(archive_dir: str) -> list:
+    return sorted(glob.glob(os.path.join(archive_dir, "*", "*", "*", f"*{SEGMENT_SUFFIX}")))
+
+def read_session(entry: dict, log_dir: str = "conversations") -> dict:
+    """Full session document for a session index row, archived or not"""
+    if entry.get("archive_offset") is not None:
+        return read_member(entry["filename"], entry["archive_offset"], entry["archive_length"])
+    with open(os.path.join(log_dir, entry["filename"]), encoding="utf-8") as f:
+        return json.load(f)
+
+class ArchiveCompactor:
+    """Rolls per-session files into day segments once they are `compact_after` seconds old,
+    and drops sessions older than `retention_days` (0 keeps everything)"""
+    def __init__(self, index, log_dir: str, archive_dir: str, compact_after: float = 3600,
+                 retention_days: int = 0, segment_sessions: int = 1000):
+        self.index = index
+        self.log_dir = log_dir
+        self.archive_dir = archive_dir
+        self.compact_after = compact_after
+        self.retention_days = retention_days
+        self.segment_sessions = segment_sessions
+        self._task = None
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Archive eligible session files; returns how many were archived"""
+        cutoff = (now or time.time()) - self.compact_after
+        by_day = {}
+        for filename in os.listdir(self.log_dir) if os.path.isdir(self.log_dir) else []:
+            path = os.path.join(self.log_dir, filename)
+            if not filename.endswith(".json"):
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if mtime >= cutoff:
+                continue
+            session_id, day = parse_session_filename(filename)
+            if day == UNKNOWN_PARTITION:
+                day = datetime.utcfromtimestamp(mtime).strftime("%Y/%m/%d")
+            entry = self.index.get(session_id)
+            if entry and entry.get("archive_offset") is not None:
+                remove_if_exists(path)  # archived by a run that stopped before deleting it
+                continue
+            by_day.setdefault(day, []).append(path)
+
+        archived = 0
+        for day, paths in sorted(by_day.items()):
+            for start in range(0, len(paths), self.segment_sessions):
+                chunk, summaries = [], []
+                segment = os.path.join(self.archive_dir, day, f"segment-{uuid.uuid4().hex[:12]}{SEGMENT_SUFFIX}")
+                positions = write_segment(segment, self._load(paths[start:start + self.segment_sessions], chunk, summaries))
+                if not chunk:
+                    remove_if_exists(segment)
+                    continue
+                self.index.index_archived(segment, summaries, positions)
+                for path in chunk:
+                    remove_if_exists(path)
+                archived += len(chunk)
+                logger.info(f"[ARCHIVE] Rolled {len(chunk)} sessions into {segment}")
+        if archived:
+            metrics.increment("archived_sessions", archived)
+        return archived
+
+    @staticmethod
+    def _load(paths: list, loaded: list, summaries: list) -> Iterator[dict]:
+        """Stream documents into a segment, keeping only what the index needs"""
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    document = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"[ARCHIVE] Skipping unreadable {path}: {e}")
+                continue
+            document.pop("folder_path", None)
+            loaded.append(path)
+            summaries.append({key: value for key, value in document.items() if key != "messages"})
+            yield document
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """Delete day partitions (and their index rows) older than the retention window;
+        UNKNOWN_PARTITION is kept"""
+        if not self.retention_days:
+            return 0
+        cutoff = datetime.utcfromtimestamp(now or time.time()) - timedelta(days=self.retention_days)
+        cutoff_partition = cutoff.strftime("%Y/%m/%d")
+        removed = 0
+        for day_dir in glob.glob(os.path.join(self.archive_dir, "*", "*", "*")):
+            partition = os.path.relpath(day_dir, self.archive_dir).replace(os.sep, "/")
+            if partition != UNKNOWN_PARTITION and partition < cutoff_partition:
+                shutil.rmtree(day_dir, ignore_errors=True)
+                removed += 1
+        for month_or_year in sorted(glob.glob(os.path.join(self.archive_dir, "*", "*")), reverse=True) + \
+                sorted(glob.glob(os.path.join(self.archive_dir, "*"))):
+            if os.path.isdir(month_or_year) and not os.listdir(month_or_year):
+                os.rmdir(month_or_year)
+        deleted = self.index.remove_before(cutoff.strftime("%Y-%m-%d"))
+        if removed or deleted:
+            logger.info(f"[ARCHIVE] Retention removed {removed} day partitions, {deleted} indexed sessions")
+        return removed
+
+    def run_once(self) -> bool:
+        """Compact and apply retention holding an exclusive lock on the archive dir,
+        so only one worker runs a pass at a time; False if another worker holds it"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(os.path.join(self.archive_dir, ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.compact()
+            self.apply_retention()
+            return True
+
+    async def run(self, interval: float):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"[ARCHIVE] Compaction failed: {e}")
+                metrics.record_error("archive_compaction_failed")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,127 @@
+"""
+Server-side silence suppression for client microphone audio
+"""
+import base64
+import json
+from collections import deque
+from typing import Optional
+import numpy as np
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class SilenceGate:
+    """Energy / zero-crossing gate over PCM16 input_audio_buffer.append chunks
+
+    Speech chunks are forwarded together with up to `preroll_ms` of the
+    silence that preceded them, and silence keeps flowing for `hangover_ms`
+    after speech so Azure's server VAD still sees the end of the turn.
+    Everything else is dropped.
+    """
+    def __init__(self, sample_rate: int = 24000, rms_threshold: float = 300, max_zcr: float = 0.35,
+                 frame_ms: int = 20, min_voiced_frames: int = 2, preroll_ms: int = 500,
+                 hangover_ms: int = 1500, tokens_per_second: float = 10):
+        self.sample_rate = sample_rate
+        self.rms_threshold = rms_threshold
+        self.max_zcr = max_zcr
+        self.frame_samples = max(1, sample_rate * frame_ms // 1000)
+        self.min_voiced_frames = min_voiced_frames
+        self.preroll_samples = sample_rate * preroll_ms // 1000
+        self.hangover_samples = sample_rate * hangover_ms // 1000
+        self.tokens_per_second = tokens_per_second
+
+        self._preroll = deque()
+        self._preroll_len = 0
+        self._since_speech = None  # samples since last voiced chunk, None before first speech
+        self.received_samples = 0
+        self.forwarded_samples = 0
+        self.dropped_samples = 0
+
+    def is_speech(self, pcm: np.ndarray) -> bool:
+        """Vectorized per-frame RMS / zero-crossing voicing decision"""
+        n_frames = len(pcm) // self.frame_samples
+        if n_frames == 0:
+            return False
+        frames = pcm[:n_frames * self.frame_samples].astype(np.float32).reshape(n_frames, self.frame_samples)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        # Loud frames count regardless of ZCR; quieter ones must not look like hiss
+        voiced = (rms >= 2 * self.rms_threshold) | ((rms >= self.rms_threshold) & (zcr <= self.max_zcr))
+        return int(np.count_nonzero(voiced)) >= self.min_voiced_frames
+
+    def process(self, audio: bytes) -> Optional[bytes]:
+        """Returns the PCM to forward for this chunk, or None to drop it"""
+        pcm = np.frombuffer(audio[:len(audio) - len(audio) % 2], dtype=np.int16)
+        self.received_samples += len(pcm)
+
+        if self.is_speech(pcm):
+            self._since_speech = 0
+            out = b"".join(self._preroll) + audio if self._preroll else audio
+            self._preroll.clear()
+            self._preroll_len = 0
+            self.forwarded_samples += len(out) // 2
+            return out
+
+        if self._since_speech is not None and self._since_speech < self.hangover_samples:
+            self._since_speech += len(pcm)
+            self.forwarded_samples += len(pcm)
+            return audio
+
+        # Silence: keep the most recent stretch as pre-roll, drop what falls out
+        self._preroll.append(audio)
+        self._preroll_len += len(pcm)
+        while self._preroll and self._preroll_len - len(self._preroll[0]) // 2 >= self.preroll_samples:
+            evicted = len(self._preroll.popleft()) // 2
+            self._preroll_len -= evicted
+            self._drop(evicted)
+        return None
+
+    def filter_message(self, message: str) -> Optional[str]:
+        """Gate a raw client message; non-audio events pass through untouched"""
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return message
+        event_type = data.get("type")
+        if event_type == "input_audio_buffer.clear":
+            self.reset()
+            return message
+        if event_type != "input_audio_buffer.append":
+            return message
+
+        try:
+            audio = base64.b64decode(data.get("audio", ""))
+        except Exception:
+            return message
+        out = self.process(audio)
+        if out is None:
+            return None
+        if out is audio:
+            return message
+        data["audio"] = base64.b64encode(out).decode("ascii")
+        return json.dumps(data)
+
+    def reset(self):
+        """Client cleared its buffer: forget pre-roll and hangover"""
+        for chunk in self._preroll:
+            self._drop(len(chunk) // 2)
+        self._preroll.clear()
+        self._preroll_len = 0
+        self._since_speech = None
+
+    def _drop(self, samples: int):
+        self.dropped_samples += samples
+        seconds = samples / self.sample_rate
+        metrics.increment("audio_dropped_seconds", round(seconds, 3))
+        metrics.increment("audio_tokens_saved_estimate", round(seconds * self.tokens_per_second, 2))
+
+    def get_stats(self) -> dict:
+        dropped_seconds = self.dropped_samples / self.sample_rate
+        return {
+            "received_seconds": round(self.received_samples / self.sample_rate, 2),
+            "forwarded_seconds": round(self.forwarded_samples / self.sample_rate, 2),
+            "dropped_seconds": round(dropped_seconds, 2),
+            "estimated_tokens_saved": round(dropped_seconds * self.tokens_per_second, 1)
+        }
@@ -0,0 +1,107 @@
+"""
+Server-driven barge-in: cancel and truncate the assistant when the visitor interrupts
+"""
+import time
+from typing import List, Optional
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Process-wide average of output audio tokens per completed (uninterrupted) response,
+# used to estimate what a cancelled response would have cost
+_completed_responses = {"count": 0, "audio_tokens": 0}
+
+def average_response_audio_tokens() -> Optional[float]:
+    if _completed_responses["count"] == 0:
+        return None
+    return _completed_responses["audio_tokens"] / _completed_responses["count"]
+
+class ResponseTracker:
+    """Follows the in-flight response's audio item so it can be cut at the played position"""
+    def __init__(self, session_id: str, sample_rate: int = 24000):
+        self.session_id = session_id
+        self.bytes_per_second = sample_rate * 2  # PCM16 mono
+        self.cancelled_ids = set()
+        self.interruptions = 0
+        self._reset()
+
+    def _reset(self):
+        self.response_id = None
+        self.item_id = None
+        self.content_index = 0
+        self.audio_bytes_sent = 0
+        self.first_audio_at = None
+
+    @property
+    def active(self) -> bool:
+        return self.response_id is not None and self.response_id not in self.cancelled_ids
+
+    def is_cancelled(self, response_id: Optional[str]) -> bool:
+        return response_id is not None and response_id in self.cancelled_ids
+
+    def on_response_created(self, data: dict):
+        self._reset()
+        self.response_id = data.get("response", {}).get("id")
+
+    def on_audio_delta(self, data: dict):
+        """Count audio bytes forwarded to the client (without decoding them)"""
+        delta = data.get("delta", "")
+        if self.first_audio_at is None:
+            self.first_audio_at = time.monotonic()
+            self.item_id = data.get("item_id")
+            self.content_index = data.get("content_index", 0)
+        self.audio_bytes_sent += len(delta) * 3 // 4 - delta[-2:].count("=")
+
+    def sent_ms(self) -> int:
+        return int(self.audio_bytes_sent * 1000 / self.bytes_per_second)
+
+    def played_ms(self, now: float = None) -> int:
+        """Client plays in real time from the first delta, so it can't be ahead of wall clock"""
+        if self.first_audio_at is None:
+            return 0
+        elapsed_ms = round(((now or time.monotonic()) - self.first_audio_at) * 1000)
+        return min(self.sent_ms(), elapsed_ms)
+
+    def interrupt(self, now: float = None) -> List[dict]:
+        """Events to send Azure when the visitor starts speaking mid-response"""
+        if not self.active:
+            return []
+        self.interruptions += 1
+        self.cancelled_ids.add(self.response_id)
+        metrics.increment("barge_in_cancels")
+
+        events = [{"type": "response.cancel"}]
+        if self.item_id:
+            played = self.played_ms(now)
+            unplayed_seconds = (self.sent_ms() - played) / 1000
+            metrics.increment("barge_in_unplayed_audio_seconds", round(unplayed_seconds, 3))
+            events.append({
+                "type": "conversation.item.truncate",
+                "item_id": self.item_id,
+                "content_index": self.content_index,
+                "audio_end_ms": played
+            })
+            logger.info(f"[BARGE-IN] Session {self.session_id}: cut {self.item_id} at {played}ms "
+                        f"({unplayed_seconds:.1f}s sent but unplayed)")
+        return events
+
+    def flush_event(self) -> dict:
+        """Tells the client to drop whatever it still has queued for playback"""
+        return {"type": "relay.playback.flush", "item_id": self.item_id}
+
+    def on_response_done(self, data: dict):
+        response = data.get("response", {})
+        audio_tokens = (response.get("usage") or {}).get("output_token_details", {}).get("audio_tokens", 0)
+
+        if self.is_cancelled(response.get("id")):
+            average = average_response_audio_tokens()
+            if average is not None:
+                metrics.increment("barge_in_output_tokens_avoided_estimate", round(max(0.0, average - audio_tokens), 1))
+            self.cancelled_ids.discard(response.get("id"))
+        elif response.get("status") == "completed" and audio_tokens:
+            _completed_responses["count"] += 1
+            _completed_responses["audio_tokens"] += audio_tokens
+
+        if response.get("id") == self.response_id:
+            self._reset()
@@ -19,16 +19,107 @@ class Config:
     AZURE_SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")
     AZURE_SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
     
+    # Text chat (/ask)
+    AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o-mini")
+    AZURE_OPENAI_CHAT_API_VERSION = os.getenv("AZURE_OPENAI_CHAT_API_VERSION", "2024-08-01-preview")
+    ASK_MAX_OUTPUT_TOKENS = int(os.getenv("ASK_MAX_OUTPUT_TOKENS", "300"))
+    
     # Embeddings
     EMBEDDING_API_KEY = os.getenv("EMBEDDING_API_KEY")
     EMBEDDING_ENDPOINT = os.getenv("EMBEDDING_ENDPOINT")
     EMBEDDING_API_VERSION = os.getenv("EMBEDDING_API_VERSION")
     EMBEDDING_DEPLOYMENT_NAME = os.getenv("EMBEDDING_DEPLOYMENT_NAME")
     
+    # RAG search cache
+    RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "256"))
+    RAG_CACHE_TTL = int(os.getenv("RAG_CACHE_TTL", "300"))
+    
     # Server
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", "8003"))
     
+    # Prometheus scrape output is re-rendered at most this often
+    PROMETHEUS_CACHE_SECONDS = float(os.getenv("PROMETHEUS_CACHE_SECONDS", "5"))
+    
+    # Service level objectives, evaluated over 1m/5m/15m windows on /health
+    SLO_RAG_P95_MS = int(os.getenv("SLO_RAG_P95_MS", "800"))
+    SLO_CONNECT_SUCCESS = float(os.getenv("SLO_CONNECT_SUCCESS", "0.99"))
+    SLO_FIRST_AUDIO_MS = int(os.getenv("SLO_FIRST_AUDIO_MS", "2000"))
+    SLO_FAST_BURN_RATE = float(os.getenv("SLO_FAST_BURN_RATE", "10"))
+    SLO_MIN_EVENTS = int(os.getenv("SLO_MIN_EVENTS", "5"))
+    HEALTH_FAIL_ON_SLO_BREACH = os.getenv("HEALTH_FAIL_ON_SLO_BREACH", "false").lower() == "true"
+    
+    # Event-loop lag monitor
+    LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_LAG_INTERVAL_MS = int(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+    LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+    
+    # On-demand sampling profiler limits (/admin/profile)
+    PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+    PROFILER_MAX_RATE = int(os.getenv("PROFILER_MAX_RATE", "100"))
+    
+    # Admin and export endpoints require this in X-Admin-Token; without it they are
+    # refused unless ADMIN_OPEN=true (local development only)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    ADMIN_OPEN = os.getenv("ADMIN_OPEN", "false").lower() == "true"
+    
+    # Logging: queued JSON records, per-logger rate limit, 1-in-N sampling of hot tags
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_RATE_PER_SECOND = float(os.getenv("LOG_RATE_PER_SECOND", "50"))
+    LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "200"))
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "[METRIC]=0.1")
+    
+    # Fleet cost ledger and budgets (0 disables a budget)
+    COST_LEDGER_PATH = os.getenv("COST_LEDGER_PATH", "cost_ledger/ledger.json")
+    COST_LEDGER_RETENTION_HOURS = int(os.getenv("COST_LEDGER_RETENTION_HOURS", "48"))
+    COST_LEDGER_FLUSH_INTERVAL = int(os.getenv("COST_LEDGER_FLUSH_INTERVAL", "60"))
+    COST_BUDGET_HOURLY_USD = float(os.getenv("COST_BUDGET_HOURLY_USD", "0"))
+    COST_BUDGET_DAILY_USD = float(os.getenv("COST_BUDGET_DAILY_USD", "0"))
+    COST_BUDGET_ACTION = os.getenv("COST_BUDGET_ACTION", "refuse")  # refuse | economy
+    AZURE_OPENAI_ECONOMY_DEPLOYMENT = os.getenv("AZURE_OPENAI_ECONOMY_DEPLOYMENT")
+    ECONOMY_MAX_OUTPUT_TOKENS = int(os.getenv("ECONOMY_MAX_OUTPUT_TOKENS", "150"))
+    
+    # Per-session budget (0 disables); responses shrink as it is used, "fraction:max tokens" steps
+    SESSION_BUDGET_USD = float(os.getenv("SESSION_BUDGET_USD", "0"))
+    SESSION_BUDGET_TOKENS = int(os.getenv("SESSION_BUDGET_TOKENS", "0"))
+    SESSION_BUDGET_STEPS = os.getenv("SESSION_BUDGET_STEPS", "0.5:400,0.75:200,0.9:100")
+    
+    # Keep instructions/tools as an unchanging prompt prefix so Azure can serve it from the prompt cache
+    PROMPT_CACHE_STABLE_PREFIX = os.getenv("PROMPT_CACHE_STABLE_PREFIX", "true").lower() == "true"
+    
+    # Session persistence: one background writer batches files and Mongo inserts, spooling on failure
+    PERSIST_TO_MONGO = os.getenv("PERSIST_TO_MONGO", "true").lower() == "true"
+    PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "1000"))
+    PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+    PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "2.0"))
+    PERSIST_SPOOL_DIR = os.getenv("PERSIST_SPOOL_DIR", "persist_spool")
+    
+    # In-progress sessions are journaled to disk; orphans older than JOURNAL_RECOVER_AFTER are saved on startup
+    JOURNAL_DIR = os.getenv("JOURNAL_DIR", "conversations/journal")
+    JOURNAL_BUFFER_BYTES = int(os.getenv("JOURNAL_BUFFER_BYTES", "65536"))
+    JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1.0"))
+    JOURNAL_RECOVER_AFTER = float(os.getenv("JOURNAL_RECOVER_AFTER", "3600"))
+    
+    # SQLite index of saved sessions behind /sessions (python session_index.py rebuild)
+    SESSION_INDEX_PATH = os.getenv("SESSION_INDEX_PATH", "conversations/sessions.sqlite3")
+    
+    # MongoConversationLogger buffers messages and flushes them as one insert_many
+    MONGO_MESSAGE_BATCH_SIZE = int(os.getenv("MONGO_MESSAGE_BATCH_SIZE", "20"))
+    MONGO_MESSAGE_FLUSH_INTERVAL = float(os.getenv("MONGO_MESSAGE_FLUSH_INTERVAL", "2.0"))
+    MONGO_MESSAGE_MAX_PENDING = int(os.getenv("MONGO_MESSAGE_MAX_PENDING", "1000"))
+    MONGO_MESSAGE_LAYOUT = os.getenv("MONGO_MESSAGE_LAYOUT", "documents")  # documents | buckets | timeseries
+    MONGO_MESSAGE_BUCKET_SIZE = int(os.getenv("MONGO_MESSAGE_BUCKET_SIZE", "50"))
+    MONGO_MESSAGE_TTL_DAYS = float(os.getenv("MONGO_MESSAGE_TTL_DAYS", "0"))  # 0 keeps messages forever
+    
+    # Session files older than ARCHIVE_COMPACT_AFTER seconds are rolled into gzip day segments (0 days = keep forever)
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "conversations/archive")
+    ARCHIVE_COMPACT_AFTER = float(os.getenv("ARCHIVE_COMPACT_AFTER", "3600"))
+    ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "600"))
+    ARCHIVE_SEGMENT_SESSIONS = int(os.getenv("ARCHIVE_SEGMENT_SESSIONS", "1000"))
+    ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "0"))
+    
     # Default KB ID
     DEFAULT_KB_ID = os.getenv("DEFAULT_KB_ID", "default")
     
@@ -44,7 +135,26 @@ class Config:
     AZURE_CIRCUIT_TIMEOUT = int(os.getenv("AZURE_CIRCUIT_TIMEOUT", "60"))
     RAG_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("RAG_CIRCUIT_FAILURE_THRESHOLD", "3"))
     RAG_CIRCUIT_TIMEOUT = int(os.getenv("RAG_CIRCUIT_TIMEOUT", "30"))
+
+    # Idle sessions
+    SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "120"))
+    IDLE_REAPER_INTERVAL = int(os.getenv("IDLE_REAPER_INTERVAL", "15"))
+    IDLE_RECONNECT_ON_ACTIVITY = os.getenv("IDLE_RECONNECT_ON_ACTIVITY", "true").lower() == "true"
+    IDLE_VOICE_THRESHOLD = int(os.getenv("IDLE_VOICE_THRESHOLD", "1500"))
     
+    # Input audio silence gate (PCM16 mono)
+    AUDIO_GATE_ENABLED = os.getenv("AUDIO_GATE_ENABLED", "true").lower() == "true"
+    AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "24000"))
+    AUDIO_GATE_RMS_THRESHOLD = float(os.getenv("AUDIO_GATE_RMS_THRESHOLD", "300"))
+    AUDIO_GATE_MAX_ZCR = float(os.getenv("AUDIO_GATE_MAX_ZCR", "0.35"))
+    AUDIO_GATE_PREROLL_MS = int(os.getenv("AUDIO_GATE_PREROLL_MS", "500"))
+    # Must stay above turn_detection.silence_duration_ms so Azure sees the end of speech
+    AUDIO_GATE_HANGOVER_MS = int(os.getenv("AUDIO_GATE_HANGOVER_MS", "1500"))
+    AUDIO_INPUT_TOKENS_PER_SECOND = float(os.getenv("AUDIO_INPUT_TOKENS_PER_SECOND", "10"))
+    
+    # Cancel and truncate in-flight responses when the visitor interrupts
+    BARGE_IN_ENABLED = os.getenv("BARGE_IN_ENABLED", "true").lower() == "true"
+
     @classmethod
     def validate(cls):
         required = [
@@ -3,24 +3,40 @@ Conversation logging for session replay and analysis
 """
 import json
 import os
+import glob
+import time
+import socket
+from collections import Counter
 from datetime import datetime
 from typing import List, Dict
 import logging
-from database_service import DatabaseService
+from session_journal import SessionJournal, read_journal
+from persistence import persistence
+from config import Config
 
 logger = logging.getLogger(__name__)
 
 class ConversationLogger:
-    def __init__(self, session_id: str, kb_id: str, log_dir: str = "conversations"):
+    def __init__(self, session_id: str, kb_id: str, log_dir: str = "conversations", journal_dir: str = None):
         self.session_id = session_id
         self.kb_id = kb_id
         self.log_dir = log_dir
         self.start_time = datetime.utcnow()
-        self.messages = []
-        self.db_service = DatabaseService()
+        self.message_count = 0
+        self.role_counts = Counter()
+        self.saved = False
         
         # Create log directory
         os.makedirs(log_dir, exist_ok=True)
+        
+        # Messages stream to the journal instead of accumulating here
+        self.journal = SessionJournal(
+            os.path.join(journal_dir or Config.JOURNAL_DIR, f"{session_id}.jsonl"),
+            header={"session_id": session_id, "kb_id": kb_id, "start_time": self.start_time.isoformat(),
+                    "host": socket.gethostname(), "pid": os.getpid()},
+            buffer_size=Config.JOURNAL_BUFFER_BYTES,
+            fsync_interval=Config.JOURNAL_FSYNC_INTERVAL
+        )
     
     def log_message(self, role: str, content: str, message_type: str = "text", metadata: dict = None):
         """Log a conversation message"""
@@ -31,7 +47,9 @@ class ConversationLogger:
             "content": content,
             "metadata": metadata or {}
         }
-        self.messages.append(message)
+        self.journal.append(message)
+        self.message_count += 1
+        self.role_counts[role] += 1
     
     def log_function_call(self, function_name: str, arguments: dict, result: str):
         """Log function call and result"""
@@ -55,51 +73,100 @@ class ConversationLogger:
         )
     
     def save(self, cost_summary: dict = None):
-        """Save conversation to database and file"""
-        filename = f"{self.session_id}_{self.start_time.strftime('%Y%m%d_%H%M%S')}.json"
-        filepath = os.path.join(self.log_dir, filename)
+        """Hand the conversation to the background writer (file + database); returns the file path"""
+        if self.saved:
+            return None
+        self.saved = True
+        self.journal.close()
         
+        filepath = session_filepath(self.log_dir, self.session_id, self.start_time)
         conversation_data = {
             "session_id": self.session_id,
             "kb_id": self.kb_id,
             "start_time": self.start_time.isoformat(),
             "end_time": datetime.utcnow().isoformat(),
             "duration_seconds": (datetime.utcnow() - self.start_time).total_seconds(),
-            "message_count": len(self.messages),
-            "messages": self.messages,
+            "message_count": self.message_count,
             "cost": cost_summary
         }
         
-        # Save to file (backup)
-        try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(conversation_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"[CONVO] Saved to file: {filepath}")
-        except Exception as e:
-            logger.error(f"[CONVO] Failed to save file: {e}")
-            filepath = None
-        
-        # Save to database
-        try:
-            db_id = self.db_service.save_session(conversation_data, filepath)
-            logger.info(f"[CONVO] Saved to database: {db_id}")
-            return filepath
-        except Exception as e:
-            logger.error(f"[CONVO] Failed to save to database: {e}")
-            return filepath
+        # The writer fills in "messages" from the journal
+        persistence.submit(conversation_data, filepath, self.journal.path)
+        logger.info(f"[CONVO] Queued for persistence: {filepath}")
+        return filepath
     
     def get_summary(self) -> dict:
         """Get conversation summary"""
-        user_messages = [m for m in self.messages if m["role"] == "user"]
-        assistant_messages = [m for m in self.messages if m["role"] == "assistant"]
-        function_calls = [m for m in self.messages if m["role"] == "function"]
-        
         return {
             "session_id": self.session_id,
             "kb_id": self.kb_id,
             "duration_seconds": (datetime.utcnow() - self.start_time).total_seconds(),
-            "total_messages": len(self.messages),
-            "user_messages": len(user_messages),
-            "assistant_messages": len(assistant_messages),
-            "function_calls": len(function_calls)
+            "total_messages": self.message_count,
+            "user_messages": self.role_counts["user"],
+            "assistant_messages": self.role_counts["assistant"],
+            "function_calls": self.role_counts["function"]
+        }
+
+def session_filepath(log_dir: str, session_id: str, start_time: datetime) -> str:
+    return os.path.join(log_dir, f"{session_id}_{start_time.strftime('%Y%m%d_%H%M%S')}.json")
+
+def owner_alive(header: dict) -> bool:
+    """Whether the worker that wrote a journal is still running on this host"""
+    pid = header.get("pid")
+    if not pid or pid == os.getpid() or header.get("host") != socket.gethostname():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def find_orphaned_journals(journal_dir: str, log_dir: str = "conversations", older_than: float = 3600) -> list:
+    """(document, filepath, journal path) for sessions whose worker died before save()
+
+    Only journals untouched for `older_than` seconds whose worker is gone are
+    taken. Each is claimed by renaming it to <name>.recovering-<pid> first, so
+    of several workers starting together exactly one recovers it. A claim
+    older than `older_than` belongs to a worker that died mid-recovery and
+    is taken over.
+    """
+    orphans = []
+    now = time.time()
+    paths = glob.glob(os.path.join(journal_dir, "*.jsonl")) + glob.glob(os.path.join(journal_dir, "*.jsonl.recovering-*"))
+    for path in sorted(paths):
+        claimed = f"{path.split('.recovering-')[0]}.recovering-{os.getpid()}"
+        try:
+            modified = os.path.getmtime(path)
+            if now - modified < older_than:
+                continue
+            header, _ = read_journal(path)
+            if header and owner_alive(header):
+                continue  # an idle but live session
+            os.replace(path, claimed)
+            os.utime(claimed)  # claim time, so an abandoned claim can be taken over later
+            header, messages = read_journal(claimed)
+            message_count = sum(1 for _ in messages)
+        except FileNotFoundError:
+            continue  # claimed by another worker
+        except OSError as e:
+            logger.error(f"[CONVO] Could not read journal {path}: {e}")
+            continue
+        if not header:
+            os.remove(claimed)
+            continue
+        start_time = datetime.fromisoformat(header["start_time"])
+        end_time = datetime.utcfromtimestamp(modified)
+        document = {
+            "session_id": header["session_id"],
+            "kb_id": header["kb_id"],
+            "start_time": header["start_time"],
+            "end_time": end_time.isoformat(),
+            "duration_seconds": (end_time - start_time).total_seconds(),
+            "message_count": message_count,
+            "cost": None,
+            "recovered": True
         }
+        orphans.append((document, session_filepath(log_dir, header["session_id"], start_time), claimed))
+    return orphans
@@ -0,0 +1,287 @@
+"""
+Fleet cost ledger: hourly token and spend rollups per KB and deployment, with budget caps
+
+Each worker process keeps its own rollups and flushes them to its own file
+(COST_LEDGER_PATH with the pid appended). Budgets and /cost-ledger add the
+files of the other live workers on the host, refreshed every flush, so caps
+apply to the whole fleet. Files left by dead workers are taken over on start.
+"""
+import os
+import glob
+import json
+import time
+import asyncio
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Optional
+import logging
+from monitoring import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TYPES = ("text_input", "text_output", "audio_input", "audio_output", "cached_text_input", "cached_audio_input")
+COLUMNS = len(TOKEN_TYPES) + 1  # token counts, then spend in micro-dollars
+
+def hour_of(timestamp: float) -> int:
+    return int(timestamp // 3600)
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class HourlySeries:
+    """Ring of `hours` hourly rows for one (kb_id, deployment), packed into two int64 arrays"""
+    __slots__ = ("hours", "values")
+
+    def __init__(self, hours: int):
+        self.hours = array("q", [-1]) * hours
+        self.values = array("q", [0]) * (hours * COLUMNS)
+
+    def row(self, hour: int) -> int:
+        slot = hour % len(self.hours)
+        if self.hours[slot] != hour:
+            self.hours[slot] = hour
+            base = slot * COLUMNS
+            for i in range(COLUMNS):
+                self.values[base + i] = 0
+        return slot * COLUMNS
+
+    def add(self, hour: int, tokens: dict, micro_usd: int):
+        base = self.row(hour)
+        for i, token_type in enumerate(TOKEN_TYPES):
+            self.values[base + i] += tokens.get(token_type, 0)
+        self.values[base + len(TOKEN_TYPES)] += micro_usd
+
+    def rows(self, since_hour: int):
+        """(hour, tokens dict, micro_usd) for every populated hour >= since_hour"""
+        for slot, hour in enumerate(self.hours):
+            if hour >= since_hour:
+                base = slot * COLUMNS
+                tokens = {t: self.values[base + i] for i, t in enumerate(TOKEN_TYPES)}
+                yield hour, tokens, self.values[base + len(TOKEN_TYPES)]
+
+class CostLedger:
+    """Fed incrementally by CostTracker.add_usage; budgets are checked against running totals"""
+    def __init__(self, retention_hours: int = 48, hourly_budget: float = 0.0, daily_budget: float = 0.0,
+                 action: str = "refuse", path: Optional[str] = None):
+        self.retention_hours = retention_hours
+        self.hourly_budget = hourly_budget
+        self.daily_budget = daily_budget
+        self.action = action
+        self.path = path
+        self.series = {}  # (kb_id, deployment) -> HourlySeries
+        self._hour = None
+        self._hour_micro_usd = 0
+        self._day = None
+        self._day_micro_usd = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._task = None
+        self._peer_rows = []  # rollup rows flushed by the other live workers
+
+    @property
+    def worker_path(self) -> str:
+        root, ext = os.path.splitext(self.path)
+        return f"{root}-{os.getpid()}{ext}"
+
+    def _worker_files(self) -> dict:
+        """pid -> ledger file of every worker that has flushed one"""
+        root, ext = os.path.splitext(self.path)
+        files = {}
+        for path in glob.glob(f"{glob.escape(root)}-*{ext}"):
+            pid = path[len(root) + 1:len(path) - len(ext)]
+            if pid.isdigit():
+                files[int(pid)] = path
+        return files
+
+    @staticmethod
+    def _read_rows(path: str) -> list:
+        try:
+            with open(path) as f:
+                return json.load(f).get("rollups", [])
+        except (OSError, ValueError) as e:
+            logger.error(f"[LEDGER] Could not read {path}: {e}")
+            return []
+
+    def refresh_peers(self):
+        """Re-read the other live workers' files (they are at most one flush interval old)"""
+        if not self.path:
+            return
+        rows = []
+        for pid, path in self._worker_files().items():
+            if pid != os.getpid() and pid_alive(pid):
+                rows.extend(self._read_rows(path))
+        for row in rows:
+            row["_hour"] = hour_of(datetime.fromisoformat(row["hour"]).timestamp())
+        with self._lock:
+            self._peer_rows = rows
+
+    def record(self, kb_id: str, deployment: str, tokens: dict, cost_usd: float, now: float = None):
+        now = now or time.time()
+        hour = hour_of(now)
+        day = hour // 24
+        micro_usd = int(round(cost_usd * 1_000_000))
+        with self._lock:
+            key = (kb_id or "unknown", deployment or "default")
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = HourlySeries(self.retention_hours)
+            series.add(hour, tokens, micro_usd)
+            if hour != self._hour:
+                self._hour, self._hour_micro_usd = hour, 0
+            if day != self._day:
+                self._day, self._day_micro_usd = day, 0
+            self._hour_micro_usd += micro_usd
+            self._day_micro_usd += micro_usd
+            self._dirty = True
+
+    def spend(self, now: float = None) -> dict:
+        """USD spent fleet-wide in the current UTC hour and day"""
+        hour = hour_of(now or time.time())
+        with self._lock:
+            hour_usd = self._hour_micro_usd / 1_000_000 if hour == self._hour else 0.0
+            day_usd = self._day_micro_usd / 1_000_000 if hour // 24 == self._day else 0.0
+            for row in self._peer_rows:
+                if row["_hour"] // 24 == hour // 24:
+                    day_usd += row["cost_usd"]
+                    if row["_hour"] == hour:
+                        hour_usd += row["cost_usd"]
+        return {"hour_usd": hour_usd, "day_usd": day_usd}
+
+    def budget_status(self, now: float = None) -> dict:
+        spent = self.spend(now)
+        exceeded = []
+        if self.hourly_budget and spent["hour_usd"] >= self.hourly_budget:
+            exceeded.append("hourly")
+        if self.daily_budget and spent["day_usd"] >= self.daily_budget:
+            exceeded.append("daily")
+        return {
+            "hourly": {"spent_usd": round(spent["hour_usd"], 4), "budget_usd": self.hourly_budget or None},
+            "daily": {"spent_usd": round(spent["day_usd"], 4), "budget_usd": self.daily_budget or None},
+            "exceeded": exceeded,
+            "action": self.action if exceeded else None
+        }
+
+    def over_budget(self, now: float = None) -> bool:
+        return bool(self.budget_status(now)["exceeded"])
+
+    def rollups(self, hours: int = 24, now: float = None, fleet: bool = True) -> list:
+        """Hourly rows, summed over this worker and (with fleet) the other live workers"""
+        since = hour_of(now or time.time()) - hours + 1
+        with self._lock:
+            result = [
+                {
+                    "hour": datetime.fromtimestamp(hour * 3600, timezone.utc).isoformat(),
+                    "kb_id": kb_id,
+                    "deployment": deployment,
+                    "tokens": tokens,
+                    "cost_usd": round(micro_usd / 1_000_000, 6)
+                }
+                for (kb_id, deployment), series in self.series.items()
+                for hour, tokens, micro_usd in series.rows(since)
+            ]
+            peers = [row for row in self._peer_rows if row["_hour"] >= since] if fleet else []
+        merged = {(r["hour"], r["kb_id"], r["deployment"]): r for r in result}
+        for row in peers:
+            key = (row["hour"], row["kb_id"], row["deployment"])
+            if key not in merged:
+                merged[key] = {"hour": row["hour"], "kb_id": row["kb_id"], "deployment": row["deployment"],
+                               "tokens": dict.fromkeys(TOKEN_TYPES, 0), "cost_usd": 0.0}
+            target = merged[key]
+            for t in TOKEN_TYPES:
+                target["tokens"][t] += row["tokens"].get(t, 0)
+            target["cost_usd"] = round(target["cost_usd"] + row["cost_usd"], 6)
+        return sorted(merged.values(), key=lambda r: (r["hour"], r["kb_id"], r["deployment"]))
+
+    def flush(self):
+        """Write this worker's retained rollups to its own file if anything changed since the last flush"""
+        if not self.path or not self._dirty:
+            return
+        self._dirty = False
+        snapshot = {"saved_at": datetime.utcnow().isoformat(), "rollups": self.rollups(self.retention_hours, fleet=False)}
+        path = self.worker_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def load(self):
+        """Take over the rollups of workers that are gone (and today's running totals from them)
+
+        Each dead worker's file is claimed with a rename first, so workers
+        starting together don't both count it. What was taken over is written
+        to this worker's file before the claimed files are deleted.
+        """
+        if not self.path:
+            return
+        candidates = [path for pid, path in self._worker_files().items() if pid == os.getpid() or not pid_alive(pid)]
+        if os.path.exists(self.path):
+            candidates.append(self.path)  # single shared file written by older versions
+        adopted = []
+        for path in candidates:
+            claimed = f"{path}.adopting-{os.getpid()}"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue  # taken by another worker
+            for row in self._read_rows(claimed):
+                timestamp = datetime.fromisoformat(row["hour"]).timestamp()
+                self.record(row["kb_id"], row["deployment"], row["tokens"], row["cost_usd"], now=timestamp)
+            adopted.append(claimed)
+        # Replayed rows may be older than the current hour/day; recompute the running totals
+        now_hour = hour_of(time.time())
+        with self._lock:
+            self._hour, self._day = now_hour, now_hour // 24
+            self._hour_micro_usd = self._day_micro_usd = 0
+            for series in self.series.values():
+                for hour, _, micro_usd in series.rows(self._day * 24):
+                    self._day_micro_usd += micro_usd
+                    if hour == now_hour:
+                        self._hour_micro_usd += micro_usd
+        self._dirty = bool(adopted)
+        self.flush()
+        for claimed in adopted:
+            os.remove(claimed)
+        self.refresh_peers()
+        if adopted:
+            logger.info(f"[LEDGER] Took over {len(adopted)} ledger files")
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+                await asyncio.to_thread(self.refresh_peers)
+            except Exception as e:
+                logger.error(f"[LEDGER] Flush failed: {e}")
+                metrics.record_error("cost_ledger_flush_failed")
+
+    def start(self, interval: float):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+cost_ledger = CostLedger(
+    retention_hours=Config.COST_LEDGER_RETENTION_HOURS,
+    hourly_budget=Config.COST_BUDGET_HOURLY_USD,
+    daily_budget=Config.COST_BUDGET_DAILY_USD,
+    action=Config.COST_BUDGET_ACTION,
+    path=Config.COST_LEDGER_PATH
+)
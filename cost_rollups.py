@@ -0,0 +1,127 @@
+"""
+Cost rollups by day and KB, maintained as sessions are saved so cost summaries never rescan sessions
+
+The file store keeps its rollups next to the session index (session_index.py);
+MongoDB keeps them in the cost_rollups collection. Backfill the Mongo rollups
+from existing sessions with: python cost_rollups.py backfill
+"""
+import sys
+import asyncio
+from datetime import datetime
+from typing import Optional, Union
+import logging
+from pymongo.errors import DuplicateKeyError
+from database import get_database, get_sessions_collection
+from cost_ledger import TOKEN_TYPES
+
+logger = logging.getLogger(__name__)
+
+def rollup_day(start_time: Union[str, datetime, None]) -> str:
+    """UTC day a session is counted under (its start)"""
+    if isinstance(start_time, datetime):
+        return start_time.strftime("%Y-%m-%d")
+    return (start_time or "")[:10] or "unknown"
+
+def summarize_rollups(rows: list) -> dict:
+    """Totals plus per-day and per-KB breakdowns from rollup rows"""
+    by_day, by_kb = {}, {}
+    for row in rows:
+        for key, groups in ((row["day"], by_day), (row["kb_id"] or "unknown", by_kb)):
+            group = groups.setdefault(key, {"sessions": 0, "cost_usd": 0.0})
+            group["sessions"] += row["sessions"]
+            group["cost_usd"] += row["cost_usd"]
+    total_cost = sum(row["cost_usd"] for row in rows)
+    total_sessions = sum(row["sessions"] for row in rows)
+    return {
+        "total_cost_usd": round(total_cost, 6),
+        "total_sessions": total_sessions,
+        "total_tokens": {t: sum(row["tokens"].get(t, 0) for row in rows) for t in TOKEN_TYPES},
+        "average_cost_per_session": round(total_cost / total_sessions, 6) if total_sessions > 0 else 0,
+        "by_day": [{"day": day, **group, "cost_usd": round(group["cost_usd"], 6)} for day, group in sorted(by_day.items())],
+        "by_kb": [{"kb_id": kb_id, **group, "cost_usd": round(group["cost_usd"], 6)} for kb_id, group in sorted(by_kb.items())]
+    }
+
+def get_rollups_collection():
+    return get_database()["cost_rollups"]
+
+async def claim_session(session_id: str) -> bool:
+    """Mark a session as counted; False if an earlier save already counted it
+
+    The upsert can only insert when no session document matches, and the
+    unique session_id index turns that into a duplicate-key error when the
+    session exists but is already marked.
+    """
+    try:
+        result = await get_sessions_collection().update_one(
+            {"session_id": session_id, "cost_rolled_up": {"$ne": True}},
+            {"$set": {"cost_rolled_up": True}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return bool(result.modified_count or result.upserted_id)
+
+async def record_session_cost(session_id: str, kb_id: str, start_time: datetime, cost_summary: dict) -> bool:
+    """Add one saved session to its (day, KB) rollup document, once per session"""
+    if not await claim_session(session_id):
+        logger.info(f"[ROLLUP] Session {session_id} already counted")
+        return False
+    day = rollup_day(start_time)
+    kb_id = kb_id or "unknown"
+    tokens = cost_summary.get("tokens", {})
+    increments = {"sessions": 1, "cost_usd": cost_summary.get("cost_usd", 0.0)}
+    increments.update({f"tokens.{t}": tokens.get(t, 0) for t in TOKEN_TYPES})
+    await get_rollups_collection().update_one(
+        {"_id": f"{day}|{kb_id}"},
+        {"$inc": increments, "$setOnInsert": {"day": day, "kb_id": kb_id}},
+        upsert=True
+    )
+    return True
+
+async def mongo_rollups(since: Optional[str] = None, until: Optional[str] = None, kb_id: Optional[str] = None) -> list:
+    query = {}
+    if since or until:
+        query["day"] = {**({"$gte": since} if since else {}), **({"$lte": until} if until else {})}
+    if kb_id:
+        query["kb_id"] = kb_id
+    rows = []
+    async for doc in get_rollups_collection().find(query, {"_id": 0}):
+        doc.setdefault("tokens", {})
+        rows.append(doc)
+    return rows
+
+async def backfill_mongo() -> int:
+    """Rebuild every rollup document from the sessions collection (and mark them all counted)"""
+    rollups = get_rollups_collection()
+    await rollups.delete_many({})
+    await get_sessions_collection().update_many({}, {"$set": {"cost_rolled_up": True}})
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time", "onNull": "unknown"}}
+    kb_id = {"$ifNull": ["$kb_id", "unknown"]}
+    pipeline = [
+        {"$group": {
+            "_id": {"day": day, "kb_id": kb_id},
+            "sessions": {"$sum": 1},
+            "cost_usd": {"$sum": "$cost_usd"},
+            **{t: {"$sum": f"${t}_tokens"} for t in TOKEN_TYPES}
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.day", "|", "$_id.kb_id"]},
+            "day": "$_id.day",
+            "kb_id": "$_id.kb_id",
+            "sessions": 1,
+            "cost_usd": 1,
+            "tokens": {t: f"${t}" for t in TOKEN_TYPES}
+        }},
+        {"$merge": {"into": "cost_rollups", "whenMatched": "replace"}}
+    ]
+    await get_sessions_collection().aggregate(pipeline).to_list(None)
+    count = await rollups.count_documents({})
+    logger.info(f"[ROLLUP] Backfilled {count} day/KB rollups")
+    return count
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Usage: python cost_rollups.py backfill")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    print(f"Backfilled {asyncio.run(backfill_mongo())} rollups")
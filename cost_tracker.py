@@ -3,8 +3,11 @@ Cost tracking for Azure OpenAI Realtime API
 Pricing: https://platform.openai.com/docs/models/gpt-realtime
 """
 import logging
+from collections import defaultdict
 from datetime import datetime
 from typing import Dict
+from monitoring import metrics
+from cost_ledger import cost_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -15,17 +18,36 @@ class CostTracker:
         "text_input": 4.00,      # $4.00 per 1M input tokens
         "text_output": 16.00,    # $16.00 per 1M output tokens
         "audio_input": 32.00,    # $32.00 per 1M audio input tokens
-        "audio_output": 64.00    # $64.00 per 1M audio output tokens
+        "audio_output": 64.00,   # $64.00 per 1M audio output tokens
+        "cached_text_input": 0.40,   # Prompt-cache hits, text and audio alike
+        "cached_audio_input": 0.40
     }
     
-    def __init__(self, session_id: str):
+    # GPT-4o mini Realtime, used by the economy profile when budgets are exceeded
+    ECONOMY_PRICES = {
+        "text_input": 0.60,
+        "text_output": 2.40,
+        "audio_input": 10.00,
+        "audio_output": 20.00,
+        "cached_text_input": 0.06,
+        "cached_audio_input": 0.30
+    }
+    
+    INPUT_TYPES = ("text_input", "audio_input", "cached_text_input", "cached_audio_input")
+    
+    def __init__(self, session_id: str, kb_id: str = None, deployment: str = None, prices: Dict[str, float] = None):
         self.session_id = session_id
+        self.kb_id = kb_id
+        self.deployment = deployment
+        self.prices = prices or self.PRICES
         self.start_time = datetime.utcnow()
         self.tokens = {
             "text_input": 0,
             "text_output": 0,
             "audio_input": 0,
-            "audio_output": 0
+            "audio_output": 0,
+            "cached_text_input": 0,
+            "cached_audio_input": 0
         }
     
     def add_usage(self, usage_data: dict):
@@ -39,15 +61,41 @@ class CostTracker:
         input_token_details = usage_data.get("input_token_details", {})
         output_token_details = usage_data.get("output_token_details", {})
         
-        # Text tokens
-        self.tokens["text_input"] += input_token_details.get("text_tokens", input_tokens)
-        self.tokens["text_output"] += output_token_details.get("text_tokens", output_tokens)
+        # Cached tokens are a subset of the text/audio input counts, billed at the cached rate
+        cached_details = input_token_details.get("cached_tokens_details") or {}
+        cached_text = cached_details.get("text_tokens", 0 if cached_details else input_token_details.get("cached_tokens", 0))
+        cached_audio = cached_details.get("audio_tokens", 0)
         
-        # Audio tokens
-        self.tokens["audio_input"] += input_token_details.get("audio_tokens", 0)
-        self.tokens["audio_output"] += output_token_details.get("audio_tokens", 0)
+        added = {
+            # Text tokens
+            "text_input": max(0, input_token_details.get("text_tokens", input_tokens) - cached_text),
+            "text_output": output_token_details.get("text_tokens", output_tokens),
+            # Audio tokens
+            "audio_input": max(0, input_token_details.get("audio_tokens", 0) - cached_audio),
+            "audio_output": output_token_details.get("audio_tokens", 0),
+            # Prompt-cache hits
+            "cached_text_input": cached_text,
+            "cached_audio_input": cached_audio
+        }
+        # Process-wide totals for /metrics/prometheus, priced with this session's table like the ledger
+        labels = {"kb_id": self.kb_id or "unknown", "deployment": self.deployment or "default"}
+        for token_type, count in added.items():
+            self.tokens[token_type] += count
+            if count:
+                metrics.increment("tokens", count, labels={"type": token_type, **labels})
         
-        logger.info(f"[COST] Session {self.session_id}: +{input_tokens} in, +{output_tokens} out")
+        cost = sum(count / 1_000_000 * self.prices[token_type] for token_type, count in added.items())
+        if cost:
+            metrics.increment("cost_usd", cost, labels=labels)
+        cost_ledger.record(self.kb_id, self.deployment, added, cost)
+        
+        logger.debug(f"[COST] Session {self.session_id}: +{input_tokens} in, +{output_tokens} out")
+    
+    def cache_hit_ratio(self) -> float:
+        """Share of input tokens served from the prompt cache"""
+        total = sum(self.tokens[t] for t in self.INPUT_TYPES)
+        cached = self.tokens["cached_text_input"] + self.tokens["cached_audio_input"]
+        return round(cached / total, 4) if total else 0.0
     
     def calculate_cost(self) -> Dict[str, float]:
         """Calculate total cost"""
@@ -55,7 +103,7 @@ class CostTracker:
         total = 0.0
         
         for token_type, count in self.tokens.items():
-            cost = (count / 1_000_000) * self.PRICES[token_type]
+            cost = (count / 1_000_000) * self.prices[token_type]
             costs[token_type] = round(cost, 6)
             total += cost
         
@@ -75,5 +123,21 @@ class CostTracker:
             "duration_seconds": cost_data["duration_seconds"],
             "tokens": cost_data["tokens"],
             "cost_usd": cost_data["total"],
-            "cost_breakdown": cost_data["breakdown"]
+            "cost_breakdown": cost_data["breakdown"],
+            "cache_hit_ratio": self.cache_hit_ratio()
         }
+
+def prompt_cache_stats(source=metrics) -> dict:
+    """Prompt-cache hit ratio per KB from the process-wide token counters"""
+    per_kb = defaultdict(lambda: {"input_tokens": 0, "cached_input_tokens": 0})
+    for (metric, labels), value in list(source.labeled_counters.items()):
+        label_map = dict(labels)
+        if metric != "tokens" or label_map.get("type") not in CostTracker.INPUT_TYPES:
+            continue
+        kb = per_kb[label_map.get("kb_id", "unknown")]
+        kb["input_tokens"] += value
+        if label_map["type"].startswith("cached_"):
+            kb["cached_input_tokens"] += value
+    for kb in per_kb.values():
+        kb["hit_ratio"] = round(kb["cached_input_tokens"] / kb["input_tokens"], 4) if kb["input_tokens"] else 0.0
+    return dict(per_kb)
@@ -2,6 +2,7 @@
 MongoDB connection and models
 """
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
 import os
 import logging
 
@@ -10,15 +11,16 @@ logger = logging.getLogger(__name__)
 # MongoDB connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "rag_liveavatar")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
 
 client = None
 db = None
 
 def get_database():
-    """Get MongoDB database instance"""
+    """Get MongoDB database instance (one pooled client shared by the whole process)"""
     global client, db
     if client is None:
-        client = AsyncIOMotorClient(MONGO_URL)
+        client = AsyncIOMotorClient(MONGO_URL, maxPoolSize=MONGO_MAX_POOL_SIZE)
         db = client[MONGO_DB_NAME]
         logger.info(f"[MONGO] Connected to {MONGO_DB_NAME}")
     return db
@@ -38,10 +40,10 @@ async def init_db():
         
         # Create indexes
         await sessions.create_index("session_id", unique=True)
-        await sessions.create_index("kb_id")
-        await sessions.create_index("created_at")
-        await messages.create_index("session_id")
-        await messages.create_index("timestamp")
+        await sessions.create_index([("created_at", DESCENDING), ("session_id", DESCENDING)])
+        await sessions.create_index([("kb_id", ASCENDING), ("created_at", DESCENDING), ("session_id", DESCENDING)])
+        await messages.create_index([("session_id", ASCENDING), ("timestamp", ASCENDING)])
+        await get_database()["cost_rollups"].create_index("day")
         
         logger.info("[MONGO] Indexes created")
     except Exception as e:
@@ -1,22 +1,38 @@
 """
 MongoDB-backed conversation logger
 """
+import asyncio
 from datetime import datetime
-from database import get_sessions_collection, get_messages_collection, init_db
+from database import get_sessions_collection, init_db
+from message_store import message_store
+from cost_rollups import record_session_cost
+from cost_ledger import TOKEN_TYPES
+from monitoring import metrics
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
 class MongoConversationLogger:
-    def __init__(self, session_id: str, kb_id: str, environment: str = "dev"):
+    """Messages are buffered and written with one insert_many (plus one $inc) per flush"""
+    def __init__(self, session_id: str, kb_id: str, environment: str = "dev",
+                 batch_size: int = None, flush_interval: float = None):
         self.session_id = session_id
         self.kb_id = kb_id
         self.environment = environment
         self.start_time = datetime.utcnow()
         self.messages = []
+        self.batch_size = batch_size or Config.MONGO_MESSAGE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.MONGO_MESSAGE_FLUSH_INTERVAL
+        self._pending = []
+        self._unsent = []  # message documents from a failed flush
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
     
     async def initialize(self):
         """Create session document in MongoDB"""
+        if not message_store.initialized:
+            await message_store.init()
         try:
             sessions = get_sessions_collection()
             session_doc = {
@@ -26,10 +42,7 @@ class MongoConversationLogger:
                 "end_time": None,
                 "duration_seconds": 0,
                 "message_count": 0,
-                "text_input_tokens": 0,
-                "text_output_tokens": 0,
-                "audio_input_tokens": 0,
-                "audio_output_tokens": 0,
+                **{f"{t}_tokens": 0 for t in TOKEN_TYPES},
                 "cost_usd": 0.0,
                 "cost_breakdown": {},
                 "environment": self.environment,
@@ -51,27 +64,48 @@ class MongoConversationLogger:
         }
         self.messages.append(message_data)
         
-        try:
-            # Save message to messages collection
-            messages = get_messages_collection()
-            message_doc = {
-                "session_id": self.session_id,
-                "timestamp": datetime.utcnow(),
-                "role": role,
-                "message_type": message_type,
-                "content": content,
-                "metadata": metadata or {}
-            }
-            await messages.insert_one(message_doc)
-            
-            # Update session message count
-            sessions = get_sessions_collection()
-            await sessions.update_one(
-                {"session_id": self.session_id},
-                {"$inc": {"message_count": 1}}
-            )
-        except Exception as e:
-            logger.error(f"[MONGO] Failed to log message: {e}")
+        self._pending.append({
+            "session_id": self.session_id,
+            "timestamp": datetime.utcnow(),
+            "role": role,
+            "message_type": message_type,
+            "content": content,
+            "metadata": metadata or {}
+        })
+        if len(self._pending) >= self.batch_size:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            await self.flush()
+        elif self._timer is None:
+            # Written at most flush_interval after the first unflushed message, with whatever followed it
+            self._timer = asyncio.create_task(self._flush_later())
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+    
+    async def flush(self):
+        """Write buffered messages and bump message_count once for the whole batch"""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            documents, self._unsent = self._unsent + batch, []
+            if not documents:
+                return
+            try:
+                inserted = await message_store.write(documents)
+                if inserted:
+                    await get_sessions_collection().update_one(
+                        {"session_id": self.session_id},
+                        {"$inc": {"message_count": inserted}}
+                    )
+                metrics.increment("mongo_message_flushes")
+            except Exception as e:
+                logger.error(f"[MONGO] Failed to log {len(documents)} message documents: {e}")
+                metrics.record_error("mongo_message_flush_failed")
+                # Re-sent with the next flush (see MessageStore.write for when a retry can duplicate)
+                self._unsent = documents[-Config.MONGO_MESSAGE_MAX_PENDING:]
     
     async def log_function_call(self, function_name: str, arguments: dict, result: str):
         """Log function call"""
@@ -84,6 +118,11 @@ class MongoConversationLogger:
     
     async def save(self, cost_summary: dict = None):
         """Update session with final cost and duration"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        
         try:
             sessions = get_sessions_collection()
             end_time = datetime.utcnow()
@@ -96,10 +135,8 @@ class MongoConversationLogger:
             
             if cost_summary:
                 update_data.update({
-                    "text_input_tokens": cost_summary['tokens']['text_input'],
-                    "text_output_tokens": cost_summary['tokens']['text_output'],
-                    "audio_input_tokens": cost_summary['tokens']['audio_input'],
-                    "audio_output_tokens": cost_summary['tokens']['audio_output'],
+                    # Every type the rollups (and their backfill) count, cached input included
+                    **{f"{t}_tokens": cost_summary['tokens'].get(t, 0) for t in TOKEN_TYPES},
                     "cost_usd": cost_summary['cost_usd'],
                     "cost_breakdown": cost_summary['cost_breakdown']
                 })
@@ -109,6 +146,9 @@ class MongoConversationLogger:
                 {"$set": update_data}
             )
             
+            if cost_summary:
+                await record_session_cost(self.session_id, self.kb_id, self.start_time, cost_summary)
+            
             logger.info(f"[MONGO] Updated session: {self.session_id}")
             return f"mongodb:{self.session_id}"
         except Exception as e:
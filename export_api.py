@@ -0,0 +1,127 @@
+"""
+Bulk NDJSON exports of sessions and messages, streamed from the file archive or MongoDB
+"""
+import json
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from admin_api import require_admin
+from archive import read_session
+from session_index import session_index, LIST_FIELDS
+from database import get_sessions_collection
+from message_store import message_store
+from mongo_api import session_query, SUMMARY_FIELDS
+from monitoring import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/export", dependencies=[Depends(require_admin)])
+
+SOURCES = ("files", "mongo")
+MESSAGE_FIELDS = ("session_id", "kb_id", "timestamp", "role", "type", "content", "metadata")
+PAGE_SIZE = 500
+
+def _default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def ndjson_line(row: dict) -> bytes:
+    return (json.dumps(row, ensure_ascii=False, default=_default) + "\n").encode("utf-8")
+
+def select_fields(fields: Optional[str], available: tuple) -> list:
+    return [f for f in fields.split(",") if f in available] if fields else list(available)
+
+async def index_pages(kb_id: Optional[str], since: Optional[str], until: Optional[str]) -> AsyncIterator[dict]:
+    """Session index rows matching the filters, one page in memory at a time"""
+    after = None
+    while True:
+        rows = await asyncio.to_thread(session_index.page, after, kb_id, since, until, PAGE_SIZE)
+        for row in rows:
+            yield row
+        if len(rows) < PAGE_SIZE:
+            return
+        after = (rows[-1]["start_time"], rows[-1]["session_id"])
+
+async def file_sessions(fields: list, kb_id, since, until) -> AsyncIterator[bytes]:
+    async for row in index_pages(kb_id, since, until):
+        yield ndjson_line({f: row.get(f) for f in fields})
+
+async def mongo_sessions(fields: list, kb_id, since, until) -> AsyncIterator[bytes]:
+    projection = {"_id": 0, **{f: 1 for f in fields}}
+    cursor = get_sessions_collection().find(session_query(kb_id, since, until), projection)
+    async for doc in cursor.sort([("created_at", 1), ("session_id", 1)]).batch_size(PAGE_SIZE):
+        yield ndjson_line({f: doc.get(f) for f in fields})
+
+async def file_messages(fields: list, kb_id, since, until) -> AsyncIterator[bytes]:
+    async for row in index_pages(kb_id, since, until):
+        try:
+            document = await asyncio.to_thread(read_session, row, "conversations")
+        except (OSError, ValueError) as e:
+            logger.error(f"[EXPORT] Skipping session {row['session_id']}: {e}")
+            continue
+        for message in document.get("messages", []):
+            message = {"session_id": row["session_id"], "kb_id": row["kb_id"], **message}
+            yield ndjson_line({f: message.get(f) for f in fields})
+
+async def mongo_messages(fields: list, kb_id, since, until) -> AsyncIterator[bytes]:
+    sessions = get_sessions_collection().find(session_query(kb_id, since, until), {"_id": 0, "session_id": 1, "kb_id": 1})
+    async for session in sessions.sort([("created_at", 1), ("session_id", 1)]).batch_size(PAGE_SIZE):
+        async for document in message_store.cursor(session["session_id"]):
+            for message in document["messages"] if message_store.layout == "buckets" else [document]:
+                message = {"session_id": session["session_id"], "kb_id": session.get("kb_id"),
+                           "type": message.get("message_type"), **message}
+                yield ndjson_line({f: message.get(f) for f in fields})
+
+async def guarded(lines: AsyncIterator[bytes], export: str) -> AsyncIterator[bytes]:
+    """Headers are already sent once streaming starts, so a failure can only end the stream"""
+    count = 0
+    try:
+        async for line in lines:
+            count += 1
+            yield line
+    except Exception as e:
+        logger.error(f"[EXPORT] {export} export failed after {count} rows: {e}")
+        metrics.record_error("export_failed")
+    else:
+        logger.info(f"[EXPORT] {export} export: {count} rows")
+
+def stream(lines: AsyncIterator[bytes], export: str) -> StreamingResponse:
+    metrics.increment("exports", labels={"export": export})
+    return StreamingResponse(
+        guarded(lines, export),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{export}.ndjson"'}
+    )
+
+def invalid_request(source: str, since: Optional[str], until: Optional[str]) -> Optional[JSONResponse]:
+    if source not in SOURCES:
+        return JSONResponse({"error": f"source must be one of {SOURCES}"}, status_code=400)
+    try:
+        session_query(since=since, until=until)
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid date: {e}"}, status_code=400)
+    return None
+
+@router.get("/sessions")
+async def export_sessions(source: str = "files", kb_id: Optional[str] = None, since: Optional[str] = None,
+                          until: Optional[str] = None, fields: Optional[str] = None):
+    """One NDJSON line per session (since inclusive, until exclusive, ISO dates)"""
+    error = invalid_request(source, since, until)
+    if error:
+        return error
+    if source == "mongo":
+        return stream(mongo_sessions(select_fields(fields, SUMMARY_FIELDS), kb_id, since, until), "sessions")
+    return stream(file_sessions(select_fields(fields, LIST_FIELDS), kb_id, since, until), "sessions")
+
+@router.get("/messages")
+async def export_messages(source: str = "files", kb_id: Optional[str] = None, since: Optional[str] = None,
+                          until: Optional[str] = None, fields: Optional[str] = None):
+    """One NDJSON line per message of every matching session, in session order"""
+    error = invalid_request(source, since, until)
+    if error:
+        return error
+    if source == "mongo":
+        return stream(mongo_messages(select_fields(fields, MESSAGE_FIELDS), kb_id, since, until), "messages")
+    return stream(file_messages(select_fields(fields, MESSAGE_FIELDS), kb_id, since, until), "messages")
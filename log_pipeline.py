@@ -0,0 +1,156 @@
+"""
+Non-blocking structured logging: records are queued on the caller and written by a background thread
+"""
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import threading
+import contextvars
+from datetime import datetime, timezone
+from typing import Optional
+import logging
+import logging.handlers
+from monitoring import metrics
+from config import Config
+
+# Correlation ID for every record logged while serving a session (copied into tasks and to_thread calls)
+session_id_var = contextvars.ContextVar("session_id", default=None)
+
+def parse_sample_rates(spec: str) -> dict:
+    """"[METRIC]=0.1,[COST]=0.2" -> {"[METRIC]": 0.1, "[COST]": 0.2}"""
+    rates = {}
+    for part in (spec or "").split(","):
+        tag, _, rate = part.strip().partition("=")
+        if tag and rate:
+            rates[tag.strip()] = float(rate)
+    return rates
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        session_id = getattr(record, "session_id", None)
+        if session_id:
+            entry["session_id"] = session_id
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class ContextFilter(logging.Filter):
+    """Stamps the session correlation ID while still on the calling task"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "session_id", None) is None:
+            record.session_id = session_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Per-logger token bucket plus 1-in-N sampling of hot tagged messages
+
+    WARNING and above always pass. A record let through after others were
+    rate limited carries the number suppressed in between.
+    """
+    def __init__(self, rate_per_second: float, burst: int, sample_rates: Optional[dict] = None):
+        super().__init__()
+        self.rate = rate_per_second
+        self.burst = burst
+        self.sample_every = {tag: max(1, round(1 / rate)) for tag, rate in (sample_rates or {}).items() if rate > 0}
+        self.buckets = {}  # logger name -> [tokens, last refill, suppressed]
+        self.seen = {}  # tag -> count
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        message = record.msg if isinstance(record.msg, str) else ""
+        with self._lock:
+            for tag, every in self.sample_every.items():
+                if message.startswith(tag):
+                    self.seen[tag] = self.seen.get(tag, 0) + 1
+                    if (self.seen[tag] - 1) % every:
+                        return False
+                    break
+
+            if self.rate <= 0:
+                return True
+            now = time.monotonic()
+            bucket = self.buckets.setdefault(record.name, [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                metrics.increment("log_records_rate_limited")
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Drops (and counts) records instead of waiting when the writer falls behind"""
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("log_records_dropped")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only resolve what can't cross threads; JSON formatting happens on the writer
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+
+def setup_logging(stream=None) -> logging.handlers.QueueListener:
+    """Replace root handlers with the queue pipeline; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if Config.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(session_id)s] %(message)s"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(
+        Config.LOG_RATE_PER_SECOND, Config.LOG_RATE_BURST, parse_sample_rates(Config.LOG_SAMPLE_RATES)
+    ))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(Config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # Writer is daemonic; whatever is still queued is lost
+        _listener = None
@@ -0,0 +1,147 @@
+"""
+Event-loop lag monitor: measures scheduling delay and attributes stalls to the blocking call site
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from typing import Optional
+import logging
+from monitoring import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STACK_DEPTH = 12
+
+def describe(frame_summary) -> str:
+    return f"{os.path.basename(frame_summary.filename)}:{frame_summary.lineno} {frame_summary.name}"
+
+def call_site(frame):
+    """(innermost relay-code frame, last STACK_DEPTH frames) for a live frame"""
+    stack = traceback.extract_stack(frame)
+    own = [
+        f for f in stack
+        if f.filename.startswith(APP_DIR) and "site-packages" not in f.filename
+        and os.path.basename(f.filename) != "loop_monitor.py"
+    ]
+    site = own[-1] if own else stack[-1]
+    return describe(site), [describe(f) for f in stack[-STACK_DEPTH:]]
+
+class LoopLagMonitor:
+    """Heartbeat coroutine measures lag; a watchdog thread snapshots the loop thread's stack mid-stall
+
+    The coroutine can only measure a stall once it is over, so the watchdog
+    captures where the loop thread is while it is still blocked.
+    """
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, max_sites: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_sites = max_sites
+        self.offenders = {}  # call site -> {"count", "total_seconds", "max_seconds", "stack"}
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = None
+        self._pending = None  # (site, stack) captured during the current stall
+        self._loop_thread = None
+        self._lock = threading.Lock()
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            metrics.record_latency("event_loop_lag", lag)
+            if lag >= self.threshold:
+                self.record_stall(lag)
+            else:
+                self._pending = None
+
+    def record_stall(self, lag: float):
+        with self._lock:
+            site, stack = self._pending or ("unattributed", [])
+            self._pending = None
+            self.stalls += 1
+            self.max_lag = max(self.max_lag, lag)
+            offender = self.offenders.get(site)
+            if offender is None:
+                if len(self.offenders) >= self.max_sites:
+                    site, offender = "other", self.offenders.setdefault(
+                        "other", {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "stack": []})
+                else:
+                    offender = self.offenders[site] = {
+                        "count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "stack": stack}
+            offender["count"] += 1
+            offender["total_seconds"] += lag
+            offender["max_seconds"] = max(offender["max_seconds"], lag)
+        metrics.increment("event_loop_stalls")
+        logger.warning(f"[LOOP] Event loop blocked {lag * 1000:.0f}ms at {site}")
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            if beat is None or self._pending is not None:
+                continue
+            if time.monotonic() - beat - self.interval >= self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._pending = call_site(frame)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._loop_thread = threading.get_ident()
+            self._stopped.clear()
+            self._task = asyncio.create_task(self.run())
+            self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+            self._watchdog.start()
+            logger.info(f"[LOOP] Lag monitor started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        with self._lock:
+            self.offenders.clear()
+            self.stalls = 0
+            self.max_lag = 0.0
+
+    def get_stats(self, top: Optional[int] = None) -> dict:
+        with self._lock:
+            ranked = sorted(self.offenders.items(), key=lambda kv: kv[1]["total_seconds"], reverse=True)
+            offenders = [
+                {
+                    "call_site": site,
+                    "count": o["count"],
+                    "total_ms": round(o["total_seconds"] * 1000, 1),
+                    "max_ms": round(o["max_seconds"] * 1000, 1),
+                    "stack": o["stack"]
+                }
+                for site, o in ranked[:top]
+            ]
+        lag = metrics.latencies.get("event_loop_lag")
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": round(self.interval * 1000),
+            "threshold_ms": round(self.threshold * 1000),
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "lag": lag.summary() if lag else None,
+            "offenders": offenders
+        }
+
+loop_monitor = LoopLagMonitor(Config.LOOP_LAG_INTERVAL_MS / 1000, Config.LOOP_LAG_THRESHOLD_MS / 1000)
@@ -0,0 +1,165 @@
+"""
+Storage layouts for MongoDB transcript messages, with TTL retention
+
+documents  - one document per message in `messages` (the original layout)
+buckets    - up to MONGO_MESSAGE_BUCKET_SIZE messages of a session per document in `message_buckets`;
+             messages are pushed into the session's open bucket across flushes
+timeseries - a MongoDB time-series collection `messages_ts` with session_id as the metaField
+"""
+from typing import List, Optional
+import logging
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+from database import get_database, get_messages_collection
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ("documents", "buckets", "timeseries")
+DUPLICATE_KEY = 11000
+MESSAGE_PROJECTION = {"_id": 0, "timestamp": 1, "role": 1, "message_type": 1, "content": 1, "metadata": 1}
+
+class MessageStore:
+    """Writes and reads a session's messages in the configured layout"""
+    def __init__(self, layout: str = "documents", bucket_size: int = 50, ttl_days: float = 0):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown message layout {layout!r}, expected one of {LAYOUTS}")
+        self.layout = layout
+        self.bucket_size = bucket_size
+        self.ttl_days = ttl_days
+        self.initialized = False
+
+    @property
+    def collection(self):
+        if self.layout == "buckets":
+            return get_database()["message_buckets"]
+        if self.layout == "timeseries":
+            return get_database()["messages_ts"]
+        return get_messages_collection()
+
+    @property
+    def ttl_seconds(self) -> int:
+        return int(self.ttl_days * 86400)
+
+    async def init(self):
+        """Create the collection and its indexes (idempotent; also applies a changed TTL)"""
+        ttl = {"expireAfterSeconds": self.ttl_seconds} if self.ttl_days else {}
+        try:
+            if self.layout == "timeseries":
+                try:
+                    await get_database().create_collection(
+                        "messages_ts",
+                        timeseries={"timeField": "timestamp", "metaField": "session_id", "granularity": "seconds"},
+                        **ttl
+                    )
+                except CollectionInvalid:
+                    # Already exists; bring its expiry in line with the configuration
+                    await get_database().command("collMod", "messages_ts", expireAfterSeconds=self.ttl_seconds or "off")
+                await self.collection.create_index([("session_id", 1), ("timestamp", 1)])
+            elif self.layout == "buckets":
+                await self.collection.create_index([("session_id", 1), ("start", 1)])
+                await self.ensure_ttl_index("end")
+            else:
+                await self.collection.create_index([("session_id", 1), ("timestamp", 1)])
+                await self.ensure_ttl_index("timestamp")
+            self.initialized = True
+            logger.info(f"[MONGO] Message store ready ({self.layout}, ttl {self.ttl_days or 'off'} days)")
+        except Exception as e:
+            logger.error(f"[MONGO] Failed to set up message store: {e}")
+
+    async def ensure_ttl_index(self, field: str):
+        """Make the single-field index on `field` expire documents after ttl_days (0: no expiry)
+
+        An existing index can't be re-created with other options (databases set
+        up before TTL support already have a plain timestamp_1), so it is
+        converted in place with collMod, or dropped and re-created plain when
+        TTL is turned off.
+        """
+        name = f"{field}_1"
+        existing = (await self.collection.index_information()).get(name)
+        if existing is None:
+            if self.ttl_seconds:
+                await self.collection.create_index(field, expireAfterSeconds=self.ttl_seconds)
+        elif not self.ttl_seconds:
+            if "expireAfterSeconds" in existing:
+                await self.collection.drop_index(name)
+                await self.collection.create_index(field)
+        elif existing.get("expireAfterSeconds") != self.ttl_seconds:
+            await get_database().command("collMod", self.collection.name,
+                                         index={"keyPattern": {field: 1}, "expireAfterSeconds": self.ttl_seconds})
+            logger.info(f"[MONGO] {self.collection.name}.{name} now expires after {self.ttl_days} days")
+
+    def bucket_update(self, message: dict) -> UpdateOne:
+        """Append to the session's open bucket, or open a new one once it holds bucket_size messages"""
+        return UpdateOne(
+            {"session_id": message["session_id"], "count": {"$lt": self.bucket_size}},
+            {
+                "$push": {"messages": {k: v for k, v in message.items() if k != "session_id"}},
+                "$inc": {"count": 1},
+                "$min": {"start": message["timestamp"]},
+                "$max": {"end": message["timestamp"]}
+            },
+            upsert=True
+        )
+
+    async def write(self, documents: List[dict]) -> int:
+        """Store message documents in the configured layout; returns how many are now stored
+
+        documents/timeseries: insert_many(ordered=False). Documents keep the
+        _id pymongo assigns, so re-sending them after a failure only produces
+        duplicate-key errors, which count as stored. (Time-series collections
+        don't enforce unique _id, so a retry there can duplicate messages.)
+
+        buckets: one ordered bulk_write of per-message upserts, so each push
+        sees the bucket the previous one filled. A rejected message is skipped
+        and the rest re-sent; a retry after a lost connection can duplicate
+        the messages that landed before it.
+        """
+        if not documents:
+            return 0
+        if self.layout == "buckets":
+            return await self._push_to_buckets(documents)
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+            return len(documents)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY}
+            if failed:
+                logger.error(f"[MONGO] {len(failed)} of {len(documents)} message documents rejected")
+            return len(documents) - len(failed)
+
+    async def _push_to_buckets(self, messages: List[dict]) -> int:
+        updates = [self.bucket_update(message) for message in messages]
+        written = 0
+        while updates:
+            try:
+                await self.collection.bulk_write(updates, ordered=True)
+                return written + len(updates)
+            except BulkWriteError as e:
+                # Ordered: everything before the first error was applied, nothing after it
+                index = e.details["writeErrors"][0]["index"]
+                logger.error(f"[MONGO] Message rejected from bucket write: {e.details['writeErrors'][0].get('errmsg')}")
+                written += index
+                updates = updates[index + 1:]
+        return written
+
+    def cursor(self, session_id: str):
+        """Query behind transcript reads (also used for explain checks)"""
+        if self.layout == "buckets":
+            return self.collection.find({"session_id": session_id}, {"_id": 0, "messages": 1}).sort("start", 1)
+        return self.collection.find({"session_id": session_id}, MESSAGE_PROJECTION).sort("timestamp", 1)
+
+    async def read(self, session_id: str, limit: Optional[int] = None) -> List[dict]:
+        """A session's messages in time order"""
+        messages = []
+        async for document in self.cursor(session_id):
+            messages.extend(document["messages"] if self.layout == "buckets" else [document])
+            if limit and len(messages) >= limit:
+                return messages[:limit]
+        return messages
+
+message_store = MessageStore(
+    layout=Config.MONGO_MESSAGE_LAYOUT,
+    bucket_size=Config.MONGO_MESSAGE_BUCKET_SIZE,
+    ttl_days=Config.MONGO_MESSAGE_TTL_DAYS
+)
@@ -3,66 +3,111 @@ MongoDB API endpoints for sessions
 """
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from database import get_sessions_collection, get_messages_collection
+from typing import Optional
+from database import get_sessions_collection
+from message_store import message_store
+from cost_rollups import summarize_rollups, mongo_rollups
 from datetime import datetime
+import json
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+SUMMARY_FIELDS = ("session_id", "kb_id", "start_time", "end_time", "duration_seconds", "message_count", "cost_usd", "created_at")
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque keyset cursor for the last session of a page"""
+    key = json.dumps([doc["created_at"].isoformat(), doc["session_id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), session_id
+
+def session_query(kb_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                  cursor: Optional[str] = None) -> dict:
+    """Filter for one page of sessions, newest first, keyed on (created_at, session_id)"""
+    query = {}
+    if kb_id:
+        query["kb_id"] = kb_id
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = datetime.fromisoformat(since)
+        if until:
+            query["created_at"]["$lt"] = datetime.fromisoformat(until)
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "session_id": {"$lt": session_id}}
+        ]
+    return query
+
+SESSION_SORT = [("created_at", -1), ("session_id", -1)]
+
+def isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
 @router.get("/sessions")
-async def list_sessions():
-    """List all sessions from MongoDB"""
+async def list_sessions(limit: int = 50, cursor: Optional[str] = None, kb_id: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None, fields: Optional[str] = None):
+    """List sessions from MongoDB, newest first; pass next_cursor back as cursor for the next page"""
     try:
+        limit = max(1, min(limit, 500))
+        wanted = [f for f in (fields.split(",") if fields else SUMMARY_FIELDS) if f in SUMMARY_FIELDS]
+        projection = {"_id": 0, "created_at": 1, "session_id": 1, **{f: 1 for f in wanted}}
+        
         sessions = get_sessions_collection()
-        cursor = sessions.find().sort("created_at", -1).limit(100)
+        query = session_query(kb_id, since, until, cursor)
+        docs = await sessions.find(query, projection).sort(SESSION_SORT).limit(limit + 1).to_list(limit + 1)
         
-        sessions_list = []
-        async for doc in cursor:
-            sessions_list.append({
-                "session_id": doc.get("session_id"),
-                "kb_id": doc.get("kb_id"),
-                "start_time": doc.get("start_time").isoformat() if doc.get("start_time") else None,
-                "duration_seconds": doc.get("duration_seconds", 0),
-                "message_count": doc.get("message_count", 0),
-                "cost_usd": doc.get("cost_usd", 0.0)
-            })
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        sessions_list = [{f: isoformat(doc.get(f)) for f in wanted} for doc in docs]
         
-        return JSONResponse({"sessions": sessions_list, "total": len(sessions_list)})
+        return JSONResponse({
+            "sessions": sessions_list,
+            "count": len(sessions_list),
+            "next_cursor": encode_cursor(docs[-1]) if has_more else None
+        })
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid cursor or date: {e}"}, status_code=400)
     except Exception as e:
         logger.error(f"[MONGO] Failed to list sessions: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @router.get("/sessions/{session_id}")
-async def get_session(session_id: str):
+async def get_session(session_id: str, include_messages: bool = True):
     """Get session details from MongoDB"""
     try:
         sessions = get_sessions_collection()
-        messages = get_messages_collection()
         
         # Get session
-        session = await sessions.find_one({"session_id": session_id})
+        session = await sessions.find_one({"session_id": session_id}, {"_id": 0})
         if not session:
             return JSONResponse({"error": "Session not found"}, status_code=404)
         
-        # Get messages
-        cursor = messages.find({"session_id": session_id}).sort("timestamp", 1)
+        # Get messages from whichever layout the store uses, only the fields we return
         messages_list = []
-        async for msg in cursor:
-            messages_list.append({
-                "timestamp": msg.get("timestamp").isoformat() if msg.get("timestamp") else None,
-                "role": msg.get("role"),
-                "type": msg.get("message_type"),
-                "content": msg.get("content"),
-                "metadata": msg.get("metadata", {})
-            })
+        if include_messages:
+            for msg in await message_store.read(session_id):
+                messages_list.append({
+                    "timestamp": isoformat(msg.get("timestamp")),
+                    "role": msg.get("role"),
+                    "type": msg.get("message_type"),
+                    "content": msg.get("content"),
+                    "metadata": msg.get("metadata", {})
+                })
         
         # Format response
         response = {
             "session_id": session.get("session_id"),
             "kb_id": session.get("kb_id"),
-            "start_time": session.get("start_time").isoformat() if session.get("start_time") else None,
-            "end_time": session.get("end_time").isoformat() if session.get("end_time") else None,
+            "start_time": isoformat(session.get("start_time")),
+            "end_time": isoformat(session.get("end_time")),
             "duration_seconds": session.get("duration_seconds", 0),
             "message_count": session.get("message_count", 0),
             "messages": messages_list,
@@ -84,52 +129,52 @@ async def get_session(session_id: str):
         logger.error(f"[MONGO] Failed to get session: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def plan_stages(plan: dict) -> list:
+    """Stage names of an explain() winning plan, outermost first"""
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+async def explain_dashboard_queries() -> dict:
+    """Winning plans of the queries behind the dashboard, flagging scans and in-memory sorts"""
+    sessions = get_sessions_collection()
+    probes = {
+        "list_sessions": sessions.find({}, {"_id": 0, "created_at": 1, "session_id": 1}).sort(SESSION_SORT).limit(50),
+        "list_sessions_by_kb": sessions.find({"kb_id": "probe"}, {"_id": 0}).sort(SESSION_SORT).limit(50),
+        "session_by_id": sessions.find({"session_id": "probe"}, {"_id": 0}).limit(1),
+        "session_messages": message_store.cursor("probe")
+    }
+    report = {}
+    for name, cursor in probes.items():
+        explain = await cursor.explain()
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        report[name] = {
+            "stages": stages,
+            "uses_index": "IXSCAN" in stages and "COLLSCAN" not in stages,
+            "in_memory_sort": "SORT" in stages,
+            "covered": "IXSCAN" in stages and "FETCH" not in stages and "COLLSCAN" not in stages
+        }
+        if not report[name]["uses_index"] or report[name]["in_memory_sort"]:
+            logger.warning(f"[MONGO] Dashboard query {name} is not index-backed: {stages}")
+    return report
+
+@router.get("/index-coverage")
+async def index_coverage():
+    """Explain-based check that dashboard queries run off indexes"""
+    try:
+        return JSONResponse(await explain_dashboard_queries())
+    except Exception as e:
+        logger.error(f"[MONGO] Explain failed: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
 @router.get("/cost-summary")
-async def get_cost_summary():
-    """Get cost summary from MongoDB"""
+async def get_cost_summary(since: Optional[str] = None, until: Optional[str] = None, kb_id: Optional[str] = None):
+    """Get cost summary from the MongoDB day/KB rollups"""
     try:
-        sessions = get_sessions_collection()
-        
-        # Aggregate costs
-        pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "total_cost": {"$sum": "$cost_usd"},
-                    "total_sessions": {"$sum": 1},
-                    "total_text_input": {"$sum": "$text_input_tokens"},
-                    "total_text_output": {"$sum": "$text_output_tokens"},
-                    "total_audio_input": {"$sum": "$audio_input_tokens"},
-                    "total_audio_output": {"$sum": "$audio_output_tokens"}
-                }
-            }
-        ]
-        
-        result = await sessions.aggregate(pipeline).to_list(1)
-        
-        if result:
-            data = result[0]
-            total_sessions = data.get("total_sessions", 0)
-            total_cost = data.get("total_cost", 0.0)
-            
-            return JSONResponse({
-                "total_cost_usd": round(total_cost, 6),
-                "total_sessions": total_sessions,
-                "total_tokens": {
-                    "text_input": data.get("total_text_input", 0),
-                    "text_output": data.get("total_text_output", 0),
-                    "audio_input": data.get("total_audio_input", 0),
-                    "audio_output": data.get("total_audio_output", 0)
-                },
-                "average_cost_per_session": round(total_cost / total_sessions, 6) if total_sessions > 0 else 0
-            })
-        else:
-            return JSONResponse({
-                "total_cost_usd": 0,
-                "total_sessions": 0,
-                "total_tokens": {"text_input": 0, "text_output": 0, "audio_input": 0, "audio_output": 0},
-                "average_cost_per_session": 0
-            })
+        return JSONResponse(summarize_rollups(await mongo_rollups(since, until, kb_id)))
     except Exception as e:
         logger.error(f"[MONGO] Failed to get cost summary: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
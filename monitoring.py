@@ -2,56 +2,273 @@
 Monitoring and metrics
 """
 import time
+import threading
 from collections import defaultdict
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations in microseconds
+
+    Values below 2**SUB_BITS are stored exactly; above that every power of
+    two is split into 2**SUB_BITS linear sub-buckets, so any recorded value
+    is within ~3% of its bucket. Memory is fixed and recording is O(1).
+    """
+    SUB_BITS = 5
+    MAX_BITS = 30  # ~18 minutes in microseconds; larger values are clamped
+
+    def __init__(self):
+        self.sub_count = 1 << self.SUB_BITS
+        self.max_value = (1 << self.MAX_BITS) - 1
+        self.counts = [0] * (self.bucket_index(self.max_value) + 1)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def bucket_index(cls, value: int) -> int:
+        if value < (1 << cls.SUB_BITS):
+            return value
+        exponent = value.bit_length() - cls.SUB_BITS - 1
+        return (exponent << cls.SUB_BITS) + (value >> exponent)
+
+    @classmethod
+    def bucket_bounds(cls, index: int):
+        """(lowest, highest) value that maps to a bucket"""
+        if index < (1 << cls.SUB_BITS):
+            return index, index
+        exponent = (index >> cls.SUB_BITS) - 1
+        mantissa = index - (exponent << cls.SUB_BITS)
+        return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+    def record(self, seconds: float):
+        value = min(max(int(seconds * 1_000_000), 0), self.max_value)
+        index = self.bucket_index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum += value
+            self.max = max(self.max, value)
+            self.min = value if self.min is None else min(self.min, value)
+
+    def percentile(self, p: float) -> float:
+        """Value (seconds) at percentile p, 0-100"""
+        with self._lock:
+            if self.total == 0:
+                return 0.0
+            rank = max(1, int(round(self.total * p / 100)))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    low, high = self.bucket_bounds(index)
+                    value = min((low + high) / 2, self.max)
+                    return max(value, self.min) / 1_000_000
+        return self.max / 1_000_000
+
+    def cumulative(self, bounds) -> list:
+        """Counts of values <= each bound (seconds), for Prometheus `le` buckets"""
+        with self._lock:
+            result = []
+            seen = 0
+            index = 0
+            for bound in bounds:
+                limit = bound * 1_000_000
+                while index < len(self.counts) and self.bucket_bounds(index)[1] <= limit:
+                    seen += self.counts[index]
+                    index += 1
+                result.append(seen)
+            return result
+
+    def mean(self) -> float:
+        return (self.sum / self.total / 1_000_000) if self.total else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "p50": round(self.percentile(50), 3),
+            "p90": round(self.percentile(90), 3),
+            "p99": round(self.percentile(99), 3),
+            "max": round(self.max / 1_000_000, 3)
+        }
+
+class RollingWindow:
+    """Ring buffer of time buckets holding requests, errors and latency buckets
+
+    Answers "what happened in the last 1/5/15 minutes" without keeping
+    individual samples; latencies reuse LatencyHistogram's bucket layout,
+    stored sparsely per time bucket.
+    """
+    WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+
+    def __init__(self, span_seconds: int = 900, bucket_seconds: int = 10):
+        self.bucket_seconds = bucket_seconds
+        self.slots = [None] * (span_seconds // bucket_seconds)
+        self._lock = threading.Lock()
+
+    def _slot(self, now: float):
+        epoch = int(now // self.bucket_seconds)
+        index = epoch % len(self.slots)
+        slot = self.slots[index]
+        if slot is None or slot["epoch"] != epoch:
+            slot = {"epoch": epoch, "requests": 0, "errors": 0, "latency": defaultdict(int)}
+            self.slots[index] = slot
+        return slot
+
+    def add_request(self, latency: float = None, now: float = None):
+        with self._lock:
+            slot = self._slot(now or time.time())
+            slot["requests"] += 1
+            if latency is not None:
+                value = min(max(int(latency * 1_000_000), 0), (1 << LatencyHistogram.MAX_BITS) - 1)
+                slot["latency"][LatencyHistogram.bucket_index(value)] += 1
+
+    def add_error(self, now: float = None):
+        with self._lock:
+            self._slot(now or time.time())["errors"] += 1
+
+    def _collect(self, window_seconds: int, now: float):
+        newest = int(now // self.bucket_seconds)
+        oldest = newest - max(1, window_seconds // self.bucket_seconds) + 1
+        requests = errors = 0
+        latency = defaultdict(int)
+        with self._lock:
+            for slot in self.slots:
+                if slot is not None and oldest <= slot["epoch"] <= newest:
+                    requests += slot["requests"]
+                    errors += slot["errors"]
+                    for index, count in slot["latency"].items():
+                        latency[index] += count
+        return requests, errors, latency
+
+    def summary(self, window_seconds: int, now: float = None) -> dict:
+        requests, errors, latency = self._collect(window_seconds, now or time.time())
+        result = {
+            "requests": requests,
+            "errors": errors,
+            "rate_per_min": round(requests * 60 / window_seconds, 2),
+            "error_rate": round(min(1.0, errors / requests), 4) if requests else 0.0
+        }
+        total = sum(latency.values())
+        if total:
+            ordered = sorted(latency.items())
+            for p in (50, 95, 99):
+                rank, seen = max(1, int(round(total * p / 100))), 0
+                for index, count in ordered:
+                    seen += count
+                    if seen >= rank:
+                        low, high = LatencyHistogram.bucket_bounds(index)
+                        result[f"p{p}"] = round((low + high) / 2 / 1_000_000, 3)
+                        break
+        return result
+
+    def latency_over(self, threshold: float, window_seconds: int, now: float = None):
+        """(samples with latency above threshold seconds, total latency samples)"""
+        _, _, latency = self._collect(window_seconds, now or time.time())
+        limit = threshold * 1_000_000
+        slow = sum(count for index, count in latency.items() if LatencyHistogram.bucket_bounds(index)[0] > limit)
+        return slow, sum(latency.values())
+
+    def snapshot(self, now: float = None) -> dict:
+        now = now or time.time()
+        return {name: self.summary(seconds, now) for name, seconds in self.WINDOWS.items()}
+
+class Timer:
+    """Per-invocation timer handle, safe when the same operation runs concurrently"""
+    __slots__ = ("metrics", "operation", "started", "duration")
+
+    def __init__(self, metrics: "Metrics", operation: str):
+        self.metrics = metrics
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def stop(self) -> float:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+            logger.info(f"[METRIC] {self.operation}: {self.duration:.3f}s")
+            self.metrics.record_latency(self.operation, self.duration)
+        return self.duration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Failed operations are counted by record_error(..., operation=...), not as latencies
+        if exc_type is None:
+            self.stop()
+        return False
+
 class Metrics:
     def __init__(self):
         self.counters = defaultdict(int)
-        self.timers = {}
+        self.labeled_counters = defaultdict(int)  # (metric, ((label, value), ...)) -> count
         self.errors = defaultdict(int)
         self.start_time = time.time()
-        self.latencies = defaultdict(list)  # Track latency history
-    
-    def increment(self, metric: str, value: int = 1):
+        self.latencies = defaultdict(LatencyHistogram)
+        self.windows = defaultdict(RollingWindow)  # Recent activity per operation
+
+    def increment(self, metric: str, value: int = 1, labels: dict = None):
         self.counters[metric] += value
-    
-    def start_timer(self, operation: str):
-        self.timers[operation] = time.time()
-    
-    def end_timer(self, operation: str):
-        if operation in self.timers:
-            duration = time.time() - self.timers[operation]
-            logger.info(f"[METRIC] {operation}: {duration:.3f}s")
-            self.latencies[operation].append(duration)
-            # Keep only last 100 measurements
-            if len(self.latencies[operation]) > 100:
-                self.latencies[operation].pop(0)
-            del self.timers[operation]
-            return duration
-        return None
-    
-    def record_error(self, error_type: str):
+        if labels:
+            self.labeled_counters[(metric, tuple(sorted(labels.items())))] += value
+
+    def start_timer(self, operation: str) -> Timer:
+        """Start timing one invocation; pass the handle to end_timer"""
+        return Timer(self, operation)
+
+    def end_timer(self, timer: Timer):
+        return timer.stop() if timer else None
+
+    def timer(self, operation: str) -> Timer:
+        """Context manager form: `with metrics.timer("rag_search"): ...`"""
+        return Timer(self, operation)
+
+    def record_latency(self, operation: str, duration: float):
+        """Record a latency measured elsewhere (seconds)"""
+        self.latencies[operation].record(duration)
+        self.windows[operation].add_request(duration)
+
+    def record_event(self, operation: str, ok: bool = True):
+        """Count one attempt of an operation that has no latency of its own"""
+        self.windows[operation].add_request()
+        if not ok:
+            self.windows[operation].add_error()
+
+    def record_error(self, error_type: str, operation: str = None):
+        """Count an error; `operation` also counts it as a failed request of that operation"""
         self.errors[error_type] += 1
         self.increment("total_errors")
-    
+        self.windows["errors"].add_request()
+        if operation:
+            self.record_event(operation, ok=False)
+
+    def get_windows(self) -> dict:
+        """1m / 5m / 15m rates, error rates and latency percentiles"""
+        now = time.time()
+        return {op: window.snapshot(now) for op, window in list(self.windows.items())}
+
     def get_stats(self):
         uptime = time.time() - self.start_time
-        
-        # Calculate average latencies
+
         avg_latencies = {}
-        for op, times in self.latencies.items():
-            if times:
-                avg_latencies[op] = round(sum(times) / len(times), 3)
-        
+        latency_percentiles = {}
+        for op, histogram in list(self.latencies.items()):
+            if histogram.total:
+                avg_latencies[op] = round(histogram.mean(), 3)
+                latency_percentiles[op] = histogram.summary()
+
         return {
             "uptime_seconds": round(uptime, 2),
             "counters": dict(self.counters),
             "errors": dict(self.errors),
             "avg_latencies": avg_latencies,
+            "latency_percentiles": latency_percentiles,
+            "windows": self.get_windows(),
             "timestamp": datetime.utcnow().isoformat()
         }
 
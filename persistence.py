@@ -0,0 +1,281 @@
+"""
+Background persistence of finished sessions: one writer task, one pooled Mongo client
+"""
+import os
+import json
+import glob
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
+import logging
+from pymongo.errors import BulkWriteError
+from session_journal import read_journal
+from session_index import session_index, summarize
+from database import get_database
+from resilience import retry_async
+from monitoring import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+def write_json_file(filepath: str, document: dict):
+    """Atomic write, so readers never see a half-written session"""
+    tmp = f"{filepath}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False)
+    os.replace(tmp, filepath)
+
+class PersistenceService:
+    """Takes finished sessions from a bounded queue and writes them in batches
+
+    Files are written off the event loop; Mongo gets one insert_many per
+    batch with retry, and batches that still fail are spooled to local JSONL
+    and replayed on the next start. Session ids double as Mongo _id, so a
+    replayed batch that partly landed before is not duplicated. Sessions
+    submitted with a journal get their messages read from it in the writer
+    thread, and the journal is removed once the session is stored.
+    """
+    def __init__(self, queue_size: int = 1000, batch_size: int = 50, flush_interval: float = 2.0,
+                 spool_dir: str = "persist_spool", use_mongo: bool = True):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.use_mongo = use_mongo
+        self.queue = None
+        self._task = None
+        self._replay_task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, document: dict, filepath: str, journal: Optional[str] = None):
+        """Non-blocking hand-off from session teardown"""
+        item = (filepath, document, journal)
+        if not self.running:
+            # No writer (scripts, tests): write the file now, leave Mongo to the next replay
+            self._write_and_spool([item])
+            return
+        try:
+            self.queue.put_nowait(item)
+            metrics.increment("persist_submitted")
+        except asyncio.QueueFull:
+            metrics.record_error("persist_queue_full")
+            logger.warning(f"[PERSIST] Queue full, spooling {document.get('session_id')}")
+            asyncio.get_running_loop().run_in_executor(None, self._write_and_spool, [item])
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.write_batch(batch)
+            except Exception as e:
+                logger.error(f"[PERSIST] Batch of {len(batch)} failed: {e}")
+                metrics.record_error("persist_batch_failed")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def write_batch(self, batch: List[Tuple[str, dict, Optional[str]]]):
+        batch = await asyncio.to_thread(self._attach_messages, batch)
+        failed = await asyncio.to_thread(self._write_files, batch)
+        if self.use_mongo:
+            await self._store(batch)
+        else:
+            batch = [item for item in batch if item[0] not in failed]  # the journal is the only copy
+        await asyncio.to_thread(self._remove_journals, batch)
+
+    async def _store(self, batch: List[Tuple[str, dict, Optional[str]]]):
+        documents = [document for _, document, _ in batch]
+        try:
+            await retry_async(
+                lambda: self._insert(documents),
+                max_attempts=Config.MAX_RETRY_ATTEMPTS,
+                base_delay=Config.RETRY_BASE_DELAY,
+                max_delay=Config.RETRY_MAX_DELAY
+            )
+            metrics.increment("persisted_sessions", len(documents))
+        except Exception as e:
+            logger.error(f"[PERSIST] Mongo insert failed, spooling {len(documents)} sessions: {e}")
+            metrics.record_error("persist_mongo_failed")
+            await asyncio.to_thread(self._spool, documents)
+
+    async def _insert(self, documents: List[dict]):
+        now = datetime.utcnow()
+        rows = [dict(document, _id=document["session_id"], saved_at=now) for document in documents]
+        try:
+            await get_database()["conversations"].insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            # Already stored by an earlier attempt
+
+    @staticmethod
+    def _attach_messages(batch: List[Tuple[str, dict, Optional[str]]]) -> List[Tuple[str, dict, Optional[str]]]:
+        """Read messages from journals; sessions whose journal is gone are dropped
+
+        A missing journal means another worker recovered (and saved) the
+        session, so writing it again would replace that transcript with nothing.
+        """
+        kept = []
+        for item in batch:
+            _, document, journal = item
+            if journal and "messages" not in document:
+                try:
+                    _, messages = read_journal(journal)
+                    document["messages"] = list(messages)
+                except FileNotFoundError:
+                    logger.warning(f"[PERSIST] Journal {journal} is gone, not saving {document.get('session_id')} again")
+                    continue
+                except OSError as e:
+                    logger.error(f"[PERSIST] Could not read journal {journal}: {e}")
+                    document["messages"] = []
+            kept.append(item)
+        return kept
+
+    def _write_files(self, batch: List[Tuple[str, dict, Optional[str]]]) -> set:
+        """Returns the paths that could not be written"""
+        failed = set()
+        indexed = []
+        for filepath, document, journal in batch:
+            if not filepath:
+                continue
+            try:
+                os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+                document["folder_path"] = filepath
+                write_json_file(filepath, document)
+                indexed.append(summarize(document, os.path.basename(filepath)))
+            except Exception as e:
+                logger.error(f"[PERSIST] Failed to write {filepath}: {e}")
+                metrics.record_error("persist_file_failed")
+                failed.add(filepath)
+        if indexed:
+            try:
+                session_index.upsert_many(indexed)
+            except Exception as e:
+                logger.error(f"[PERSIST] Failed to index {len(indexed)} sessions: {e}")
+                metrics.record_error("session_index_failed")
+        return failed
+
+    def _spool(self, documents: List[dict]):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"spool-{datetime.utcnow().strftime('%Y%m%d')}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            for document in documents:
+                f.write(json.dumps(document, ensure_ascii=False, default=str) + "\n")
+        metrics.increment("persist_spooled", len(documents))
+
+    def _write_and_spool(self, batch: List[Tuple[str, dict, Optional[str]]]):
+        batch = self._attach_messages(batch)
+        self._write_files(batch)
+        if self.use_mongo:
+            self._spool([document for _, document, _ in batch])
+        self._remove_journals(batch)
+
+    @staticmethod
+    def _remove_journals(batch: List[Tuple[str, dict, Optional[str]]]):
+        for _, _, journal in batch:
+            if journal and os.path.exists(journal):
+                os.remove(journal)
+
+    async def replay_spool(self):
+        """Re-insert sessions spooled while Mongo was unavailable"""
+        # *.replaying files are left over from a replay that was interrupted
+        paths = {path.removesuffix(".replaying") for path in glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl*"))}
+        for path in sorted(paths):
+            replaying = f"{path}.replaying"
+            if os.path.exists(path):
+                if os.path.exists(replaying):
+                    await asyncio.to_thread(self._restore_spool, replaying, path)
+                os.replace(path, replaying)
+            done = False
+            try:
+                documents = await asyncio.to_thread(self._read_spool, replaying)
+                for start in range(0, len(documents), self.batch_size):
+                    await self._insert(documents[start:start + self.batch_size])
+                os.remove(replaying)
+                done = True
+                logger.info(f"[PERSIST] Replayed {len(documents)} spooled sessions from {path}")
+            except Exception as e:
+                logger.error(f"[PERSIST] Spool replay failed for {path}: {e}")
+                return
+            finally:
+                if not done:  # failed or cancelled at shutdown; inserted sessions dedupe on the next replay
+                    self._restore_spool(replaying, path)
+
+    @staticmethod
+    def _restore_spool(replaying: str, path: str):
+        """Put a failed replay back, appending so sessions spooled meanwhile are kept"""
+        if not os.path.exists(replaying):
+            return
+        with open(replaying, encoding="utf-8") as src, open(path, "a", encoding="utf-8") as dst:
+            for line in src:
+                dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(replaying)
+
+    @staticmethod
+    def _read_spool(path: str) -> List[dict]:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def start(self):
+        if not self.running:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self.run())
+            if self.use_mongo:
+                self._replay_task = asyncio.create_task(self.replay_spool())
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain what is queued, then stop the writer"""
+        if not self._task:
+            return
+        if self._replay_task:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[PERSIST] {self.queue.qsize()} sessions still queued at shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Whatever is left goes to files and the spool rather than being lost
+        leftover = []
+        while not self.queue.empty():
+            leftover.append(self.queue.get_nowait())
+        if leftover:
+            await asyncio.to_thread(self._write_and_spool, leftover)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "spool_files": len(glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")))
+        }
+
+persistence = PersistenceService(
+    queue_size=Config.PERSIST_QUEUE_SIZE,
+    batch_size=Config.PERSIST_BATCH_SIZE,
+    flush_interval=Config.PERSIST_FLUSH_INTERVAL,
+    spool_dir=Config.PERSIST_SPOOL_DIR,
+    use_mongo=Config.PERSIST_TO_MONGO
+)
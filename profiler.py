@@ -0,0 +1,105 @@
+"""
+In-process sampling profiler producing collapsed stacks (flamegraph.pl / speedscope input)
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+import logging
+from monitoring import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 64
+MAX_STACKS = 5000  # distinct stacks kept; further ones are folded into one bucket
+
+# Innermost frames that mean a thread is parked, not working
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+class ProfilerBusy(Exception):
+    pass
+
+def frame_label(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+def collapse(frame) -> tuple:
+    """Frame labels from outermost to innermost, capped at MAX_DEPTH"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+def is_idle(frame) -> bool:
+    return os.path.basename(frame.f_code.co_filename) in IDLE_FILES
+
+class SamplingProfiler:
+    """Walks sys._current_frames at a fixed rate; only one run at a time"""
+    def __init__(self, max_seconds: float = 60, max_rate: int = 100):
+        self.max_seconds = max_seconds
+        self.max_rate = max_rate
+        self._running = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._running.locked()
+
+    def profile(self, seconds: float, rate: int = 100, include_idle: bool = False) -> dict:
+        """Blocking; run it off the event loop so the loop itself gets sampled"""
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            return self._sample(min(max(seconds, 0.1), self.max_seconds), min(max(rate, 1), self.max_rate), include_idle)
+        finally:
+            self._running.release()
+
+    def _sample(self, seconds: float, rate: int, include_idle: bool) -> dict:
+        me = threading.get_ident()
+        interval = 1.0 / rate
+        stacks = Counter()
+        samples = 0
+        sampling_time = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        logger.info(f"[PROFILER] Sampling {seconds:g}s at {rate}Hz")
+
+        next_tick = started
+        while next_tick < deadline:
+            tick_started = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not include_idle and is_idle(frame)):
+                    continue
+                key = (names.get(ident, str(ident)),) + collapse(frame)
+                if key in stacks or len(stacks) < MAX_STACKS:
+                    stacks[key] += 1
+                else:
+                    stacks[("[truncated]",)] += 1
+            samples += 1
+            sampling_time += time.perf_counter() - tick_started
+
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # fell behind; don't burst to catch up
+
+        elapsed = time.perf_counter() - started
+        metrics.increment("profiler_runs")
+        return {
+            "seconds": round(elapsed, 2),
+            "rate_hz": rate,
+            "samples": samples,
+            "overhead_pct": round(sampling_time / elapsed * 100, 2) if elapsed else 0.0,
+            "stacks": stacks
+        }
+
+    @staticmethod
+    def to_collapsed(stacks: Counter) -> str:
+        """One `frame;frame;frame count` line per distinct stack"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+profiler = SamplingProfiler(Config.PROFILER_MAX_SECONDS, Config.PROFILER_MAX_RATE)
@@ -0,0 +1,130 @@
+"""
+Prometheus text exposition of relay, RAG and cost metrics
+"""
+import re
+import time
+import threading
+from collections import defaultdict
+import logging
+from monitoring import Metrics
+from session_manager import SessionRegistry
+from resilience import CircuitState
+import resilience
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "rag_liveavatar"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers RAG searches through whole conversational turns
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.8, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+
+CIRCUIT_STATE_VALUES = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2
+}
+
+def metric_name(name: str) -> str:
+    return f"{PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + "}"
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+class PrometheusExporter:
+    """Renders a metrics snapshot, cached so concurrent scrapes don't re-render"""
+    def __init__(self, source: Metrics, registry: SessionRegistry, cache_seconds: float = 5):
+        self.source = source
+        self.registry = registry
+        self.cache_seconds = cache_seconds
+        self._cached = None
+        self._cached_at = 0.0
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        now = time.monotonic()
+        if self._cached is not None and now - self._cached_at < self.cache_seconds:
+            return self._cached
+        with self._lock:
+            if self._cached is None or time.monotonic() - self._cached_at >= self.cache_seconds:
+                self._cached = self._render()
+                self._cached_at = time.monotonic()
+            return self._cached
+
+    def _render(self) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        # Counters, labelled series take precedence over their unlabelled totals
+        labeled = defaultdict(list)
+        for (metric, labels), value in list(self.source.labeled_counters.items()):
+            labeled[metric].append((labels, value))
+
+        for metric in sorted(set(self.source.counters) | set(labeled)):
+            if metric in ("total_errors", "cost_usd"):
+                continue
+            name = metric_name(metric) + "_total"
+            family(name, "counter", f"Relay counter {metric}")
+            if metric in labeled:
+                for labels, value in sorted(labeled[metric]):
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            else:
+                lines.append(f"{name} {format_value(self.source.counters[metric])}")
+
+        name = metric_name("errors_total")
+        family(name, "counter", "Errors by type")
+        for error_type, value in sorted(self.source.errors.items()):
+            lines.append(f"{name}{format_labels([('type', error_type)])} {value}")
+
+        # Spend as CostTracker priced it (per deployment), the same figures the cost ledger holds
+        name = metric_name("cost_usd_total")
+        family(name, "counter", "Estimated Azure Realtime spend in USD")
+        for labels, value in sorted(labeled.get("cost_usd", [])):
+            lines.append(f"{name}{format_labels(labels)} {format_value(float(value))}")
+
+        # Latency histograms
+        for operation, histogram in sorted(list(self.source.latencies.items())):
+            if not histogram.total:
+                continue
+            name = metric_name(f"{operation}_seconds")
+            family(name, "histogram", f"Latency of {operation}")
+            for bound, count in zip(LATENCY_BUCKETS, histogram.cumulative(LATENCY_BUCKETS)):
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.total}')
+            lines.append(f"{name}_sum {format_value(histogram.sum / 1_000_000)}")
+            lines.append(f"{name}_count {histogram.total}")
+
+        # Gauges
+        stats = self.registry.get_stats()
+        for key, help_text in (
+            ("active_sessions", "Client sessions currently connected"),
+            ("open_azure_sockets", "Azure Realtime websockets currently open"),
+            ("idle_sessions", "Sessions whose Azure socket was reaped for idleness")
+        ):
+            name = metric_name(key)
+            family(name, "gauge", help_text)
+            lines.append(f"{name} {stats[key]}")
+
+        name = metric_name("circuit_breaker_state")
+        family(name, "gauge", "Circuit breaker state (0=closed, 1=half_open, 2=open)")
+        for breaker, circuit in (("azure", resilience.azure_circuit), ("rag", resilience.rag_circuit)):
+            lines.append(f"{name}{format_labels([('breaker', breaker)])} {CIRCUIT_STATE_VALUES[circuit.state]}")
+
+        name = metric_name("uptime_seconds")
+        family(name, "gauge", "Seconds since process start")
+        lines.append(f"{name} {format_value(time.time() - self.source.start_time)}")
+
+        return "\n".join(lines) + "\n"
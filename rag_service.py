@@ -2,6 +2,9 @@
 Dynamic RAG service with Azure AI Search
 """
 import os
+import time
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
@@ -9,12 +12,49 @@ from azure.core.exceptions import AzureError
 from openai import AzureOpenAI
 from config import Config
 from resilience import retry_sync, rag_circuit
+from monitoring import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SearchCache:
+    """LRU cache of formatted search context with a TTL, shared by voice and text paths"""
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # /ask searches run in worker threads
+    
+    @staticmethod
+    def make_key(query: str, kb_id: str, top_k: int):
+        return (kb_id, " ".join(query.lower().split()), top_k)
+    
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value: str):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._entries)
+
 class DynamicRAG:
     def __init__(self):
+        self.cache = SearchCache(Config.RAG_CACHE_SIZE, Config.RAG_CACHE_TTL)
+        
         try:
             self.search_client = SearchClient(
                 endpoint=Config.AZURE_SEARCH_ENDPOINT,
@@ -41,6 +81,18 @@ class DynamicRAG:
             logger.warning("[RAG] Empty query or KB ID")
             return None
         
+        # Timed here rather than by callers, so a search that exhausts its
+        # retries is only counted as a failure, never as a latency sample
+        timer = metrics.start_timer("rag_search")
+        cache_key = SearchCache.make_key(query, kb_id, top_k)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            metrics.increment("rag_cache_hits")
+            logger.info(f"[RAG] Cache hit: {query[:50]}... in KB: {kb_id}")
+            metrics.end_timer(timer)
+            return cached
+        metrics.increment("rag_cache_misses")
+        
         logger.info(f"[RAG] Searching: {query[:50]}... in KB: {kb_id}")
         
         def _search():
@@ -80,7 +132,7 @@ class DynamicRAG:
         
         try:
             # Use circuit breaker and retry
-            return rag_circuit.call(
+            context = rag_circuit.call(
                 lambda: retry_sync(
                     _search,
                     max_attempts=Config.MAX_RETRY_ATTEMPTS,
@@ -90,4 +142,11 @@ class DynamicRAG:
             )
         except Exception as e:
             logger.error(f"[RAG] Search failed after retries: {e}")
+            metrics.record_error("rag_search_exhausted", operation="rag_search")
             return None
+        metrics.end_timer(timer)
+        
+        # Only cache hits; failures and empty results should be retried
+        if context:
+            self.cache.set(cache_key, context)
+        return context
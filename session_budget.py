@@ -0,0 +1,78 @@
+"""
+Per-session spend caps that shorten responses as the budget runs down
+"""
+from typing import Optional
+import logging
+from cost_tracker import CostTracker
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+EXHAUSTED = "exhausted"
+
+def parse_steps(spec: str) -> tuple:
+    """"0.5:400,0.75:200" -> ((0.5, 400), (0.75, 200)), sorted by fraction used"""
+    steps = []
+    for part in (spec or "").split(","):
+        fraction, _, tokens = part.strip().partition(":")
+        if fraction and tokens:
+            steps.append((float(fraction), int(tokens)))
+    return tuple(sorted(steps))
+
+class SessionBudget:
+    """Tracks one session's use of its USD and/or token allowance (0 disables either)"""
+    def __init__(self, session_id: str, max_usd: float = 0.0, max_tokens: int = 0, steps: tuple = (),
+                 max_output_tokens: Optional[int] = None):
+        self.session_id = session_id
+        self.max_usd = max_usd
+        self.max_tokens = max_tokens
+        self.steps = steps
+        self.max_output_tokens = max_output_tokens  # cap currently applied to the Azure session
+        self.exhausted = False
+        self.used_usd = 0.0
+        self.used_tokens = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_usd or self.max_tokens)
+
+    def fraction_used(self) -> float:
+        fractions = []
+        if self.max_usd:
+            fractions.append(self.used_usd / self.max_usd)
+        if self.max_tokens:
+            fractions.append(self.used_tokens / self.max_tokens)
+        return max(fractions) if fractions else 0.0
+
+    def update(self, tracker: CostTracker):
+        """New max_response_output_tokens when a step is crossed, EXHAUSTED at the limit, else None"""
+        if not self.enabled or self.exhausted:
+            return None
+        self.used_usd = tracker.calculate_cost()["total"]
+        self.used_tokens = sum(tracker.tokens.values())
+        used = self.fraction_used()
+
+        if used >= 1.0:
+            self.exhausted = True
+            metrics.increment("session_budget_exhausted")
+            logger.warning(f"[BUDGET] Session {self.session_id} spent its budget (${self.used_usd:.4f}, {self.used_tokens} tokens)")
+            return EXHAUSTED
+
+        cap = None
+        for fraction, tokens in self.steps:
+            if used >= fraction:
+                cap = tokens
+        if cap is not None and (self.max_output_tokens is None or cap < self.max_output_tokens):
+            self.max_output_tokens = cap
+            metrics.increment("session_budget_tightened")
+            logger.info(f"[BUDGET] Session {self.session_id} at {used:.0%}, responses capped at {cap} tokens")
+            return cap
+        return None
+
+    def remaining(self) -> dict:
+        return {
+            "usd": round(max(0.0, self.max_usd - self.used_usd), 6) if self.max_usd else None,
+            "tokens": max(0, self.max_tokens - self.used_tokens) if self.max_tokens else None,
+            "fraction_used": round(min(1.0, self.fraction_used()), 3),
+            "max_output_tokens": self.max_output_tokens
+        }
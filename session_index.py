@@ -0,0 +1,272 @@
+"""
+SQLite index of saved sessions, so listings and lookups don't open every conversation file
+
+Rebuild (and backfill the cost rollups) from an existing directory with:
+python session_index.py rebuild [log_dir]
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import threading
+from typing import Optional
+import logging
+from config import Config
+from cost_ledger import TOKEN_TYPES
+from cost_rollups import rollup_day
+from archive import iter_segment, list_segments
+
+logger = logging.getLogger(__name__)
+
+LIST_FIELDS = ("session_id", "kb_id", "start_time", "duration_seconds", "message_count", "cost_usd", "filename")
+FIELDS = LIST_FIELDS + ("archive_offset", "archive_length")  # set when filename is an archive segment
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    kb_id TEXT,
+    start_time TEXT,
+    duration_seconds REAL,
+    message_count INTEGER,
+    cost_usd REAL,
+    filename TEXT NOT NULL,
+    archive_offset INTEGER,
+    archive_length INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_by_start ON sessions (start_time);
+CREATE INDEX IF NOT EXISTS sessions_by_kb_start ON sessions (kb_id, start_time);
+CREATE INDEX IF NOT EXISTS sessions_by_start_id ON sessions (start_time, session_id);
+CREATE TABLE IF NOT EXISTS cost_rollups (
+    day TEXT NOT NULL,
+    kb_id TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    %s,
+    PRIMARY KEY (day, kb_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS transcripts USING fts5(
+    session_id UNINDEXED,
+    text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+""" % ",\n    ".join(f"{t} INTEGER NOT NULL DEFAULT 0" for t in TOKEN_TYPES)
+
+ROLLUP_UPSERT = """
+INSERT INTO cost_rollups (day, kb_id, sessions, cost_usd, {columns}) VALUES (?, ?, 1, ?, {values})
+ON CONFLICT (day, kb_id) DO UPDATE SET sessions = sessions + 1, cost_usd = cost_usd + excluded.cost_usd, {increments}
+""".format(
+    columns=", ".join(TOKEN_TYPES),
+    values=", ".join("?" for _ in TOKEN_TYPES),
+    increments=", ".join(f"{t} = {t} + excluded.{t}" for t in TOKEN_TYPES)
+)
+
+def transcript_text(document: dict) -> str:
+    """What visitors said, plus the queries they triggered, as one searchable text"""
+    parts = []
+    for message in document.get("messages") or []:
+        if message.get("role") == "user" and message.get("type", "text") == "text":
+            parts.append(message.get("content") or "")
+        elif message.get("type") == "function_call":
+            query = ((message.get("metadata") or {}).get("arguments") or {}).get("query")
+            if isinstance(query, str):
+                parts.append(query)
+    return "\n".join(part for part in parts if part)
+
+def search_terms(q: str) -> str:
+    """Free text -> FTS5 query matching every word (quoted, so punctuation can't break the syntax)"""
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", q))
+
+def summarize(document: dict, filename: str, archive_offset: int = None, archive_length: int = None) -> dict:
+    """The row stored for a session document (tokens only feed the cost rollups; transcript
+    is None when the document came without messages, which leaves the search entry alone)"""
+    cost = document.get("cost") or {}
+    return {
+        "session_id": document.get("session_id"),
+        "kb_id": document.get("kb_id"),
+        "start_time": document.get("start_time"),
+        "duration_seconds": document.get("duration_seconds"),
+        "message_count": document.get("message_count"),
+        "cost_usd": cost.get("cost_usd", 0),
+        "filename": filename,
+        "archive_offset": archive_offset,
+        "archive_length": archive_length,
+        "tokens": cost.get("tokens") or {},
+        "transcript": transcript_text(document) if "messages" in document else None
+    }
+
+class SessionIndex:
+    """One row per saved session, keyed by session id and ordered by start time
+
+    Also keeps the day/KB cost rollups behind /cost-summary, updated in the
+    same transaction; a session already in the index is not counted twice.
+    Transcripts go into an FTS5 table for /sessions/search.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Opened on first use, so importing the module doesn't touch the disk"""
+        with self._lock:
+            if self._conn is None:
+                if self.path != ":memory:":
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(SCHEMA)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}
+                for column in ("archive_offset", "archive_length"):
+                    if column not in columns:  # index created before the archive existed
+                        conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} INTEGER")
+                self._conn = conn
+            return self._conn
+
+    def upsert(self, row: dict):
+        self.upsert_many([row])
+
+    def upsert_many(self, rows: list, replace_all: bool = False):
+        placeholders = ", ".join(f":{field}" for field in FIELDS)
+        with self._lock, self.conn:
+            if replace_all:
+                self.conn.execute("DELETE FROM sessions")
+                self.conn.execute("DELETE FROM cost_rollups")
+                self.conn.execute("DELETE FROM transcripts")
+            for row in rows:
+                known = self.conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (row["session_id"],)).fetchone()
+                self.conn.execute(f"INSERT OR REPLACE INTO sessions ({', '.join(FIELDS)}) VALUES ({placeholders})", row)
+                if not known:
+                    tokens = row.get("tokens", {})
+                    self.conn.execute(ROLLUP_UPSERT, [rollup_day(row["start_time"]), row["kb_id"] or "unknown",
+                                                      row["cost_usd"] or 0] + [tokens.get(t, 0) for t in TOKEN_TYPES])
+                if row.get("transcript") is not None:
+                    if known:  # rare (recovered or re-saved session), and a scan of the FTS table
+                        self.conn.execute("DELETE FROM transcripts WHERE session_id = ?", (row["session_id"],))
+                    if row["transcript"]:
+                        self.conn.execute("INSERT INTO transcripts (session_id, text) VALUES (?, ?)",
+                                          (row["session_id"], row["transcript"]))
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit: int = 100, offset: int = 0, kb_id: Optional[str] = None) -> list:
+        """Newest first"""
+        where, params = ("WHERE kb_id = ?", [kb_id]) if kb_id else ("", [])
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(LIST_FIELDS)} FROM sessions {where} ORDER BY start_time DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def page(self, after: Optional[tuple] = None, kb_id: Optional[str] = None, since: Optional[str] = None,
+             until: Optional[str] = None, limit: int = 500) -> list:
+        """Oldest first, resuming after a (start_time, session_id) key; for exports of any size"""
+        clauses, params = [], []
+        for clause, value in (("kb_id = ?", kb_id), ("start_time >= ?", since), ("start_time < ?", until)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        if after:
+            clauses.append("(start_time, session_id) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM sessions {where} ORDER BY start_time, session_id LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, q: str, limit: int = 20, kb_id: Optional[str] = None) -> list:
+        """Sessions whose transcript contains every word of q, best match (BM25) first, with a snippet"""
+        terms = search_terms(q)
+        if not terms:
+            return []
+        where, params = ("AND s.kb_id = ?", [kb_id]) if kb_id else ("", [])
+        with self._lock:
+            rows = self.conn.execute(
+                f"""SELECT s.session_id, s.kb_id, s.start_time, s.message_count,
+                           snippet(transcripts, 1, '[', ']', '...', 12) AS snippet, bm25(transcripts) AS score
+                    FROM transcripts t JOIN sessions s ON s.session_id = t.session_id
+                    WHERE transcripts MATCH ? {where} ORDER BY score LIMIT ?""",
+                [terms] + params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, kb_id: Optional[str] = None) -> int:
+        where, params = ("WHERE kb_id = ?", [kb_id]) if kb_id else ("", [])
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM sessions {where}", params).fetchone()[0]
+
+    def cost_rollups(self, since: Optional[str] = None, until: Optional[str] = None, kb_id: Optional[str] = None) -> list:
+        """Day/KB rollup rows, optionally limited to a day range (YYYY-MM-DD, inclusive) and KB"""
+        clauses, params = [], []
+        for clause, value in (("day >= ?", since), ("day <= ?", until), ("kb_id = ?", kb_id)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT * FROM cost_rollups {where}", params).fetchall()
+        return [
+            {"day": row["day"], "kb_id": row["kb_id"], "sessions": row["sessions"], "cost_usd": row["cost_usd"],
+             "tokens": {t: row[t] for t in TOKEN_TYPES}}
+            for row in rows
+        ]
+
+    def index_archived(self, segment: str, documents: list, positions: list):
+        """Point sessions at their (offset, length) inside an archive segment"""
+        self.upsert_many([
+            summarize(document, segment, offset, length)
+            for document, (offset, length) in zip(documents, positions)
+        ])
+
+    def remove_before(self, start_time: str) -> int:
+        """Drop sessions that started before start_time (cost rollups are kept)"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM transcripts WHERE session_id IN "
+                              "(SELECT session_id FROM sessions WHERE start_time < ?)", (start_time,))
+            return self.conn.execute("DELETE FROM sessions WHERE start_time < ?", (start_time,)).rowcount
+
+    def rebuild(self, log_dir: str, archive_dir: Optional[str] = None) -> int:
+        """Re-index every session file and archive segment and recompute the cost rollups (backfill)"""
+        rows = []
+        for segment in list_segments(archive_dir) if archive_dir else []:
+            try:
+                rows.extend(summarize(document, segment, offset, length)
+                            for offset, length, document in iter_segment(segment))
+            except Exception as e:
+                logger.error(f"[INDEX] Failed to read segment {segment}: {e}")
+        for filename in os.listdir(log_dir) if os.path.isdir(log_dir) else []:
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(log_dir, filename), encoding="utf-8") as f:
+                    rows.append(summarize(json.load(f), filename))
+            except Exception as e:
+                logger.error(f"[INDEX] Failed to read {filename}: {e}")
+        self.upsert_many(rows, replace_all=True)
+        logger.info(f"[INDEX] Indexed {len(rows)} sessions from {log_dir}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+session_index = SessionIndex(Config.SESSION_INDEX_PATH)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python session_index.py rebuild [log_dir]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    count = session_index.rebuild(sys.argv[2] if len(sys.argv) > 2 else "conversations", Config.ARCHIVE_DIR)
+    print(f"Indexed {count} sessions into {Config.SESSION_INDEX_PATH}")
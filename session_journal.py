@@ -0,0 +1,76 @@
+"""
+Append-only JSONL journal of an in-progress session, so messages live on disk rather than in memory
+"""
+import os
+import json
+import time
+import asyncio
+from typing import Iterator, Optional, Tuple
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+def _fsync(fd: int):
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # journal closed while the sync was queued
+
+class SessionJournal:
+    """First line is the session header, then one line per logged message
+
+    Writes go through a userspace buffer; the file is flushed and fsynced at
+    most every `fsync_interval` seconds (the fsync itself runs off the event loop).
+    """
+    def __init__(self, path: str, header: dict, buffer_size: int = 65536, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=buffer_size)
+        self._last_sync = time.monotonic()
+        self.closed = False
+        self.append(header)
+
+    def append(self, record: dict):
+        if self.closed:
+            logger.warning(f"[JOURNAL] Dropping write to closed journal {self.path}")
+            return
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        self._last_sync = time.monotonic()
+        fd = self._file.fileno()
+        try:
+            asyncio.get_running_loop().run_in_executor(None, _fsync, fd)
+        except RuntimeError:
+            _fsync(fd)
+        metrics.increment("journal_syncs")
+
+    def close(self):
+        """Flush what is buffered; the writer reads the journal back from the page cache"""
+        if not self.closed:
+            self._file.close()
+            self.closed = True
+
+def read_journal(path: str) -> Tuple[Optional[dict], Iterator[dict]]:
+    """(header, lazy iterator of messages); a line torn by a crash is skipped"""
+    f = open(path, encoding="utf-8")
+    header = _parse(f.readline())
+
+    def messages():
+        with f:
+            for line in f:
+                record = _parse(line)
+                if record is not None:
+                    yield record
+    return header, messages()
+
+def _parse(line: str) -> Optional[dict]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
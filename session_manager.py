@@ -0,0 +1,181 @@
+"""
+Active relay session registry and idle reaper
+"""
+import asyncio
+import base64
+import json
+import time
+from array import array
+from typing import Dict, Optional
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class RelaySession:
+    """Activity state for one client <-> Azure relay"""
+    def __init__(self, session_id: str, kb_id: str):
+        self.session_id = session_id
+        self.kb_id = kb_id
+        self.created_at = time.time()
+        self.last_user_activity = None
+        self.last_response = None
+        self.azure_ws = None
+        self.reaped = False
+        self.reaped_at = None
+        self.reaped_seconds = 0.0
+        self.closed = False
+        self.resumed = asyncio.Event()
+        self.budget = None  # SessionBudget, when per-session budgets are enabled
+
+    def touch_user(self):
+        """Visitor spoke, or a transcription / client event arrived"""
+        self.last_user_activity = time.time()
+
+    def touch_response(self):
+        """Azure started or finished a response"""
+        self.last_response = time.time()
+
+    def last_activity(self) -> float:
+        return max(self.created_at, self.last_user_activity or 0, self.last_response or 0)
+
+    def idle_seconds(self, now: float = None) -> float:
+        return (now or time.time()) - self.last_activity()
+
+    @property
+    def azure_open(self) -> bool:
+        return self.azure_ws is not None and not self.azure_ws.closed
+
+    def mark_reaped(self):
+        self.reaped = True
+        self.reaped_at = time.time()
+        self.resumed.clear()
+
+    def mark_resumed(self, azure_ws):
+        """Azure socket re-opened after an idle reap"""
+        self._account_reaped_time()
+        self.azure_ws = azure_ws
+        self.reaped = False
+        self.touch_user()
+        self.resumed.set()
+        metrics.increment("idle_resumed_sessions")
+
+    def close(self):
+        """Session ended; account any time spent reaped"""
+        self.closed = True
+        self._account_reaped_time()
+        # Wake anything waiting on a resume so it can exit
+        self.resumed.set()
+
+    def _account_reaped_time(self):
+        if self.reaped_at is not None:
+            reclaimed = time.time() - self.reaped_at
+            self.reaped_seconds += reclaimed
+            metrics.increment("idle_reclaimed_session_minutes", round(reclaimed / 60, 2))
+            self.reaped_at = None
+
+class SessionRegistry:
+    """Process-wide view of active relay sessions"""
+    def __init__(self):
+        self.sessions: Dict[str, RelaySession] = {}
+
+    def register(self, session_id: str, kb_id: str) -> RelaySession:
+        session = RelaySession(session_id, kb_id)
+        self.sessions[session_id] = session
+        return session
+
+    def unregister(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session:
+            session.close()
+
+    def get(self, session_id: str) -> Optional[RelaySession]:
+        return self.sessions.get(session_id)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open_azure_sockets(self) -> int:
+        return sum(1 for s in self.sessions.values() if s.azure_open)
+
+    def get_stats(self) -> dict:
+        return {
+            "active_sessions": len(self.sessions),
+            "open_azure_sockets": self.open_azure_sockets(),
+            "idle_sessions": sum(1 for s in self.sessions.values() if s.reaped),
+            "budget_remaining": {
+                s.session_id: s.budget.remaining()
+                for s in self.sessions.values() if s.budget and s.budget.enabled
+            }
+        }
+
+class IdleReaper:
+    """Closes Azure sockets of sessions with no visitor or response activity"""
+    def __init__(self, registry: SessionRegistry, idle_timeout: float, interval: float):
+        self.registry = registry
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self._task = None
+
+    async def reap_once(self, now: float = None) -> int:
+        """Close idle Azure sockets, returns number of sessions reaped"""
+        now = now or time.time()
+        reaped = 0
+        for session in list(self.registry.sessions.values()):
+            if session.closed or session.reaped or not session.azure_open:
+                continue
+            if session.idle_seconds(now) < self.idle_timeout:
+                continue
+
+            logger.info(f"[REAPER] Session {session.session_id} idle {session.idle_seconds(now):.0f}s, closing Azure socket")
+            session.mark_reaped()
+            try:
+                await session.azure_ws.close()
+            except Exception as e:
+                logger.error(f"[REAPER] Failed to close Azure socket: {e}")
+            metrics.increment("idle_reaped_sessions")
+            reaped += 1
+        return reaped
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap_once()
+            except Exception as e:
+                logger.error(f"[REAPER] Sweep failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"[REAPER] Started (idle timeout {self.idle_timeout}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+def audio_has_voice(audio_b64: str, threshold: int) -> bool:
+    """Cheap PCM16 peak check used to wake a reaped session"""
+    try:
+        samples = array("h", base64.b64decode(audio_b64))
+    except Exception:
+        return False
+    return bool(samples) and max(abs(min(samples)), max(samples)) >= threshold
+
+def is_client_activity(message: str, voice_threshold: int) -> bool:
+    """Whether a client message should count as the visitor speaking again"""
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return False
+    event_type = data.get("type")
+    if event_type == "input_audio_buffer.append":
+        return audio_has_voice(data.get("audio", ""), voice_threshold)
+    return event_type not in (None, "session.close")
+
+session_registry = SessionRegistry()
@@ -0,0 +1,80 @@
+"""
+Service level objectives evaluated over the rolling metric windows
+"""
+from typing import List, Optional
+from monitoring import Metrics, RollingWindow
+from config import Config
+
+class SLO:
+    """A target fraction of good events for one operation
+
+    Latency objectives count events slower than `latency_threshold` (seconds)
+    as bad; availability objectives count errors as bad.
+    """
+    def __init__(self, name: str, operation: str, objective: float, latency_threshold: float = None,
+                 description: str = ""):
+        self.name = name
+        self.operation = operation
+        self.objective = objective
+        self.latency_threshold = latency_threshold
+        self.description = description
+
+    def bad_fraction(self, window: RollingWindow, seconds: int, now: float = None):
+        """(fraction of bad events, number of events) in the last `seconds`"""
+        if self.latency_threshold is not None:
+            bad, total = window.latency_over(self.latency_threshold, seconds, now)
+        else:
+            summary = window.summary(seconds, now)
+            bad, total = summary["errors"], summary["requests"]
+        if not total:
+            return None, 0
+        return min(1.0, bad / total), total
+
+    def evaluate(self, metrics: Metrics, min_events: int = 1, now: float = None) -> dict:
+        """Burn rate per window: 1.0 spends the error budget exactly as fast as allowed"""
+        budget = 1.0 - self.objective
+        window = metrics.windows.get(self.operation)
+        burn_rates = {}
+        for name, seconds in RollingWindow.WINDOWS.items():
+            fraction, total = self.bad_fraction(window, seconds, now) if window else (None, 0)
+            if fraction is None or total < min_events:
+                burn_rates[name] = None
+            else:
+                burn_rates[name] = round(fraction / budget, 2) if budget > 0 else None
+        return {
+            "description": self.description,
+            "objective": self.objective,
+            "burn_rate": burn_rates,
+            "status": self.status(burn_rates)
+        }
+
+    @staticmethod
+    def status(burn_rates: dict) -> str:
+        # Fast burn must show in both the short and the medium window, so a
+        # single slow request can't flip the status on its own
+        fast, short, medium = Config.SLO_FAST_BURN_RATE, burn_rates.get("1m"), burn_rates.get("5m")
+        if short is not None and medium is not None and short >= fast and medium >= fast:
+            return "breach"
+        slow = burn_rates.get("15m")
+        if slow is not None and slow >= 1.0:
+            return "warning"
+        return "ok"
+
+def default_slos() -> List[SLO]:
+    return [
+        SLO("rag_latency", "rag_search", 0.95, latency_threshold=Config.SLO_RAG_P95_MS / 1000,
+            description=f"95% of RAG searches under {Config.SLO_RAG_P95_MS}ms"),
+        SLO("rag_availability", "rag_search", 0.99,
+            description="99% of RAG searches succeed"),
+        SLO("session_connect", "session_connect", Config.SLO_CONNECT_SUCCESS,
+            description=f"{Config.SLO_CONNECT_SUCCESS:.1%} of sessions connect to Azure"),
+        SLO("first_audio", "turn_speech_to_first_audio", 0.90,
+            latency_threshold=Config.SLO_FIRST_AUDIO_MS / 1000,
+            description=f"90% of turns start speaking within {Config.SLO_FIRST_AUDIO_MS}ms")
+    ]
+
+def evaluate_slos(metrics: Metrics, slos: Optional[List[SLO]] = None, now: float = None) -> dict:
+    return {
+        slo.name: slo.evaluate(metrics, Config.SLO_MIN_EVENTS, now)
+        for slo in (slos if slos is not None else default_slos())
+    }
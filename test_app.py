@@ -1,10 +1,22 @@
 """
 Integration tests for WebSocket endpoints
 """
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, Mock, AsyncMock
 from app import app
+from session_index import SessionIndex
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Sessions saved by these tests go to tmp_path, not the working tree"""
+    monkeypatch.chdir(tmp_path)
+    index = SessionIndex(str(tmp_path / "sessions.sqlite3"))
+    monkeypatch.setattr("persistence.session_index", index)
+    monkeypatch.setattr("app.session_index", index)
+    yield
+    index.close()
 
 @pytest.fixture
 def client():
@@ -53,3 +65,85 @@ async def test_websocket_azure_connection_failure():
                 websocket.send_json({"kb_id": "test123"})
                 data = websocket.receive_json()
                 assert "error" in data
+
+def test_ask_returns_answer(client):
+    """Test text question answering with RAG context"""
+    mock_rag = Mock()
+    mock_rag.search.return_value = "Gold loans start at 9%."
+    mock_answerer = Mock()
+    mock_answerer.answer = AsyncMock(return_value={
+        "answer": "Gold loans start at 9 percent.",
+        "usage": {"input_tokens": 120, "output_tokens": 12}
+    })
+    
+    with patch('app.get_rag', return_value=mock_rag), patch('app.get_answerer', return_value=mock_answerer):
+        response = client.post("/ask", json={"question": "Gold loan rate?", "kb_id": "kb1"})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["answer"] == "Gold loans start at 9 percent."
+    assert data["context_found"] is True
+    mock_rag.search.assert_called_once_with("Gold loan rate?", "kb1")
+    mock_answerer.answer.assert_awaited_once_with("Gold loan rate?", "Gold loans start at 9%.")
+
+def test_ask_streams_sse(client):
+    """Test SSE variant streams deltas then usage"""
+    async def fake_stream(question, context):
+        yield {"delta": "Hello"}
+        yield {"delta": " there"}
+        yield {"usage": {"input_tokens": 10, "output_tokens": 2}}
+    
+    mock_rag = Mock()
+    mock_rag.search.return_value = None
+    mock_answerer = Mock()
+    mock_answerer.stream = fake_stream
+    
+    with patch('app.get_rag', return_value=mock_rag), patch('app.get_answerer', return_value=mock_answerer):
+        response = client.post("/ask", json={"question": "Hi", "stream": True})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [e["type"] for e in events] == ["start", "delta", "delta", "done"]
+    assert events[0]["context_found"] is False
+    assert "".join(e["text"] for e in events if e["type"] == "delta") == "Hello there"
+
+def test_ask_requires_question(client):
+    """Test empty questions are rejected"""
+    response = client.post("/ask", json={"question": "  "})
+    assert response.status_code == 400
+
+def test_prometheus_endpoint(client):
+    """Test Prometheus text exposition endpoint"""
+    response = client.get("/metrics/prometheus")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "rag_liveavatar_active_sessions" in response.text
+
+def test_admin_event_loop_requires_token(client):
+    """Test admin endpoints check X-Admin-Token when ADMIN_TOKEN is set"""
+    with patch("admin_api.Config.ADMIN_TOKEN", "secret"):
+        assert client.get("/admin/event-loop").status_code == 401
+        response = client.get("/admin/event-loop", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "offenders" in response.json()
+
+def test_admin_closed_without_token(client):
+    """Test admin and export endpoints are refused when ADMIN_TOKEN is unset, unless ADMIN_OPEN is on"""
+    with patch("admin_api.Config.ADMIN_TOKEN", None):
+        assert client.get("/admin/event-loop").status_code == 403
+        assert client.get("/export/sessions").status_code == 403
+        with patch("admin_api.Config.ADMIN_OPEN", True):
+            assert client.get("/admin/event-loop").status_code == 200
+
+@pytest.mark.asyncio
+async def test_websocket_refused_over_budget(client):
+    """Test new sessions are refused when the fleet budget is spent"""
+    with patch("app.cost_ledger.over_budget", return_value=True), \
+         patch("app.Config.COST_BUDGET_ACTION", "refuse"), \
+         patch("app.connect_to_azure_realtime") as connect:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_json({"kb_id": "test"})
+            data = websocket.receive_json()
+            assert "error" in data
+        connect.assert_not_called()
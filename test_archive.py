@@ -0,0 +1,125 @@
+"""
+Tests for the compressed conversation archive
+"""
+import os
+import json
+import gzip
+import time
+import fcntl
+from archive import ArchiveCompactor, iter_segment, list_segments, read_session, write_segment
+from session_index import SessionIndex, summarize
+
+def save_session(log_dir, session_id: str, day: str, age: float = 7200) -> str:
+    document = {
+        "session_id": session_id, "kb_id": "kb1", "start_time": f"{day}T10:00:00",
+        "message_count": 1, "messages": [{"role": "user", "content": f"hi from {session_id}"}],
+        "cost": {"cost_usd": 0.01}
+    }
+    path = os.path.join(log_dir, f"{session_id}_{day.replace('-', '')}_100000.json")
+    with open(path, "w") as f:
+        json.dump(document, f)
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+def test_segment_members_are_addressable(tmp_path):
+    """Test a segment is plain .jsonl.gz and each session can be read by offset"""
+    path = str(tmp_path / "seg.jsonl.gz")
+    positions = write_segment(path, [{"session_id": "a"}, {"session_id": "b"}])
+
+    with gzip.open(path, "rt") as f:
+        assert [json.loads(line)["session_id"] for line in f] == ["a", "b"]
+    assert [(offset, length) for offset, length, _ in iter_segment(path)] == positions
+    entry = {"filename": path, "archive_offset": positions[1][0], "archive_length": positions[1][1]}
+    assert read_session(entry)["session_id"] == "b"
+
+def test_compaction_rolls_old_files_into_day_segments(tmp_path):
+    """Test old session files move into per-day segments and stay readable through the index"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    index = SessionIndex(":memory:")
+    for session_id, day in (("s1", "2024-01-01"), ("s2", "2024-01-01"), ("s3", "2024-01-02")):
+        path = save_session(log_dir, session_id, day)
+        with open(path) as f:
+            index.upsert(summarize(json.load(f), os.path.basename(path)))
+    fresh = save_session(log_dir, "s4", "2024-01-02", age=0)
+
+    archived = ArchiveCompactor(index, log_dir, archive_dir, compact_after=3600).compact()
+
+    assert archived == 3
+    assert [os.path.relpath(p, archive_dir).split(os.sep)[:3] for p in list_segments(archive_dir)] == \
+        [["2024", "01", "01"], ["2024", "01", "02"]]
+    assert sorted(os.listdir(log_dir)) == ["archive", os.path.basename(fresh)]
+    assert read_session(index.get("s2"), log_dir)["messages"][0]["content"] == "hi from s2"
+    assert index.cost_rollups()[0]["sessions"] == 2  # not counted again when archived
+
+def test_retention_drops_old_partitions(tmp_path):
+    """Test day partitions and index rows past the retention window are removed"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    index = SessionIndex(":memory:")
+    save_session(log_dir, "old", "2024-01-01")
+    save_session(log_dir, "new", "2024-03-01")
+    compactor = ArchiveCompactor(index, log_dir, archive_dir, retention_days=30)
+    compactor.compact()
+
+    removed = compactor.apply_retention(now=time.mktime((2024, 3, 2, 0, 0, 0, 0, 0, 0)))
+
+    assert removed == 1
+    assert index.get("old") is None
+    assert index.get("new") is not None
+    assert not os.path.exists(os.path.join(archive_dir, "2024", "01"))
+
+def test_rebuild_indexes_archive_segments(tmp_path):
+    """Test a rebuilt index finds sessions that only exist in segments"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    save_session(log_dir, "s1", "2024-01-01")
+    ArchiveCompactor(SessionIndex(":memory:"), log_dir, archive_dir).compact()
+
+    index = SessionIndex(":memory:")
+    index.rebuild(log_dir, archive_dir)
+
+    assert read_session(index.get("s1"), log_dir)["session_id"] == "s1"
+
+def test_undated_sessions_use_file_day_and_unknown_partition_is_kept(tmp_path):
+    """Test undated files are partitioned by mtime and retention leaves 0000/00/00 alone"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    path = save_session(log_dir, "legacy", "2024-01-01")
+    os.rename(path, os.path.join(log_dir, "legacy.json"))
+    legacy = os.path.join(archive_dir, "0000", "00", "00", "segment-old.jsonl.gz")
+    write_segment(legacy, [{"session_id": "older"}])
+    compactor = ArchiveCompactor(SessionIndex(":memory:"), log_dir, archive_dir, retention_days=30)
+
+    assert compactor.compact() == 1
+    day = time.strftime("%Y/%m/%d", time.gmtime(time.time() - 7200)).split("/")
+    assert os.path.isdir(os.path.join(archive_dir, *day))
+    compactor.apply_retention()
+    assert os.path.exists(legacy)
+
+def test_run_once_skips_while_another_worker_holds_the_lock(tmp_path):
+    """Test only one compactor runs a pass at a time"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    save_session(log_dir, "s1", "2024-01-01")
+    compactor = ArchiveCompactor(SessionIndex(":memory:"), log_dir, archive_dir)
+    os.makedirs(archive_dir)
+
+    with open(os.path.join(archive_dir, ".lock"), "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert compactor.run_once() is False
+    assert compactor.run_once() is True
+    assert list_segments(archive_dir)
+
+def test_compaction_tolerates_files_removed_by_another_run(tmp_path, monkeypatch):
+    """Test a session file deleted between reading and removal doesn't fail the pass"""
+    log_dir, archive_dir = str(tmp_path), str(tmp_path / "archive")
+    index = SessionIndex(":memory:")
+    path = save_session(log_dir, "s1", "2024-01-01")
+    compactor = ArchiveCompactor(index, log_dir, archive_dir)
+    load = ArchiveCompactor._load
+
+    def load_then_vanish(paths, loaded, summaries):
+        for document in load(paths, loaded, summaries):
+            os.remove(path)
+            yield document
+    monkeypatch.setattr(ArchiveCompactor, "_load", staticmethod(load_then_vanish))
+
+    assert compactor.compact() == 1
+    assert index.get("s1")["archive_offset"] is not None
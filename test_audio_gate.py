@@ -0,0 +1,79 @@
+"""
+Tests for server-side silence suppression
+"""
+import base64
+import json
+import numpy as np
+from audio_gate import SilenceGate
+
+RATE = 24000
+CHUNK = 4096  # ScriptProcessor frame size in index.html
+
+def tone(samples: int = CHUNK, amplitude: float = 4000, freq: float = 220) -> bytes:
+    t = np.arange(samples) / RATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16).tobytes()
+
+def silence(samples: int = CHUNK) -> bytes:
+    return np.zeros(samples, dtype=np.int16).tobytes()
+
+def hiss(samples: int = CHUNK, amplitude: float = 400) -> bytes:
+    rng = np.random.default_rng(0)
+    return rng.uniform(-amplitude, amplitude, samples).astype(np.int16).tobytes()
+
+def append(audio: bytes) -> str:
+    return json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(audio).decode()})
+
+def test_voicing_decision():
+    """Test speech is detected and silence / low hiss is not"""
+    gate = SilenceGate(sample_rate=RATE)
+    assert gate.is_speech(np.frombuffer(tone(), dtype=np.int16))
+    assert not gate.is_speech(np.frombuffer(silence(), dtype=np.int16))
+    assert not gate.is_speech(np.frombuffer(hiss(), dtype=np.int16))
+
+def test_long_silence_is_dropped():
+    """Test continuous silence is dropped and accounted"""
+    gate = SilenceGate(sample_rate=RATE, preroll_ms=300)
+    forwarded = [gate.process(silence()) for _ in range(60)]
+
+    assert all(out is None for out in forwarded)
+    stats = gate.get_stats()
+    assert stats["dropped_seconds"] > 9
+    assert stats["estimated_tokens_saved"] > 90
+
+def test_speech_flushes_preroll():
+    """Test the silence right before speech is forwarded with it"""
+    gate = SilenceGate(sample_rate=RATE, preroll_ms=300)
+    for _ in range(10):
+        gate.process(silence())
+
+    out = gate.process(tone())
+
+    preroll = len(out) - len(tone())
+    assert preroll >= RATE * 300 // 1000 * 2
+    assert out.endswith(tone())
+
+def test_hangover_keeps_trailing_silence():
+    """Test silence after speech is forwarded for the hangover window"""
+    gate = SilenceGate(sample_rate=RATE, hangover_ms=1500)
+    gate.process(tone())
+
+    kept = 0
+    while gate.process(silence()) is not None:
+        kept += CHUNK
+    assert kept >= RATE * 1.5
+
+def test_filter_message_passthrough_and_drop():
+    """Test non-audio events pass and silent appends are dropped"""
+    gate = SilenceGate(sample_rate=RATE, preroll_ms=100)
+    commit = json.dumps({"type": "input_audio_buffer.commit"})
+    speech = append(tone())
+
+    assert gate.filter_message(commit) == commit
+    assert gate.filter_message(speech) == speech
+    gate.reset()
+    for _ in range(3):
+        gate.filter_message(append(silence()))
+    assert gate.filter_message(append(silence())) is None
+
+    with_preroll = json.loads(gate.filter_message(speech))
+    assert len(base64.b64decode(with_preroll["audio"])) > len(tone())
@@ -0,0 +1,82 @@
+"""
+Tests for server-driven barge-in
+"""
+import base64
+import barge_in
+from barge_in import ResponseTracker
+from monitoring import metrics
+
+def audio_delta(seconds: float, response_id: str = "resp_1") -> dict:
+    pcm = b"\x00\x00" * int(24000 * seconds)
+    return {
+        "type": "response.audio.delta",
+        "response_id": response_id,
+        "item_id": "item_1",
+        "content_index": 0,
+        "delta": base64.b64encode(pcm).decode()
+    }
+
+def response_done(response_id: str, status: str, audio_tokens: int) -> dict:
+    return {"type": "response.done", "response": {
+        "id": response_id, "status": status,
+        "usage": {"output_token_details": {"audio_tokens": audio_tokens}}
+    }}
+
+def test_sent_audio_is_measured_without_decoding():
+    """Test base64 delta lengths convert to audio milliseconds"""
+    tracker = ResponseTracker("s1")
+    tracker.on_response_created({"response": {"id": "resp_1"}})
+    tracker.on_audio_delta(audio_delta(0.5))
+    tracker.on_audio_delta(audio_delta(1.0))
+
+    assert tracker.sent_ms() == 1500
+
+def test_interrupt_truncates_to_played_position():
+    """Test cancel + truncate at the wall-clock played position"""
+    tracker = ResponseTracker("s1")
+    tracker.on_response_created({"response": {"id": "resp_1"}})
+    tracker.on_audio_delta(audio_delta(5.0))
+    start = tracker.first_audio_at
+
+    events = tracker.interrupt(now=start + 1.2)
+
+    assert events[0] == {"type": "response.cancel"}
+    assert events[1]["type"] == "conversation.item.truncate"
+    assert events[1]["item_id"] == "item_1"
+    assert events[1]["audio_end_ms"] == 1200
+    assert tracker.is_cancelled("resp_1")
+    assert not tracker.active
+
+def test_played_position_capped_at_sent_audio():
+    """Test played position never exceeds what was sent"""
+    tracker = ResponseTracker("s1")
+    tracker.on_response_created({"response": {"id": "resp_1"}})
+    tracker.on_audio_delta(audio_delta(0.5))
+
+    assert tracker.played_ms(now=tracker.first_audio_at + 10) == 500
+
+def test_no_interrupt_without_active_response():
+    """Test speech with no response in flight sends nothing"""
+    tracker = ResponseTracker("s1")
+    assert tracker.interrupt() == []
+
+    tracker.on_response_created({"response": {"id": "resp_1"}})
+    tracker.on_response_done(response_done("resp_1", "completed", 0))
+    assert tracker.interrupt() == []
+
+def test_avoided_tokens_estimate(monkeypatch):
+    """Test cancelled responses count tokens avoided vs the completed average"""
+    monkeypatch.setattr(barge_in, "_completed_responses", {"count": 0, "audio_tokens": 0})
+    tracker = ResponseTracker("s1")
+
+    tracker.on_response_created({"response": {"id": "resp_1"}})
+    tracker.on_response_done(response_done("resp_1", "completed", 400))
+
+    tracker.on_response_created({"response": {"id": "resp_2"}})
+    tracker.on_audio_delta(audio_delta(1.0, "resp_2"))
+    tracker.interrupt()
+    before = metrics.counters["barge_in_output_tokens_avoided_estimate"]
+    tracker.on_response_done(response_done("resp_2", "cancelled", 100))
+
+    assert metrics.counters["barge_in_output_tokens_avoided_estimate"] - before == 300
+    assert not tracker.is_cancelled("resp_2")
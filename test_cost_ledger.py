@@ -0,0 +1,108 @@
+"""
+Tests for the fleet cost ledger
+"""
+import os
+import json
+from datetime import datetime, timezone
+import cost_tracker
+from cost_ledger import CostLedger, HourlySeries, pid_alive
+from cost_tracker import CostTracker
+
+HOUR = 3600
+NOW = 1_700_000_000 // (24 * HOUR) * (24 * HOUR) + 10 * HOUR + 60  # 10:01 UTC
+
+def tokens(audio_output: int = 0, text_input: int = 0) -> dict:
+    return {
+        "text_input": text_input, "text_output": 0, "audio_input": 0, "audio_output": audio_output,
+        "cached_text_input": 0, "cached_audio_input": 0
+    }
+
+def test_rollups_per_hour_kb_and_deployment():
+    """Test usage is bucketed by hour, KB and deployment"""
+    ledger = CostLedger()
+    ledger.record("kb1", "gpt-4o", tokens(1000), 0.064, now=NOW)
+    ledger.record("kb1", "gpt-4o", tokens(500), 0.032, now=NOW + 60)
+    ledger.record("kb2", "gpt-4o", tokens(text_input=100), 0.0004, now=NOW)
+    ledger.record("kb1", "gpt-4o", tokens(1000), 0.064, now=NOW - HOUR)
+    
+    rows = ledger.rollups(hours=2, now=NOW)
+    
+    assert len(rows) == 3
+    current = [r for r in rows if r["kb_id"] == "kb1" and r["hour"].startswith("2023-11-14T10")]
+    assert current[0]["tokens"]["audio_output"] == 1500
+    assert current[0]["cost_usd"] == 0.096
+    assert len(ledger.rollups(hours=1, now=NOW)) == 2
+
+def test_series_ring_reuses_expired_hours():
+    """Test rows older than the retention window are overwritten, not kept"""
+    series = HourlySeries(hours=4)
+    series.add(100, tokens(10), 1)
+    series.add(104, tokens(20), 2)  # same slot, four hours later
+    
+    assert list(series.rows(0)) == [(104, tokens(20), 2)]
+
+def test_budget_breach_reports_action():
+    """Test hourly and daily budgets are checked against running totals"""
+    ledger = CostLedger(hourly_budget=1.0, daily_budget=1.5, action="economy")
+    ledger.record("kb1", "gpt-4o", tokens(), 0.9, now=NOW - HOUR)
+    ledger.record("kb1", "gpt-4o", tokens(), 0.7, now=NOW)
+    
+    status = ledger.budget_status(now=NOW)
+    
+    assert status["hourly"]["spent_usd"] == 0.7
+    assert status["exceeded"] == ["daily"]
+    assert status["action"] == "economy"
+    assert not ledger.over_budget(now=NOW + 24 * HOUR)
+
+def test_flush_and_load_roundtrip(tmp_path):
+    """Test a restarted process keeps the current day's spend"""
+    path = str(tmp_path / "ledger.json")
+    ledger = CostLedger(daily_budget=1.0, path=path)
+    ledger.record("kb1", "gpt-4o", tokens(1000), 1.2)
+    ledger.flush()
+    
+    restored = CostLedger(daily_budget=1.0, path=path)
+    restored.load()
+    
+    assert restored.rollups()[0]["tokens"]["audio_output"] == 1000
+    assert restored.over_budget()
+
+def write_worker_file(path, pid: int, cost_usd: float):
+    hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0).isoformat()
+    row = {"hour": hour, "kb_id": "kb1", "deployment": "gpt-4o", "tokens": tokens(1000), "cost_usd": cost_usd}
+    with open(path / f"ledger-{pid}.json", "w") as f:
+        json.dump({"rollups": [row]}, f)
+
+def test_budget_counts_live_workers(tmp_path):
+    """Test spend flushed by another live worker counts toward this worker's budget"""
+    write_worker_file(tmp_path, os.getppid(), 0.6)
+    ledger = CostLedger(daily_budget=1.0, path=str(tmp_path / "ledger.json"))
+    ledger.load()
+    ledger.record("kb1", "gpt-4o", tokens(1000), 0.6)
+    
+    assert ledger.over_budget()
+    assert ledger.rollups()[0]["tokens"]["audio_output"] == 2000
+    assert (tmp_path / f"ledger-{os.getppid()}.json").exists()
+
+def test_load_takes_over_dead_worker_files(tmp_path):
+    """Test a dead worker's file is merged into this worker's file, once"""
+    dead = next(pid for pid in range(4_000_000, 4_100_000) if not pid_alive(pid))
+    write_worker_file(tmp_path, dead, 0.5)
+    ledger = CostLedger(path=str(tmp_path / "ledger.json"))
+    ledger.load()
+    
+    assert ledger.spend()["day_usd"] == 0.5
+    assert os.listdir(tmp_path) == [f"ledger-{os.getpid()}.json"]
+
+def test_cost_tracker_feeds_ledger(monkeypatch):
+    """Test add_usage records incremental spend with the session's prices"""
+    ledger = CostLedger()
+    monkeypatch.setattr(cost_tracker, "cost_ledger", ledger)
+    tracker = CostTracker("s1", "kb1", "mini", CostTracker.ECONOMY_PRICES)
+    
+    tracker.add_usage({"output_token_details": {"audio_tokens": 1_000_000, "text_tokens": 0}})
+    
+    row = ledger.rollups()[0]
+    assert (row["kb_id"], row["deployment"]) == ("kb1", "mini")
+    assert row["cost_usd"] == 20.0
+    assert tracker.calculate_cost()["total"] == 20.0
@@ -0,0 +1,68 @@
+"""
+Tests for day/KB cost rollups
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import patch, MagicMock, AsyncMock
+from pymongo.errors import DuplicateKeyError
+from cost_rollups import summarize_rollups, record_session_cost
+
+def row(day: str, kb_id: str, sessions: int, cost_usd: float) -> dict:
+    return {"day": day, "kb_id": kb_id, "sessions": sessions, "cost_usd": cost_usd, "tokens": {"audio_output": sessions * 10}}
+
+def test_summary_totals_and_breakdowns():
+    """Test rollup rows combine into totals plus per-day and per-KB breakdowns"""
+    summary = summarize_rollups([
+        row("2024-01-01", "kb1", 2, 0.5),
+        row("2024-01-01", "kb2", 1, 0.25),
+        row("2024-01-02", "kb1", 1, 0.25)
+    ])
+
+    assert summary["total_sessions"] == 4
+    assert summary["total_cost_usd"] == 1.0
+    assert summary["average_cost_per_session"] == 0.25
+    assert summary["total_tokens"]["audio_output"] == 40
+    assert summary["by_day"][0] == {"day": "2024-01-01", "sessions": 3, "cost_usd": 0.75}
+    assert summary["by_kb"][0] == {"kb_id": "kb1", "sessions": 3, "cost_usd": 0.75}
+
+def test_empty_summary():
+    """Test no rollups gives zero totals"""
+    summary = summarize_rollups([])
+
+    assert summary["total_sessions"] == 0
+    assert summary["average_cost_per_session"] == 0
+
+@pytest.fixture
+def collections():
+    rollups, sessions = MagicMock(), MagicMock()
+    rollups.update_one = AsyncMock()
+    sessions.update_one = AsyncMock(return_value=MagicMock(modified_count=1, upserted_id=None))
+    with patch("cost_rollups.get_rollups_collection", return_value=rollups), \
+         patch("cost_rollups.get_sessions_collection", return_value=sessions):
+        yield rollups, sessions
+
+@pytest.mark.asyncio
+async def test_mongo_rollup_is_an_upserted_increment(collections):
+    """Test a saved session increments its day/KB rollup document"""
+    rollups, _ = collections
+
+    await record_session_cost("s1", "kb1", datetime(2024, 1, 1, 10), {"cost_usd": 0.5, "tokens": {"text_input": 20}})
+
+    query, update = rollups.update_one.await_args.args
+    assert query == {"_id": "2024-01-01|kb1"}
+    assert update["$inc"]["sessions"] == 1
+    assert update["$inc"]["tokens.text_input"] == 20
+    assert rollups.update_one.await_args.kwargs["upsert"] is True
+
+@pytest.mark.asyncio
+async def test_saving_a_session_twice_counts_it_once(collections):
+    """Test the second save of a session finds it already counted and leaves the rollup alone"""
+    rollups, sessions = collections
+    sessions.update_one.side_effect = [MagicMock(modified_count=1, upserted_id=None), DuplicateKeyError("dup")]
+    cost = {"cost_usd": 0.5, "tokens": {}}
+
+    assert await record_session_cost("s1", "kb1", datetime(2024, 1, 1, 10), cost) is True
+    assert await record_session_cost("s1", "kb1", datetime(2024, 1, 1, 10), cost) is False
+
+    assert rollups.update_one.await_count == 1
+    assert sessions.update_one.await_args.args[0] == {"session_id": "s1", "cost_rolled_up": {"$ne": True}}
@@ -98,3 +98,39 @@ def test_get_summary():
     assert summary["tokens"]["text_input"] == 1000
     assert summary["tokens"]["text_output"] == 500
     assert "cost_usd" in summary
+
+def test_cached_input_tokens_billed_at_cached_rate():
+    """Test cached text/audio input is split out of the uncached counts"""
+    tracker = CostTracker("test-session")
+    
+    tracker.add_usage({
+        "input_tokens": 1_200_000,
+        "output_tokens": 0,
+        "input_token_details": {
+            "cached_tokens": 1_000_000,
+            "text_tokens": 1_000_000,
+            "audio_tokens": 200_000,
+            "cached_tokens_details": {"text_tokens": 900_000, "audio_tokens": 100_000}
+        },
+        "output_token_details": {}
+    })
+    
+    assert tracker.tokens["text_input"] == 100_000
+    assert tracker.tokens["audio_input"] == 100_000
+    assert tracker.tokens["cached_text_input"] == 900_000
+    assert tracker.tokens["cached_audio_input"] == 100_000
+    assert tracker.calculate_cost()["breakdown"]["cached_text_input"] == 0.36
+    assert tracker.cache_hit_ratio() == pytest.approx(1_000_000 / 1_200_000, abs=1e-4)
+
+def test_prompt_cache_stats_per_kb():
+    """Test per-KB hit ratios from the labelled token counters"""
+    from monitoring import Metrics
+    from cost_tracker import prompt_cache_stats
+    source = Metrics()
+    source.increment("tokens", 300, labels={"type": "text_input", "kb_id": "kb1"})
+    source.increment("tokens", 700, labels={"type": "cached_text_input", "kb_id": "kb1"})
+    source.increment("tokens", 500, labels={"type": "audio_output", "kb_id": "kb1"})
+    
+    stats = prompt_cache_stats(source)
+    
+    assert stats["kb1"] == {"input_tokens": 1000, "cached_input_tokens": 700, "hit_ratio": 0.7}
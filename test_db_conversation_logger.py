@@ -0,0 +1,78 @@
+"""
+Tests for batched writes in the MongoDB conversation logger
+"""
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from db_conversation_logger import MongoConversationLogger
+
+@pytest.fixture
+def collections():
+    messages, sessions = MagicMock(), MagicMock()
+    messages.insert_many = AsyncMock()
+    sessions.update_one = AsyncMock()
+    with patch("message_store.get_messages_collection", return_value=messages), \
+         patch("db_conversation_logger.get_sessions_collection", return_value=sessions):
+        yield messages, sessions
+
+@pytest.mark.asyncio
+async def test_messages_flushed_in_batches(collections):
+    """Test a full batch is one insert_many and one coalesced $inc"""
+    messages, sessions = collections
+    convo = MongoConversationLogger("s1", "kb1", batch_size=5, flush_interval=60)
+
+    for i in range(12):
+        await convo.log_message("user", f"line {i}")
+
+    assert messages.insert_many.await_count == 2
+    assert len(messages.insert_many.await_args.args[0]) == 5
+    assert messages.insert_many.await_args.kwargs["ordered"] is False
+    assert sessions.update_one.await_args.args[1] == {"$inc": {"message_count": 5}}
+    assert len(convo._pending) == 2
+
+@pytest.mark.asyncio
+async def test_save_flushes_remaining_messages(collections):
+    """Test save() writes whatever is still buffered before closing the session"""
+    messages, sessions = collections
+    convo = MongoConversationLogger("s1", "kb1", batch_size=50, flush_interval=60)
+    await convo.log_message("user", "hello")
+    await convo.log_function_call("search_knowledge_base", {"query": "q"}, "result")
+
+    await convo.save()
+
+    assert len(messages.insert_many.await_args.args[0]) == 2
+    assert sessions.update_one.await_args_list[0].args[1] == {"$inc": {"message_count": 2}}
+    assert convo._timer is None
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_messages(collections):
+    """Test messages survive a failed flush and go out with the next one"""
+    messages, sessions = collections
+    messages.insert_many.side_effect = [ConnectionError("down"), None]
+    convo = MongoConversationLogger("s1", "kb1", batch_size=2, flush_interval=60)
+
+    await convo.log_message("user", "a")
+    await convo.log_message("assistant", "b")
+    await convo.log_message("user", "c")
+    await convo.flush()
+
+    assert len(messages.insert_many.await_args.args[0]) == 3
+    assert sessions.update_one.await_args.args[1] == {"$inc": {"message_count": 3}}
+
+@pytest.mark.asyncio
+async def test_message_after_quiet_gap_waits_for_the_timer(collections):
+    """Test a message after a gap longer than flush_interval is batched with the next ones, not written alone"""
+    messages, _ = collections
+    convo = MongoConversationLogger("s1", "kb1", batch_size=20, flush_interval=0.05)
+    await convo.log_message("user", "turn 0")
+    await asyncio.sleep(0.1)
+    assert messages.insert_many.await_count == 1
+
+    await asyncio.sleep(0.1)
+    await convo.log_message("assistant", "turn 1")
+    await convo.log_message("user", "turn 2")
+    assert messages.insert_many.await_count == 1
+
+    await asyncio.sleep(0.1)
+    assert messages.insert_many.await_count == 2
+    assert len(messages.insert_many.await_args.args[0]) == 2
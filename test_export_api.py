@@ -0,0 +1,60 @@
+"""
+Tests for the NDJSON export endpoints
+"""
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import app
+from archive import write_segment
+from session_index import SessionIndex
+
+def session(session_id: str, start_time: str, kb_id: str = "kb1") -> dict:
+    return {
+        "session_id": session_id, "kb_id": kb_id, "start_time": start_time, "message_count": 2,
+        "messages": [{"timestamp": start_time, "role": "user", "type": "text", "content": f"{session_id} q"},
+                     {"timestamp": start_time, "role": "assistant", "type": "text", "content": f"{session_id} a"}],
+        "cost": {"cost_usd": 0.01}
+    }
+
+@pytest.fixture
+def index(tmp_path):
+    index = SessionIndex(":memory:")
+    documents = [session("s1", "2024-01-01T10:00:00"), session("s2", "2024-01-02T10:00:00", kb_id="kb2"),
+                 session("s3", "2024-01-03T10:00:00")]
+    segment = str(tmp_path / "segment.jsonl.gz")
+    index.index_archived(segment, documents, write_segment(segment, documents))
+    with patch("export_api.session_index", index), patch("export_api.PAGE_SIZE", 2), \
+         patch("admin_api.Config.ADMIN_TOKEN", "secret"):
+        yield index
+
+def lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_export_sessions_filters_and_fields(index):
+    """Test sessions stream oldest first, filtered by KB and date, with only the requested fields"""
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    response = client.get("/export/sessions?kb_id=kb1&since=2024-01-01&until=2024-01-04&fields=session_id,start_time")
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert lines(response) == [
+        {"session_id": "s1", "start_time": "2024-01-01T10:00:00"},
+        {"session_id": "s3", "start_time": "2024-01-03T10:00:00"}
+    ]
+
+def test_export_messages_pages_through_index(index):
+    """Test every message of every session is exported across index pages"""
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    rows = lines(client.get("/export/messages?fields=session_id,role,content"))
+
+    assert len(rows) == 6
+    assert rows[0] == {"session_id": "s1", "role": "user", "content": "s1 q"}
+    assert rows[-1]["content"] == "s3 a"
+
+def test_export_rejects_unknown_source(index):
+    """Test a bad source is a 400 before anything is streamed"""
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    assert client.get("/export/sessions?source=s3").status_code == 400
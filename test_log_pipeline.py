@@ -0,0 +1,87 @@
+"""
+Tests for the non-blocking structured logging pipeline
+"""
+import io
+import json
+import queue
+import logging
+import logging.handlers
+from log_pipeline import (
+    NonBlockingQueueHandler, SamplingFilter, ContextFilter, JsonFormatter,
+    session_id_var, parse_sample_rates
+)
+from monitoring import metrics
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(name)
+    log.handlers = [handler]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    return log
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test records are dropped and counted when the writer falls behind"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    log = make_logger("test.full", handler)
+    before = metrics.counters["log_records_dropped"]
+    
+    for i in range(5):
+        log.info("message %d", i)
+    
+    assert handler.queue.qsize() == 2
+    assert metrics.counters["log_records_dropped"] - before == 3
+    assert handler.queue.get_nowait().msg == "message 0"
+
+def test_json_output_carries_session_id():
+    """Test the correlation ID is stamped on the caller and written as JSON"""
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue())
+    handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    log = make_logger("test.json", handler)
+    
+    listener.start()
+    token = session_id_var.set("sess-1")
+    try:
+        log.info("[WS] hello %s", "world")
+    finally:
+        session_id_var.reset(token)
+        listener.stop()
+    
+    entry = json.loads(stream.getvalue())
+    assert entry["msg"] == "[WS] hello world"
+    assert entry["session_id"] == "sess-1"
+    assert entry["logger"] == "test.json"
+
+def test_rate_limit_reports_suppressed_count():
+    """Test a chatty logger is limited and the next record reports the gap"""
+    handler = NonBlockingQueueHandler(queue.Queue())
+    limiter = SamplingFilter(rate_per_second=0.001, burst=3)
+    handler.addFilter(limiter)
+    log = make_logger("test.rate", handler)
+    
+    for i in range(10):
+        log.info("tick %d", i)
+    log.warning("always kept")
+    assert handler.queue.qsize() == 4
+    
+    limiter.buckets["test.rate"][0] = 1  # refill one token
+    log.info("after")
+    records = [handler.queue.get_nowait() for _ in range(5)]
+    assert records[-1].msg == "after"
+    assert records[-1].suppressed == 7
+
+def test_tag_sampling_keeps_one_in_n():
+    """Test hot tagged messages are sampled while others pass"""
+    handler = NonBlockingQueueHandler(queue.Queue())
+    handler.addFilter(SamplingFilter(0, 0, parse_sample_rates("[METRIC]=0.25")))
+    log = make_logger("test.sample", handler)
+    
+    for i in range(8):
+        log.info(f"[METRIC] op: {i}")
+    log.info("[RAG] searching")
+    
+    messages = [handler.queue.get_nowait().msg for _ in range(handler.queue.qsize())]
+    assert messages == ["[METRIC] op: 0", "[METRIC] op: 4", "[RAG] searching"]
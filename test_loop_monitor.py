@@ -0,0 +1,53 @@
+"""
+Tests for the event-loop lag monitor
+"""
+import time
+import asyncio
+import pytest
+from loop_monitor import LoopLagMonitor
+
+def blocking_call(seconds: float):
+    time.sleep(seconds)
+
+@pytest.mark.asyncio
+async def test_stall_attributed_to_blocking_call_site():
+    """Test a blocking call on the loop is recorded with its call site"""
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        blocking_call(0.25)
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+    
+    stats = monitor.get_stats()
+    assert stats["stalls"] >= 1
+    assert stats["max_lag_ms"] >= 200
+    top = stats["offenders"][0]
+    assert "blocking_call" in top["call_site"]
+    assert any("test_stall_attributed" in frame for frame in top["stack"])
+
+@pytest.mark.asyncio
+async def test_no_stalls_when_loop_is_free():
+    """Test short awaits don't count as stalls"""
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+    
+    stats = monitor.get_stats()
+    assert stats["stalls"] == 0
+    assert stats["lag"]["count"] > 0
+
+def test_offender_table_is_bounded():
+    """Test distinct call sites beyond max_sites fold into 'other'"""
+    monitor = LoopLagMonitor(max_sites=2)
+    for i in range(5):
+        monitor._pending = (f"site_{i}", [])
+        monitor.record_stall(0.2)
+    
+    sites = {o["call_site"] for o in monitor.get_stats()["offenders"]}
+    assert sites == {"site_0", "site_1", "other"}
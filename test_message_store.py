@@ -0,0 +1,130 @@
+"""
+Tests for the MongoDB message storage layouts
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import patch, MagicMock, AsyncMock
+from pymongo.errors import BulkWriteError
+from message_store import MessageStore
+
+def message(i: int) -> dict:
+    return {"session_id": "s1", "timestamp": datetime(2024, 1, 1, 10, 0, i), "role": "user",
+            "message_type": "text", "content": f"line {i}", "metadata": {}}
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+class BucketCollection:
+    """Applies the bucket upserts the way MongoDB would, in order"""
+    def __init__(self):
+        self.buckets = []
+        self.bulk_writes = 0
+
+    async def bulk_write(self, updates, ordered):
+        self.bulk_writes += 1
+        for query, update in updates:
+            bucket = next((b for b in self.buckets if b["session_id"] == query["session_id"]
+                           and b["count"] < query["count"]["$lt"]), None)
+            if bucket is None:
+                bucket = {"session_id": query["session_id"], "count": 0, "messages": []}
+                self.buckets.append(bucket)
+            bucket["messages"].append(update["$push"]["messages"])
+            bucket["count"] += update["$inc"]["count"]
+            bucket["start"] = min(bucket.get("start", update["$min"]["start"]), update["$min"]["start"])
+            bucket["end"] = max(bucket.get("end", update["$max"]["end"]), update["$max"]["end"])
+
+@pytest.mark.asyncio
+async def test_buckets_fill_across_flushes():
+    """Test small flushes append to the open bucket, and a new one opens only when it is full"""
+    store = MessageStore(layout="buckets", bucket_size=4)
+    collection = BucketCollection()
+
+    with patch("message_store.get_database", return_value={"message_buckets": collection}), \
+         patch("message_store.UpdateOne", lambda query, update, upsert: (query, update)):
+        for flush in range(3):
+            written = await store.write([message(i) for i in range(flush * 3, flush * 3 + 3)])
+            assert written == 3
+
+    assert collection.bulk_writes == 3
+    assert [b["count"] for b in collection.buckets] == [4, 4, 1]
+    assert collection.buckets[1]["start"] == datetime(2024, 1, 1, 10, 0, 4)
+    assert collection.buckets[1]["end"] == datetime(2024, 1, 1, 10, 0, 7)
+    assert [m["content"] for m in collection.buckets[1]["messages"]] == ["line 4", "line 5", "line 6", "line 7"]
+    assert "session_id" not in collection.buckets[0]["messages"][0]
+
+@pytest.mark.asyncio
+async def test_rejected_bucket_message_is_skipped():
+    """Test an ordered bucket write resumes after the message Mongo rejected"""
+    store = MessageStore(layout="buckets", bucket_size=4)
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock(side_effect=[BulkWriteError({"writeErrors": [{"index": 1, "code": 121}]}), None])
+
+    with patch("message_store.get_database", return_value={"message_buckets": collection}):
+        written = await store.write([message(i) for i in range(4)])
+
+    assert written == 3
+    assert len(collection.bulk_write.await_args.args[0]) == 2
+
+@pytest.mark.asyncio
+async def test_duplicates_count_as_written():
+    """Test documents a failed earlier attempt already stored are counted, rejected ones are not"""
+    store = MessageStore()
+    collection = MagicMock()
+    collection.insert_many = AsyncMock(side_effect=BulkWriteError({"writeErrors": [
+        {"index": 0, "code": 11000}, {"index": 2, "code": 121}
+    ]}))
+
+    with patch("message_store.get_messages_collection", return_value=collection):
+        written = await store.write([message(i) for i in range(5)])
+
+    assert written == 4
+
+@pytest.mark.asyncio
+async def test_bucket_reads_flatten_in_order():
+    """Test transcript reads through buckets return plain messages"""
+    store = MessageStore(layout="buckets", bucket_size=2)
+    buckets = [{"messages": [message(0), message(1)]}, {"messages": [message(2)]}]
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value = AsyncCursor(buckets)
+
+    with patch("message_store.get_database", return_value={"message_buckets": collection}):
+        messages = await store.read("s1")
+
+    assert [m["content"] for m in messages] == ["line 0", "line 1", "line 2"]
+    assert collection.find.return_value.sort.call_args.args == ("start", 1)
+
+@pytest.mark.asyncio
+async def test_ttl_converts_existing_plain_index():
+    """Test TTL is applied to a pre-existing non-TTL timestamp index with collMod, not a conflicting create"""
+    store = MessageStore(ttl_days=30)
+    collection = MagicMock()
+    collection.name = "messages"
+    collection.create_index = AsyncMock()
+    collection.index_information = AsyncMock(return_value={
+        "_id_": {"key": [("_id", 1)]}, "timestamp_1": {"key": [("timestamp", 1)]}
+    })
+    database = MagicMock()
+    database.command = AsyncMock()
+
+    with patch("message_store.get_messages_collection", return_value=collection), \
+         patch("message_store.get_database", return_value=database):
+        await store.init()
+
+    assert store.initialized
+    database.command.assert_awaited_once_with(
+        "collMod", "messages", index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": 30 * 86400}
+    )
+    assert all("expireAfterSeconds" not in call.kwargs for call in collection.create_index.await_args_list)
+
+def test_unknown_layout_rejected():
+    """Test a typo in MONGO_MESSAGE_LAYOUT fails loudly"""
+    with pytest.raises(ValueError):
+        MessageStore(layout="bucket")
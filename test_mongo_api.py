@@ -0,0 +1,50 @@
+"""
+Tests for MongoDB session listing, pagination and index checks
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import patch, MagicMock, AsyncMock
+import mongo_api
+from mongo_api import encode_cursor, session_query, plan_stages
+
+def test_cursor_continues_after_last_session():
+    """Test the keyset filter resumes strictly after the previous page's last session"""
+    last = {"created_at": datetime(2024, 1, 2, 10), "session_id": "s5"}
+
+    query = session_query(kb_id="kb1", cursor=encode_cursor(last))
+
+    assert query["kb_id"] == "kb1"
+    assert query["$or"] == [
+        {"created_at": {"$lt": datetime(2024, 1, 2, 10)}},
+        {"created_at": datetime(2024, 1, 2, 10), "session_id": {"$lt": "s5"}}
+    ]
+
+def test_date_range_filter():
+    """Test since/until bound created_at"""
+    query = session_query(since="2024-01-01", until="2024-01-08")
+
+    assert query["created_at"] == {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 1, 8)}
+
+def test_plan_stages_walks_nested_plan():
+    """Test explain() plans are flattened so scans and sorts can be spotted"""
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": "IXSCAN"}}}
+
+    assert plan_stages(plan) == ["LIMIT", "PROJECTION_SIMPLE", "IXSCAN"]
+
+@pytest.mark.asyncio
+async def test_list_sessions_returns_next_cursor():
+    """Test one extra row is fetched to tell whether another page exists"""
+    docs = [{"session_id": f"s{i}", "kb_id": "kb1", "created_at": datetime(2024, 1, 1, i)} for i in (3, 2, 1)]
+    cursor = MagicMock()
+    cursor.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=docs)
+    collection = MagicMock()
+    collection.find.return_value = cursor
+
+    with patch("mongo_api.get_sessions_collection", return_value=collection):
+        response = await mongo_api.list_sessions(limit=2, fields="session_id,kb_id")
+
+    body = response.body.decode()
+    assert '"session_id":"s2"' in body and '"s1"' not in body
+    assert '"next_cursor":null' not in body
+    projection = collection.find.call_args.args[1]
+    assert projection == {"_id": 0, "created_at": 1, "session_id": 1, "kb_id": 1}
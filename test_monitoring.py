@@ -0,0 +1,102 @@
+"""
+Tests for metrics timers and latency histograms
+"""
+import random
+import pytest
+from monitoring import Metrics, LatencyHistogram, RollingWindow
+
+def test_histogram_percentiles_within_bucket_error():
+    """Test percentiles of a known distribution stay within ~3%"""
+    histogram = LatencyHistogram()
+    values = [i / 1000 for i in range(1, 1001)]  # 1ms .. 1s
+    random.Random(1).shuffle(values)
+    for v in values:
+        histogram.record(v)
+    
+    assert histogram.total == 1000
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.03)
+    assert histogram.percentile(90) == pytest.approx(0.9, rel=0.03)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.03)
+    assert histogram.summary()["max"] == 1.0
+
+def test_histogram_fixed_size():
+    """Test memory does not grow with the number of samples"""
+    histogram = LatencyHistogram()
+    size = len(histogram.counts)
+    for i in range(10_000):
+        histogram.record(i * 0.01)
+    histogram.record(10_000)  # clamped
+    
+    assert len(histogram.counts) == size
+    assert histogram.total == 10_001
+
+def test_bucket_bounds_roundtrip():
+    """Test every value lands in a bucket whose bounds contain it"""
+    histogram = LatencyHistogram()
+    for value in [0, 1, 31, 32, 33, 63, 64, 65, 1000, 123_456, 99_999_999]:
+        low, high = histogram.bucket_bounds(histogram.bucket_index(value))
+        assert low <= value <= high
+
+def test_concurrent_timers_do_not_overwrite():
+    """Test two overlapping invocations of one operation are both recorded"""
+    metrics = Metrics()
+    first = metrics.start_timer("rag_search")
+    second = metrics.start_timer("rag_search")
+    second.started -= 0.2
+    first.started -= 0.5
+    
+    assert metrics.end_timer(second) == pytest.approx(0.2, abs=0.05)
+    assert metrics.end_timer(first) == pytest.approx(0.5, abs=0.05)
+    assert metrics.latencies["rag_search"].total == 2
+
+def test_timer_context_manager_skips_failures():
+    """Test failed operations are not recorded as latencies"""
+    metrics = Metrics()
+    with metrics.timer("azure_connect"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timer("azure_connect"):
+            raise ValueError("boom")
+    
+    stats = metrics.get_stats()
+    assert stats["latency_percentiles"]["azure_connect"]["count"] == 1
+    assert "azure_connect" in stats["avg_latencies"]
+
+def test_rolling_window_rates_and_percentiles():
+    """Test 1m / 15m windows see only events inside them"""
+    window = RollingWindow()
+    now = 10_000.0
+    for i in range(100):
+        window.add_request(0.1, now=now - 600)  # 10 minutes ago
+    for i in range(20):
+        window.add_request(0.5, now=now - 5)
+    window.add_error(now=now - 5)
+    
+    recent = window.summary(60, now=now)
+    assert recent["requests"] == 20
+    assert recent["errors"] == 1
+    assert recent["error_rate"] == 0.05
+    assert recent["p95"] == pytest.approx(0.5, rel=0.03)
+    
+    assert window.summary(900, now=now)["requests"] == 120
+    assert window.latency_over(0.3, 900, now=now) == (20, 120)
+
+def test_rolling_window_expires_old_buckets():
+    """Test buckets older than the span are reused, not accumulated"""
+    window = RollingWindow(span_seconds=60, bucket_seconds=10)
+    window.add_request(0.1, now=1000.0)
+    window.add_request(0.1, now=1065.0)  # same ring slot as 1000 + 60s
+    
+    assert window.summary(60, now=1065.0)["requests"] == 1
+
+def test_errors_charged_to_operation_window():
+    """Test record_error with an operation counts a failed request in that operation's window"""
+    m = Metrics()
+    for _ in range(3):
+        m.record_latency("rag_search", 0.2)
+    m.record_error("rag_search_failed", operation="rag_search")
+    
+    windows = m.get_windows()
+    assert windows["rag_search"]["1m"]["error_rate"] == 0.25
+    assert windows["rag_search"]["1m"]["requests"] == 4
+    assert windows["errors"]["5m"]["requests"] == 1
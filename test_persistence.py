@@ -0,0 +1,140 @@
+"""
+Tests for the background session persistence writer
+"""
+import os
+import json
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from config import Config
+from persistence import PersistenceService
+from session_index import SessionIndex
+
+@pytest.fixture(autouse=True)
+def session_index(tmp_path):
+    """Keep the writer's index rows out of the working tree"""
+    index = SessionIndex(str(tmp_path / "sessions.sqlite3"))
+    with patch("persistence.session_index", index):
+        yield index
+    index.close()
+
+def document(session_id: str) -> dict:
+    return {"session_id": session_id, "kb_id": "kb1", "messages": [], "cost": None}
+
+def mock_db(insert_many):
+    collection = MagicMock()
+    collection.insert_many = insert_many
+    return MagicMock(return_value={"conversations": collection})
+
+@pytest.mark.asyncio
+async def test_sessions_written_in_one_batch(tmp_path):
+    """Test queued sessions become one insert_many plus one file each"""
+    insert_many = AsyncMock()
+    service = PersistenceService(batch_size=3, flush_interval=5, spool_dir=str(tmp_path / "spool"))
+
+    with patch("persistence.get_database", mock_db(insert_many)):
+        service.start()
+        for i in range(3):
+            service.submit(document(f"s{i}"), str(tmp_path / f"s{i}.json"))
+        await service.stop()
+
+    insert_many.assert_awaited_once()
+    rows = insert_many.await_args.args[0]
+    assert [row["_id"] for row in rows] == ["s0", "s1", "s2"]
+    with open(tmp_path / "s1.json") as f:
+        assert json.load(f)["folder_path"] == str(tmp_path / "s1.json")
+    assert not os.path.exists(tmp_path / "spool")
+
+@pytest.mark.asyncio
+async def test_failed_insert_spools_and_replays(tmp_path):
+    """Test a batch Mongo rejects is spooled locally and inserted on the next start"""
+    spool_dir = str(tmp_path / "spool")
+    service = PersistenceService(flush_interval=0.01, spool_dir=spool_dir)
+
+    with patch.object(Config, "MAX_RETRY_ATTEMPTS", 1), \
+         patch("persistence.get_database", mock_db(AsyncMock(side_effect=ConnectionError("down")))):
+        service.start()
+        service.submit(document("s1"), str(tmp_path / "s1.json"))
+        await service.stop()
+
+    assert os.path.exists(tmp_path / "s1.json")
+    assert service.get_stats()["spool_files"] == 1
+
+    insert_many = AsyncMock()
+    with patch("persistence.get_database", mock_db(insert_many)):
+        await service.replay_spool()
+
+    assert insert_many.await_args.args[0][0]["session_id"] == "s1"
+    assert os.listdir(spool_dir) == []
+
+@pytest.mark.asyncio
+async def test_failed_replay_keeps_sessions_spooled_meanwhile(tmp_path):
+    """Test a failed replay is appended back rather than overwriting a spool written during it"""
+    spool_dir = str(tmp_path / "spool")
+    service = PersistenceService(spool_dir=spool_dir)
+    service._spool([document("s1")])
+
+    async def insert_fails(rows, ordered):
+        service._spool([document("s2")])  # another session spooled while replaying
+        raise ConnectionError("down")
+
+    with patch("persistence.get_database", mock_db(insert_fails)):
+        await service.replay_spool()
+
+    (spool_file,) = os.listdir(spool_dir)
+    spooled = service._read_spool(os.path.join(spool_dir, spool_file))
+    assert sorted(d["session_id"] for d in spooled) == ["s1", "s2"]
+
+@pytest.mark.asyncio
+async def test_interrupted_replay_is_merged_and_replayed(tmp_path):
+    """Test a leftover .replaying file next to a newer spool is merged instead of skipped forever"""
+    spool_dir = str(tmp_path / "spool")
+    service = PersistenceService(spool_dir=spool_dir)
+    service._spool([document("s1")])
+    (path,) = [os.path.join(spool_dir, name) for name in os.listdir(spool_dir)]
+    os.replace(path, f"{path}.replaying")
+    service._spool([document("s2")])
+    insert_many = AsyncMock()
+
+    with patch("persistence.get_database", mock_db(insert_many)):
+        await service.replay_spool()
+
+    assert sorted(row["_id"] for row in insert_many.await_args.args[0]) == ["s1", "s2"]
+    assert os.listdir(spool_dir) == []
+
+@pytest.mark.asyncio
+async def test_stop_mid_replay_restores_spool(tmp_path):
+    """Test stopping during a replay cancels it and puts the spool back"""
+    spool_dir = str(tmp_path / "spool")
+    service = PersistenceService(spool_dir=spool_dir)
+    service._spool([document("s1")])
+    started = asyncio.Event()
+
+    async def slow_insert(rows, ordered):
+        started.set()
+        await asyncio.sleep(10)
+
+    with patch("persistence.get_database", mock_db(slow_insert)):
+        service.start()
+        await started.wait()
+        await service.stop()
+
+    (spool_file,) = os.listdir(spool_dir)
+    assert not spool_file.endswith(".replaying")
+    assert service._read_spool(os.path.join(spool_dir, spool_file))[0]["session_id"] == "s1"
+
+@pytest.mark.asyncio
+async def test_full_queue_does_not_block(tmp_path):
+    """Test submit falls back to the spool instead of waiting when the queue is full"""
+    service = PersistenceService(queue_size=1, spool_dir=str(tmp_path / "spool"))
+    service.queue = asyncio.Queue(maxsize=1)
+    service._task = asyncio.create_task(asyncio.sleep(10))  # writer that never drains
+
+    service.submit(document("s1"), str(tmp_path / "s1.json"))
+    service.submit(document("s2"), str(tmp_path / "s2.json"))
+    await asyncio.sleep(0.1)
+
+    assert service.queue.qsize() == 1
+    assert os.path.exists(tmp_path / "s2.json")
+    assert service.get_stats()["spool_files"] == 1
+    service._task.cancel()
@@ -0,0 +1,50 @@
+"""
+Tests for the sampling profiler
+"""
+import time
+import threading
+import pytest
+from profiler import SamplingProfiler, ProfilerBusy
+
+def busy_worker(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_collapsed_stacks_include_busy_thread():
+    """Test a CPU-bound thread shows up in collapsed output"""
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_worker, args=(stop,), name="busy")
+    worker.start()
+    try:
+        result = SamplingProfiler().profile(0.3, rate=100)
+    finally:
+        stop.set()
+        worker.join()
+    
+    assert result["samples"] > 10
+    collapsed = SamplingProfiler.to_collapsed(result["stacks"])
+    line = next(l for l in collapsed.splitlines() if l.startswith("busy;"))
+    assert "test_profiler.py:busy_worker" in line
+    assert int(line.rsplit(" ", 1)[1]) > 0
+
+def test_limits_are_clamped():
+    """Test rate and duration are capped by the configured maxima"""
+    profiler = SamplingProfiler(max_seconds=0.2, max_rate=20)
+    started = time.perf_counter()
+    result = profiler.profile(30, rate=10_000)
+    
+    assert time.perf_counter() - started < 1
+    assert result["rate_hz"] == 20
+    assert result["samples"] <= 5
+
+def test_one_run_at_a_time():
+    """Test a second concurrent profile is refused"""
+    profiler = SamplingProfiler()
+    runner = threading.Thread(target=profiler.profile, args=(0.3,))
+    runner.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(ProfilerBusy):
+            profiler.profile(0.1)
+    finally:
+        runner.join()
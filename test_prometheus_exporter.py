@@ -0,0 +1,75 @@
+"""
+Tests for Prometheus exposition
+"""
+from unittest.mock import patch
+from monitoring import Metrics
+from session_manager import SessionRegistry
+from prometheus_exporter import PrometheusExporter
+from cost_tracker import CostTracker
+
+def make_exporter(cache_seconds=0):
+    source = Metrics()
+    return source, PrometheusExporter(source, SessionRegistry(), cache_seconds)
+
+def test_labelled_counters_and_errors():
+    """Test per-KB counters and per-type errors are labelled series"""
+    source, exporter = make_exporter()
+    source.increment("rag_searches", labels={"kb_id": "kb1"})
+    source.increment("rag_searches", labels={"kb_id": "kb2"})
+    source.increment("ws_connections")
+    source.record_error("azure_timeout")
+    
+    text = exporter.render()
+    
+    assert 'rag_liveavatar_rag_searches_total{kb_id="kb1"} 1' in text
+    assert 'rag_liveavatar_rag_searches_total{kb_id="kb2"} 1' in text
+    assert "rag_liveavatar_ws_connections_total 1" in text
+    assert 'rag_liveavatar_errors_total{type="azure_timeout"} 1' in text
+    assert "# TYPE rag_liveavatar_rag_searches_total counter" in text
+
+def test_latency_histogram_buckets():
+    """Test histograms expose cumulative le buckets, sum and count"""
+    source, exporter = make_exporter()
+    for seconds in (0.02, 0.2, 2.0):
+        source.record_latency("rag_search", seconds)
+    
+    text = exporter.render()
+    
+    assert 'rag_liveavatar_rag_search_seconds_bucket{le="0.025"} 1' in text
+    assert 'rag_liveavatar_rag_search_seconds_bucket{le="0.25"} 2' in text
+    assert 'rag_liveavatar_rag_search_seconds_bucket{le="+Inf"} 3' in text
+    assert "rag_liveavatar_rag_search_seconds_count 3" in text
+
+def test_gauges_and_cost():
+    """Test session / circuit gauges and cost priced per deployment"""
+    source, exporter = make_exporter()
+    exporter.registry.register("s1", "kb1")
+    usage = {"output_tokens": 1_000_000, "output_token_details": {"text_tokens": 0, "audio_tokens": 1_000_000}}
+    with patch("cost_tracker.metrics", source), patch("cost_tracker.cost_ledger"):
+        CostTracker("s1", "kb1", "gpt-realtime").add_usage(usage)
+        CostTracker("s2", "kb1", "gpt-realtime-mini", CostTracker.ECONOMY_PRICES).add_usage(usage)
+    
+    text = exporter.render()
+    
+    assert "rag_liveavatar_active_sessions 1" in text
+    assert 'rag_liveavatar_circuit_breaker_state{breaker="azure"} 0' in text
+    assert 'rag_liveavatar_cost_usd_total{deployment="gpt-realtime",kb_id="kb1"} 64.0' in text
+    assert 'rag_liveavatar_cost_usd_total{deployment="gpt-realtime-mini",kb_id="kb1"} 20.0' in text
+    assert 'rag_liveavatar_tokens_total{deployment="gpt-realtime-mini",kb_id="kb1",type="audio_output"} 1000000' in text
+
+def test_render_is_cached():
+    """Test scrapes inside the cache window reuse the rendered text"""
+    source, exporter = make_exporter(cache_seconds=60)
+    first = exporter.render()
+    source.increment("ws_connections")
+    
+    assert exporter.render() is first
+    with patch("prometheus_exporter.time.monotonic", return_value=10**9):
+        assert "ws_connections" in exporter.render()
+
+def test_label_values_are_escaped():
+    """Test quotes and backslashes in label values are escaped"""
+    source, exporter = make_exporter()
+    source.increment("rag_searches", labels={"kb_id": 'kb"1\\'})
+    
+    assert 'kb_id="kb\\"1\\\\"' in exporter.render()
@@ -2,8 +2,10 @@
 Unit tests for RAG service
 """
 import pytest
+import time
 from unittest.mock import Mock, patch, MagicMock
-from rag_service import DynamicRAG
+from rag_service import DynamicRAG, SearchCache
+from monitoring import Metrics
 
 @pytest.fixture
 def mock_config():
@@ -15,6 +17,8 @@ def mock_config():
         mock.EMBEDDING_ENDPOINT = "https://test.openai.azure.com"
         mock.EMBEDDING_API_VERSION = "2023-05-15"
         mock.EMBEDDING_DEPLOYMENT_NAME = "test-embedding"
+        mock.RAG_CACHE_SIZE = 16
+        mock.RAG_CACHE_TTL = 60
         yield mock
 
 @pytest.fixture
@@ -80,6 +84,18 @@ def test_search_embedding_failure(mock_config, mock_search_client, mock_openai_c
     result = rag.search("test query", "kb123")
     assert result is None
 
+def test_exhausted_search_is_not_timed_as_success(mock_config, mock_search_client, mock_openai_client):
+    """Test a search that exhausts its retries counts as one failed request, not a latency sample"""
+    rag = DynamicRAG()
+    rag.openai_client.embeddings.create = Mock(side_effect=Exception("API error"))
+    m = Metrics()
+    
+    with patch('rag_service.metrics', m):
+        rag.search("test query", "kb123")
+    
+    assert m.latencies["rag_search"].total == 0
+    assert m.get_windows()["rag_search"]["1m"]["error_rate"] == 1.0
+
 def test_search_no_results(mock_config, mock_search_client, mock_openai_client):
     """Test search with no results"""
     rag = DynamicRAG()
@@ -92,3 +108,46 @@ def test_search_no_results(mock_config, mock_search_client, mock_openai_client):
     
     result = rag.search("test query", "kb123")
     assert result is None
+
+def test_search_cache_hit(mock_config, mock_search_client, mock_openai_client):
+    """Test repeated queries are served from the cache"""
+    rag = DynamicRAG()
+    
+    mock_embedding = Mock()
+    mock_embedding.data = [Mock(embedding=[0.1] * 1536)]
+    rag.openai_client.embeddings.create = Mock(return_value=mock_embedding)
+    rag.search_client.search = Mock(return_value=[{"content": "Cached content"}])
+    
+    first = rag.search("Gold loan rates", "kb123")
+    second = rag.search("  gold LOAN rates ", "kb123")
+    
+    assert first == second
+    assert rag.openai_client.embeddings.create.call_count == 1
+
+def test_search_cache_skips_empty_results(mock_config, mock_search_client, mock_openai_client):
+    """Test empty results are not cached"""
+    rag = DynamicRAG()
+    
+    mock_embedding = Mock()
+    mock_embedding.data = [Mock(embedding=[0.1] * 1536)]
+    rag.openai_client.embeddings.create = Mock(return_value=mock_embedding)
+    rag.search_client.search = Mock(return_value=[])
+    
+    rag.search("test query", "kb123")
+    rag.search("test query", "kb123")
+    
+    assert rag.openai_client.embeddings.create.call_count == 2
+
+def test_search_cache_expiry_and_eviction():
+    """Test TTL expiry and LRU eviction"""
+    cache = SearchCache(max_size=2, ttl=60)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+    cache.set("c", "C")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    
+    with patch("rag_service.time.time", return_value=time.time() + 120):
+        assert cache.get("a") is None
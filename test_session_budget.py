@@ -0,0 +1,71 @@
+"""
+Tests for per-session budget enforcement
+"""
+from cost_tracker import CostTracker
+from session_budget import SessionBudget, EXHAUSTED, parse_steps
+
+def spend(tracker: CostTracker, text_output: int = 0, audio_output: int = 0):
+    tracker.add_usage({
+        "output_tokens": text_output + audio_output,
+        "output_token_details": {"text_tokens": text_output, "audio_tokens": audio_output}
+    })
+
+def test_parse_steps():
+    """Test step spec parsing and ordering"""
+    assert parse_steps("0.75:200, 0.5:400") == ((0.5, 400), (0.75, 200))
+    assert parse_steps("") == ()
+
+def test_responses_tighten_then_exhaust():
+    """Test caps shrink at each step and the limit reports exhaustion once"""
+    budget = SessionBudget("s1", max_tokens=1000, steps=parse_steps("0.5:400,0.75:200"))
+    tracker = CostTracker("s1", "kb1")
+    
+    spend(tracker, text_output=400)
+    assert budget.update(tracker) is None
+    spend(tracker, text_output=200)
+    assert budget.update(tracker) == 400
+    assert budget.update(tracker) is None  # same step, no new session.update
+    spend(tracker, text_output=200)
+    assert budget.update(tracker) == 200
+    spend(tracker, text_output=300)
+    assert budget.update(tracker) == EXHAUSTED
+    assert budget.update(tracker) is None
+    assert budget.remaining()["tokens"] == 0
+
+def test_usd_budget_uses_tracker_prices():
+    """Test a USD budget follows CostTracker's cost"""
+    budget = SessionBudget("s1", max_usd=0.10, steps=parse_steps("0.5:300"))
+    tracker = CostTracker("s1", "kb1")
+    
+    spend(tracker, audio_output=1000)  # $0.064
+    assert budget.update(tracker) == 300
+    remaining = budget.remaining()
+    assert remaining["usd"] == 0.036
+    assert remaining["fraction_used"] == 0.64
+
+def test_never_loosens_existing_cap():
+    """Test a step above an economy cap doesn't raise it"""
+    budget = SessionBudget("s1", max_tokens=100, steps=parse_steps("0.5:400"), max_output_tokens=150)
+    tracker = CostTracker("s1", "kb1")
+    
+    spend(tracker, text_output=60)
+    assert budget.update(tracker) is None
+    assert budget.max_output_tokens == 150
+
+def test_disabled_budget_is_inert():
+    """Test no limits means no actions"""
+    budget = SessionBudget("s1")
+    tracker = CostTracker("s1", "kb1")
+    spend(tracker, text_output=10_000)
+    
+    assert not budget.enabled
+    assert budget.update(tracker) is None
+
+def test_stable_prefix_farewell_keeps_instructions():
+    """Test the stable-prefix farewell doesn't override session instructions"""
+    from session_config import build_farewell_events
+    stable = build_farewell_events(stable_prefix=True)
+    
+    assert stable[0]["item"]["role"] == "system"
+    assert "instructions" not in stable[-1]["response"]
+    assert "instructions" in build_farewell_events(stable_prefix=False)[0]["response"]
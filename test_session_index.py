@@ -0,0 +1,121 @@
+"""
+Tests for the SQLite session index
+"""
+import json
+from unittest.mock import patch
+from session_index import SessionIndex, summarize
+from persistence import PersistenceService
+
+def document(session_id: str, start_time: str, kb_id: str = "kb1") -> dict:
+    return {
+        "session_id": session_id, "kb_id": kb_id, "start_time": start_time,
+        "duration_seconds": 12.5, "message_count": 3, "cost": {"cost_usd": 0.02}
+    }
+
+def test_listing_is_sorted_and_paginated():
+    """Test sessions come back newest first, one page at a time"""
+    index = SessionIndex(":memory:")
+    index.upsert_many([summarize(document(f"s{i}", f"2024-01-0{i}T10:00:00"), f"s{i}.json") for i in range(1, 6)])
+
+    first = index.list(limit=2)
+    second = index.list(limit=2, offset=2)
+
+    assert [row["session_id"] for row in first] == ["s5", "s4"]
+    assert [row["session_id"] for row in second] == ["s3", "s2"]
+    assert index.count() == 5
+
+def test_lookup_and_kb_filter():
+    """Test sessions are found by id and listings can be limited to one KB"""
+    index = SessionIndex(":memory:")
+    index.upsert(summarize(document("s1", "2024-01-01T10:00:00"), "s1.json"))
+    index.upsert(summarize(document("s2", "2024-01-02T10:00:00", kb_id="kb2"), "s2.json"))
+
+    assert index.get("s2")["filename"] == "s2.json"
+    assert index.get("missing") is None
+    assert [row["session_id"] for row in index.list(kb_id="kb2")] == ["s2"]
+    assert index.count(kb_id="kb1") == 1
+
+def test_rebuild_from_directory(tmp_path):
+    """Test an existing conversations directory can be indexed from scratch"""
+    for session_id in ("s1", "s2"):
+        with open(tmp_path / f"{session_id}_20240101_100000.json", "w") as f:
+            json.dump(document(session_id, "2024-01-01T10:00:00"), f)
+    (tmp_path / "broken.json").write_text("{")
+    index = SessionIndex(str(tmp_path / "index.sqlite3"))
+    index.upsert(summarize(document("stale", "2023-01-01T10:00:00"), "stale.json"))
+
+    assert index.rebuild(str(tmp_path)) == 2
+    assert index.get("stale") is None
+    assert index.get("s1")["cost_usd"] == 0.02
+
+def test_writer_indexes_saved_sessions(tmp_path):
+    """Test the persistence writer adds each session file it writes to the index"""
+    index = SessionIndex(":memory:")
+    service = PersistenceService(use_mongo=False)
+
+    with patch("persistence.session_index", index):
+        service.submit(document("s1", "2024-01-01T10:00:00"), str(tmp_path / "s1_20240101_100000.json"))
+
+    assert index.get("s1")["filename"] == "s1_20240101_100000.json"
+
+def test_cost_rollups_count_each_session_once():
+    """Test saving sessions updates day/KB rollups, and re-saving one doesn't double count"""
+    index = SessionIndex(":memory:")
+    saved = document("s1", "2024-01-01T10:00:00")
+    saved["cost"]["tokens"] = {"audio_output": 100}
+    index.upsert(summarize(saved, "s1.json"))
+    index.upsert(summarize(saved, "s1.json"))
+    index.upsert(summarize(document("s2", "2024-01-01T23:00:00"), "s2.json"))
+    index.upsert(summarize(document("s3", "2024-01-02T01:00:00", kb_id="kb2"), "s3.json"))
+
+    rows = index.cost_rollups(until="2024-01-01")
+
+    assert len(rows) == 1
+    assert rows[0]["sessions"] == 2
+    assert rows[0]["cost_usd"] == 0.04
+    assert rows[0]["tokens"]["audio_output"] == 100
+    assert index.cost_rollups(kb_id="kb2")[0]["day"] == "2024-01-02"
+
+def test_rebuild_backfills_cost_rollups(tmp_path):
+    """Test a rebuild recomputes the rollups from the session files"""
+    with open(tmp_path / "s1_20240101_100000.json", "w") as f:
+        json.dump(document("s1", "2024-01-01T10:00:00"), f)
+    index = SessionIndex(":memory:")
+    index.upsert(summarize(document("stale", "2023-01-01T10:00:00"), "stale.json"))
+
+    index.rebuild(str(tmp_path))
+
+    assert [(row["day"], row["sessions"]) for row in index.cost_rollups()] == [("2024-01-01", 1)]
+
+def transcript(session_id: str, *lines: str, query: str = None) -> dict:
+    saved = document(session_id, "2024-01-01T10:00:00")
+    saved["messages"] = [{"role": "user", "type": "text", "content": line} for line in lines]
+    saved["messages"].append({"role": "assistant", "type": "text", "content": "gold loan gold loan"})
+    if query:
+        saved["messages"].append({"role": "function", "type": "function_call", "content": "result",
+                                  "metadata": {"arguments": {"query": query}}})
+    return saved
+
+def test_search_ranks_visitor_transcripts():
+    """Test search matches every word of visitor text and search queries, best match first"""
+    index = SessionIndex(":memory:")
+    index.upsert(summarize(transcript("s1", "What is the gold loan rate?", "And for a gold loan top-up?"), "s1.json"))
+    index.upsert(summarize(transcript("s2", "I want a home loan"), "s2.json"))
+    index.upsert(summarize(transcript("s3", "Hi, which documents do I need to open a savings account at a branch near me?", query="gold loan interest"), "s3.json"))
+
+    hits = index.search("Gold loan!")
+
+    assert [hit["session_id"] for hit in hits] == ["s1", "s3"]
+    assert "[gold] [loan]" in hits[0]["snippet"].lower()
+    assert index.search("...") == []
+
+def test_search_entry_survives_archiving_and_retention():
+    """Test re-indexing without messages keeps the transcript, and retention removes it"""
+    index = SessionIndex(":memory:")
+    index.upsert(summarize(transcript("s1", "gold loan"), "s1.json"))
+
+    index.index_archived("segment.jsonl.gz", [document("s1", "2024-01-01T10:00:00")], [(0, 10)])
+    assert [hit["session_id"] for hit in index.search("gold")] == ["s1"]
+
+    index.remove_before("2024-02-01")
+    assert index.search("gold") == []
@@ -0,0 +1,114 @@
+"""
+Tests for the per-session journal and assembling saved sessions from it
+"""
+import os
+import json
+import time
+import socket
+import pytest
+from unittest.mock import patch
+from conversation_logger import ConversationLogger, find_orphaned_journals
+from persistence import PersistenceService
+from session_journal import SessionJournal, read_journal
+from session_index import SessionIndex
+
+@pytest.fixture(autouse=True)
+def session_index(tmp_path):
+    """Keep the writer's index rows out of the working tree"""
+    index = SessionIndex(str(tmp_path / "sessions.sqlite3"))
+    with patch("persistence.session_index", index):
+        yield index
+    index.close()
+
+def test_messages_stream_to_journal(tmp_path):
+    """Test logged messages go to disk, not into a list on the logger"""
+    convo = ConversationLogger("s1", "kb1", log_dir=str(tmp_path), journal_dir=str(tmp_path / "journal"))
+    convo.log_message("user", "hello")
+    convo.log_function_call("search_knowledge_base", {"query": "q"}, "result")
+    convo.journal.sync()
+
+    header, messages = read_journal(convo.journal.path)
+
+    assert header["kb_id"] == "kb1"
+    assert [m["role"] for m in messages] == ["user", "function"]
+    assert not hasattr(convo, "messages")
+    assert convo.get_summary()["function_calls"] == 1
+
+def test_save_assembles_document_from_journal(tmp_path):
+    """Test the saved file holds every journaled message and the journal is removed"""
+    convo = ConversationLogger("s1", "kb1", log_dir=str(tmp_path), journal_dir=str(tmp_path / "journal"))
+    for i in range(5):
+        convo.log_message("assistant", f"answer {i}")
+
+    with patch("conversation_logger.persistence", PersistenceService(use_mongo=False)):
+        filepath = convo.save({"cost_usd": 0.01})
+
+    with open(filepath) as f:
+        saved = json.load(f)
+    assert saved["message_count"] == 5
+    assert saved["messages"][4]["content"] == "answer 4"
+    assert not os.path.exists(convo.journal.path)
+
+def test_torn_last_line_is_skipped(tmp_path):
+    """Test a line cut short by a crash does not break reading the journal"""
+    path = str(tmp_path / "s1.jsonl")
+    journal = SessionJournal(path, header={"session_id": "s1"})
+    journal.append({"role": "user", "content": "hi"})
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"role": "assis')
+
+    _, messages = read_journal(path)
+
+    assert len(list(messages)) == 1
+
+def test_orphaned_journals_are_recovered(tmp_path):
+    """Test journals left by a dead worker become recoverable sessions, live ones are skipped"""
+    journal_dir = str(tmp_path / "journal")
+    for session_id in ("dead", "live"):
+        journal = SessionJournal(os.path.join(journal_dir, f"{session_id}.jsonl"),
+                                 header={"session_id": session_id, "kb_id": "kb1", "start_time": "2024-01-01T10:00:00"})
+        journal.append({"role": "user", "content": "hi"})
+        journal.close()
+    old = time.time() - 7200
+    os.utime(os.path.join(journal_dir, "dead.jsonl"), (old, old))
+
+    orphans = find_orphaned_journals(journal_dir, log_dir=str(tmp_path), older_than=3600)
+
+    assert len(orphans) == 1
+    document, filepath, _ = orphans[0]
+    assert document["session_id"] == "dead"
+    assert document["message_count"] == 1
+    assert document["recovered"] is True
+    assert filepath.endswith("dead_20240101_100000.json")
+
+def test_each_orphan_is_recovered_once(tmp_path):
+    """Test concurrent startups claim a journal once, and journals of running workers are left alone"""
+    journal_dir = str(tmp_path / "journal")
+    old = time.time() - 7200
+    for session_id, pid in (("dead", None), ("idle", os.getppid())):
+        path = os.path.join(journal_dir, f"{session_id}.jsonl")
+        journal = SessionJournal(path, header={"session_id": session_id, "kb_id": "kb1", "start_time": "2024-01-01T10:00:00",
+                                               "host": socket.gethostname(), "pid": pid})
+        journal.append({"role": "user", "content": "gold loan"})
+        journal.close()
+        os.utime(path, (old, old))
+
+    first = find_orphaned_journals(journal_dir, log_dir=str(tmp_path), older_than=3600)
+    second = find_orphaned_journals(journal_dir, log_dir=str(tmp_path), older_than=3600)
+
+    assert [document["session_id"] for document, _, _ in first] == ["dead"]
+    assert first[0][2].endswith(f"dead.jsonl.recovering-{os.getpid()}")
+    assert second == []
+    assert os.path.exists(os.path.join(journal_dir, "idle.jsonl"))
+
+def test_missing_journal_is_not_saved_empty(tmp_path):
+    """Test a session whose journal another worker already recovered is not overwritten with no messages"""
+    filepath = str(tmp_path / "s1.json")
+    with open(filepath, "w") as f:
+        json.dump({"session_id": "s1", "messages": [{"role": "user", "content": "gold loan"}]}, f)
+
+    PersistenceService(use_mongo=False).submit({"session_id": "s1"}, filepath, str(tmp_path / "gone.jsonl"))
+
+    with open(filepath) as f:
+        assert len(json.load(f)["messages"]) == 1
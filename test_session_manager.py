@@ -0,0 +1,98 @@
+"""
+Tests for session registry and idle reaper
+"""
+import base64
+import json
+import time
+import pytest
+from array import array
+from unittest.mock import AsyncMock, Mock
+from session_manager import SessionRegistry, IdleReaper, is_client_activity, audio_has_voice
+from monitoring import metrics
+
+def make_azure_ws():
+    ws = Mock()
+    ws.closed = False
+    async def close():
+        ws.closed = True
+    ws.close = AsyncMock(side_effect=close)
+    return ws
+
+def pcm16_b64(amplitude: int, samples: int = 480) -> str:
+    return base64.b64encode(array("h", [amplitude] * samples).tobytes()).decode()
+
+@pytest.mark.asyncio
+async def test_reaper_closes_idle_session():
+    """Test idle Azure sockets are closed and counted"""
+    registry = SessionRegistry()
+    session = registry.register("s1", "kb")
+    session.azure_ws = make_azure_ws()
+    reaper = IdleReaper(registry, idle_timeout=60, interval=1)
+    before = metrics.counters["idle_reaped_sessions"]
+
+    reaped = await reaper.reap_once(now=time.time() + 61)
+
+    assert reaped == 1
+    assert session.reaped
+    assert session.azure_ws.closed
+    assert registry.open_azure_sockets() == 0
+    assert metrics.counters["idle_reaped_sessions"] == before + 1
+
+@pytest.mark.asyncio
+async def test_reaper_skips_active_session():
+    """Test recent activity keeps the Azure socket open"""
+    registry = SessionRegistry()
+    session = registry.register("s1", "kb")
+    session.azure_ws = make_azure_ws()
+    reaper = IdleReaper(registry, idle_timeout=60, interval=1)
+
+    session.touch_user()
+    reaped = await reaper.reap_once(now=time.time() + 30)
+
+    assert reaped == 0
+    assert not session.reaped
+    assert registry.open_azure_sockets() == 1
+
+@pytest.mark.asyncio
+async def test_resume_clears_reaped_state():
+    """Test a resumed session gets a new socket and wakes waiters"""
+    registry = SessionRegistry()
+    session = registry.register("s1", "kb")
+    session.azure_ws = make_azure_ws()
+    await IdleReaper(registry, idle_timeout=0, interval=1).reap_once(now=time.time() + 1)
+
+    new_ws = make_azure_ws()
+    session.mark_resumed(new_ws)
+
+    assert not session.reaped
+    assert session.resumed.is_set()
+    assert session.azure_ws is new_ws
+    assert session.reaped_at is None
+
+def test_registry_stats():
+    """Test registry reports sessions and open sockets"""
+    registry = SessionRegistry()
+    registry.register("s1", "kb").azure_ws = make_azure_ws()
+    registry.register("s2", "kb")
+    registry.unregister("s2")
+
+    stats = registry.get_stats()
+    assert stats["active_sessions"] == 1
+    assert stats["open_azure_sockets"] == 1
+
+def test_audio_has_voice():
+    """Test peak check separates silence from speech"""
+    assert not audio_has_voice(pcm16_b64(10), threshold=1500)
+    assert audio_has_voice(pcm16_b64(5000), threshold=1500)
+    assert not audio_has_voice("not-base64!", threshold=1500)
+
+def test_is_client_activity():
+    """Test which client messages wake a reaped session"""
+    silent = json.dumps({"type": "input_audio_buffer.append", "audio": pcm16_b64(0)})
+    loud = json.dumps({"type": "input_audio_buffer.append", "audio": pcm16_b64(8000)})
+    text = json.dumps({"type": "conversation.item.create", "item": {}})
+
+    assert not is_client_activity(silent, 1500)
+    assert is_client_activity(loud, 1500)
+    assert is_client_activity(text, 1500)
+    assert not is_client_activity(json.dumps({"type": "session.close"}), 1500)
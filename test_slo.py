@@ -0,0 +1,64 @@
+"""
+Tests for SLO burn-rate evaluation
+"""
+import time
+from monitoring import Metrics
+from slo import SLO, evaluate_slos
+
+def test_latency_slo_burn_rate():
+    """Test burn rate is the slow fraction over the error budget"""
+    m = Metrics()
+    for _ in range(90):
+        m.record_latency("rag_search", 0.2)
+    for _ in range(10):
+        m.record_latency("rag_search", 1.5)
+    
+    result = SLO("rag_latency", "rag_search", 0.95, latency_threshold=0.8).evaluate(m)
+    
+    assert result["burn_rate"]["1m"] == 2.0
+    assert result["status"] == "warning"
+
+def test_availability_slo_breach():
+    """Test a failure spike in both short windows is a breach"""
+    m = Metrics()
+    for ok in [True] * 5 + [False] * 5:
+        m.record_event("session_connect", ok=ok)
+    
+    result = SLO("session_connect", "session_connect", 0.99).evaluate(m)
+    
+    assert result["burn_rate"]["5m"] == 50.0
+    assert result["status"] == "breach"
+
+def test_quiet_operations_have_no_burn_rate():
+    """Test SLOs with too few events report no burn rate"""
+    m = Metrics()
+    m.record_event("session_connect", ok=False)
+    
+    results = evaluate_slos(m, now=time.time())
+    
+    assert results["session_connect"]["burn_rate"]["1m"] is None
+    assert all(r["status"] == "ok" for r in results.values())
+
+def test_all_failed_operations_burn_the_budget():
+    """Test an operation that only fails has error rate 1.0, not no data"""
+    m = Metrics()
+    for _ in range(20):
+        m.record_error("rag_search_failed", operation="rag_search")
+    
+    result = SLO("rag_availability", "rag_search", 0.99).evaluate(m)
+    
+    assert m.get_windows()["rag_search"]["1m"]["error_rate"] == 1.0
+    assert result["burn_rate"]["1m"] == 100.0
+    assert result["status"] == "breach"
+
+def test_half_failed_operations():
+    """Test failures count as requests, so 10 ok and 10 failed is a 50% error rate"""
+    m = Metrics()
+    for _ in range(10):
+        m.record_latency("rag_search", 0.2)
+        m.record_error("rag_search_failed", operation="rag_search")
+    
+    result = SLO("rag_availability", "rag_search", 0.9).evaluate(m)
+    
+    assert m.get_windows()["rag_search"]["1m"]["error_rate"] == 0.5
+    assert result["burn_rate"]["1m"] == 5.0
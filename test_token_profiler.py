@@ -0,0 +1,65 @@
+"""
+Tests for the input-token composition profiler
+"""
+from monitoring import Metrics
+import token_profiler
+import sys
+from unittest.mock import patch
+from token_profiler import TokenProfiler, instruction_tokens, estimate_tokens, composition_by_kb
+
+INSTRUCTION_TOKENS = instruction_tokens()
+
+def usage(text: int, audio: int = 0) -> dict:
+    return {"input_tokens": text + audio, "input_token_details": {"text_tokens": text, "audio_tokens": audio}}
+
+def test_estimator_without_tokenizer(monkeypatch):
+    """Test the chars/4 fallback"""
+    monkeypatch.setattr(token_profiler, "_encoding", None)
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400) == 100
+
+def test_encoding_loaded_on_first_use(monkeypatch):
+    """Test the tokenizer is loaded lazily and a failed load falls back to the estimate"""
+    monkeypatch.setattr(token_profiler, "_encoding", token_profiler._UNLOADED)
+    with patch.dict(sys.modules, {"tiktoken": None}):  # import fails
+        assert estimate_tokens("a" * 400) == 100
+    assert token_profiler._encoding is None
+
+def test_turn_split_into_components():
+    """Test instructions and injected RAG are carved out of text input"""
+    profiler = TokenProfiler("s1", "kb1")
+    profiler.rag_tokens = 300
+    
+    turn = profiler.on_response_done(usage(INSTRUCTION_TOKENS + 500, audio=1000))
+    
+    assert turn["tokens"] == {
+        "instructions": INSTRUCTION_TOKENS,
+        "rag_context": 300,
+        "text_history": 200,
+        "audio_history": 1000
+    }
+    assert abs(sum(turn["share"].values()) - 1.0) < 0.01
+
+def test_estimates_never_exceed_billed_text():
+    """Test over-estimates are clamped to what Azure billed"""
+    profiler = TokenProfiler("s1", "kb1")
+    profiler.add_rag_context("x" * 100_000)
+    
+    turn = profiler.on_response_done(usage(INSTRUCTION_TOKENS + 50))
+    
+    assert turn["tokens"]["rag_context"] == 50
+    assert turn["tokens"]["text_history"] == 0
+    assert profiler.on_response_done(None) is None
+
+def test_aggregates_by_kb(monkeypatch):
+    """Test per-KB shares come from the labelled counters"""
+    source = Metrics()
+    monkeypatch.setattr(token_profiler, "metrics", source)
+    profiler = TokenProfiler("s1", "kb1")
+    profiler.on_response_done(usage(INSTRUCTION_TOKENS, audio=INSTRUCTION_TOKENS))
+    
+    stats = composition_by_kb(source)
+    
+    assert stats["kb1"]["share"]["instructions"] == 0.5
+    assert stats["kb1"]["share"]["audio_history"] == 0.5
+    assert profiler.get_summary()["turns"] == 1
@@ -0,0 +1,78 @@
+"""
+Tests for per-turn latency timeline
+"""
+from unittest.mock import patch
+from turn_timeline import TurnTimeline
+from monitoring import metrics
+
+def run_turn(timeline, clock, stages):
+    """Feed (stage, seconds) pairs through a fake monotonic clock"""
+    for stage, at in stages:
+        clock.return_value = at
+        if stage == "speech_stopped":
+            timeline.start()
+        elif stage == "response_done":
+            return timeline.finish()
+        else:
+            timeline.mark(stage)
+
+def test_full_turn_durations():
+    """Test stage durations for a turn with a RAG function call"""
+    timeline = TurnTimeline("test-session")
+    with patch("turn_timeline.time.monotonic") as clock:
+        turn = run_turn(timeline, clock, [
+            ("speech_stopped", 10.0),
+            ("transcription_completed", 10.4),
+            ("function_call_done", 10.6),
+            ("rag_done", 11.1),
+            ("response_create_sent", 11.15),
+            ("first_audio_delta", 11.65),
+            ("response_done", 14.0)
+        ])
+
+    assert turn["turn"] == 1
+    durations = turn["durations_ms"]
+    assert durations["rag"] == 500.0
+    assert durations["first_audio"] == 500.0
+    assert durations["speech_to_first_audio"] == 1650.0
+    assert durations["total"] == 4000.0
+    assert turn["offsets_ms"]["first_audio_delta"] == 1650.0
+    assert "turn_speech_to_first_audio" in metrics.get_stats()["latency_percentiles"]
+
+def test_turn_without_function_call():
+    """Test turns answered directly skip the RAG stages"""
+    timeline = TurnTimeline("test-session")
+    with patch("turn_timeline.time.monotonic") as clock:
+        turn = run_turn(timeline, clock, [
+            ("speech_stopped", 0.0),
+            ("first_audio_delta", 0.8),
+            ("response_done", 2.0)
+        ])
+
+    assert turn["durations_ms"]["speech_to_first_audio"] == 800.0
+    assert "rag" not in turn["durations_ms"]
+
+def test_function_call_response_does_not_close_turn():
+    """Test the tool-call response.done (no audio yet) keeps the turn open"""
+    timeline = TurnTimeline("test-session")
+    timeline.start()
+    timeline.mark("function_call_done")
+
+    assert timeline.finish() is None
+    assert timeline.active
+
+def test_first_occurrence_wins():
+    """Test repeated audio deltas keep the first timestamp"""
+    timeline = TurnTimeline("test-session")
+    with patch("turn_timeline.time.monotonic") as clock:
+        clock.return_value = 0.0
+        timeline.start()
+        clock.return_value = 1.0
+        timeline.mark("first_audio_delta")
+        clock.return_value = 1.5
+        timeline.mark("first_audio_delta")
+        clock.return_value = 2.0
+        turn = timeline.finish()
+
+    assert turn["offsets_ms"]["first_audio_delta"] == 1000.0
+    assert not timeline.active
@@ -0,0 +1,70 @@
+"""
+Text-only question answering over the same RAG pipeline as the voice relay
+"""
+from typing import AsyncIterator, Optional
+from openai import AsyncAzureOpenAI
+from config import Config
+from session_config import SESSION_INSTRUCTIONS, TEXT_MODE_INSTRUCTIONS
+import logging
+
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT = "No relevant information found."
+
+class TextAnswerer:
+    def __init__(self):
+        try:
+            self.client = AsyncAzureOpenAI(
+                api_key=Config.AZURE_OPENAI_API_KEY,
+                azure_endpoint=f"https://{Config.AZURE_RESOURCE}.openai.azure.com",
+                api_version=Config.AZURE_OPENAI_CHAT_API_VERSION
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize chat client: {e}")
+            raise
+    
+    @staticmethod
+    def build_messages(question: str, context: Optional[str]) -> list:
+        """Static instructions first, per-question context after"""
+        return [
+            {"role": "system", "content": f"{SESSION_INSTRUCTIONS}\n\n{TEXT_MODE_INSTRUCTIONS}"},
+            {"role": "system", "content": f"Knowledge base search results:\n\n{context or NO_CONTEXT}"},
+            {"role": "user", "content": question}
+        ]
+    
+    async def answer(self, question: str, context: Optional[str]) -> dict:
+        """Single-shot answer with token usage"""
+        completion = await self.client.chat.completions.create(
+            model=Config.AZURE_OPENAI_CHAT_DEPLOYMENT,
+            messages=self.build_messages(question, context),
+            max_tokens=Config.ASK_MAX_OUTPUT_TOKENS
+        )
+        usage = completion.usage
+        return {
+            "answer": completion.choices[0].message.content or "",
+            "usage": {
+                "input_tokens": usage.prompt_tokens if usage else 0,
+                "output_tokens": usage.completion_tokens if usage else 0
+            }
+        }
+    
+    async def stream(self, question: str, context: Optional[str]) -> AsyncIterator[dict]:
+        """Yield {"delta": text} chunks, then a final {"usage": {...}}"""
+        stream = await self.client.chat.completions.create(
+            model=Config.AZURE_OPENAI_CHAT_DEPLOYMENT,
+            messages=self.build_messages(question, context),
+            max_tokens=Config.ASK_MAX_OUTPUT_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        async for chunk in stream:
+            if chunk.usage:
+                usage = {
+                    "input_tokens": chunk.usage.prompt_tokens,
+                    "output_tokens": chunk.usage.completion_tokens
+                }
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    yield {"delta": choice.delta.content}
+        yield {"usage": usage or {"input_tokens": 0, "output_tokens": 0}}
@@ -0,0 +1,120 @@
+"""
+Per-turn input-token composition: instructions vs conversation history vs injected RAG context
+"""
+import json
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional
+import logging
+from monitoring import metrics
+from session_config import SESSION_INSTRUCTIONS, SEARCH_TOOL
+
+logger = logging.getLogger(__name__)
+
+_UNLOADED = object()
+_encoding = _UNLOADED  # loaded on first use: get_encoding may download the BPE file
+
+COMPONENTS = ("instructions", "rag_context", "text_history", "audio_history")
+
+def get_encoding():
+    """The GPT-4o tokenizer, or None when tiktoken or its encoding file is unavailable"""
+    global _encoding
+    if _encoding is _UNLOADED:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")  # GPT-4o family
+        except Exception as e:  # Not installed, or the encoding can't be downloaded
+            logger.warning(f"[TOKENS] tiktoken unavailable, estimating 4 chars per token: {e}")
+            _encoding = None
+    return _encoding
+
+def estimate_tokens(text: str) -> int:
+    """Exact with tiktoken when available, otherwise ~4 characters per token"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+@lru_cache(maxsize=1)
+def instruction_tokens() -> int:
+    """Static prefix of every Realtime prompt"""
+    return estimate_tokens(SESSION_INSTRUCTIONS) + estimate_tokens(json.dumps(SEARCH_TOOL))
+
+class TokenProfiler:
+    """Splits each response's billed input tokens into components
+
+    Azure only reports text vs audio input, so the known pieces (instructions,
+    RAG output we injected) are estimated locally and the rest of the text is
+    attributed to conversation history.
+    """
+    def __init__(self, session_id: str, kb_id: str):
+        self.session_id = session_id
+        self.kb_id = kb_id
+        self.rag_tokens = 0  # RAG output currently in the Azure conversation
+        self.turns = 0
+        self.totals = defaultdict(int)
+
+    def add_rag_context(self, output: str):
+        self.rag_tokens += estimate_tokens(output)
+
+    def reset_conversation(self):
+        """A fresh Azure conversation (reconnect) starts without the old RAG items"""
+        self.rag_tokens = 0
+
+    def on_response_done(self, usage: Optional[dict]) -> Optional[dict]:
+        if not usage:
+            return None
+        details = usage.get("input_token_details", {})
+        text = details.get("text_tokens", usage.get("input_tokens", 0))
+        audio = details.get("audio_tokens", 0)
+        total = text + audio
+        if not total:
+            return None
+
+        instructions = min(instruction_tokens(), text)
+        rag_context = min(self.rag_tokens, text - instructions)
+        tokens = {
+            "instructions": instructions,
+            "rag_context": rag_context,
+            "text_history": text - instructions - rag_context,
+            "audio_history": audio
+        }
+        self.turns += 1
+        for component, count in tokens.items():
+            self.totals[component] += count
+            if count:
+                metrics.increment("input_token_composition", count,
+                                  labels={"component": component, "kb_id": self.kb_id or "unknown"})
+        return {
+            "turn": self.turns,
+            "input_tokens": total,
+            "tokens": tokens,
+            "share": {component: round(count / total, 3) for component, count in tokens.items()}
+        }
+
+    def get_summary(self) -> dict:
+        total = sum(self.totals.values())
+        return {
+            "turns": self.turns,
+            "tokens": dict(self.totals),
+            "share": {c: round(self.totals[c] / total, 3) for c in COMPONENTS} if total else {}
+        }
+
+def composition_by_kb(source=metrics) -> dict:
+    """Process-wide input-token shares per KB"""
+    per_kb = defaultdict(lambda: dict.fromkeys(COMPONENTS, 0))
+    for (metric, labels), value in list(source.labeled_counters.items()):
+        if metric != "input_token_composition":
+            continue
+        label_map = dict(labels)
+        per_kb[label_map.get("kb_id", "unknown")][label_map["component"]] += value
+    result = {}
+    for kb_id, tokens in per_kb.items():
+        total = sum(tokens.values())
+        result[kb_id] = {
+            "tokens": tokens,
+            "share": {c: round(count / total, 3) for c, count in tokens.items()} if total else {}
+        }
+    return result
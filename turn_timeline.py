@@ -0,0 +1,83 @@
+"""
+Per-turn latency timeline: visitor stops speaking -> avatar starts talking
+"""
+import time
+from datetime import datetime
+from typing import Optional
+import logging
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class TurnTimeline:
+    # Relay events in the order they normally happen within a turn
+    STAGES = (
+        "speech_stopped",
+        "transcription_completed",
+        "function_call_done",
+        "rag_done",
+        "response_create_sent",
+        "first_audio_delta",
+        "response_done"
+    )
+
+    # name -> (from stage, to stage)
+    DURATIONS = {
+        "transcription": ("speech_stopped", "transcription_completed"),
+        "function_call": ("speech_stopped", "function_call_done"),
+        "rag": ("function_call_done", "rag_done"),
+        "response_create": ("rag_done", "response_create_sent"),
+        "first_audio": ("response_create_sent", "first_audio_delta"),
+        "speech_to_first_audio": ("speech_stopped", "first_audio_delta"),
+        "audio_streaming": ("first_audio_delta", "response_done"),
+        "total": ("speech_stopped", "response_done")
+    }
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turn_count = 0
+        self.started_at = None
+        self.marks = None
+
+    @property
+    def active(self) -> bool:
+        return self.marks is not None
+
+    def start(self):
+        """Visitor stopped speaking: begin a new turn (drops an unfinished one)"""
+        self.started_at = datetime.utcnow()
+        self.marks = {"speech_stopped": time.monotonic()}
+
+    def mark(self, stage: str):
+        """Record the first occurrence of a stage in the current turn"""
+        if self.marks is not None and stage not in self.marks:
+            self.marks[stage] = time.monotonic()
+
+    def finish(self) -> Optional[dict]:
+        """Close the turn on response.done once audio has started"""
+        if self.marks is None or "first_audio_delta" not in self.marks:
+            return None
+        self.mark("response_done")
+        self.turn_count += 1
+
+        durations = {}
+        for name, (start, end) in self.DURATIONS.items():
+            if start in self.marks and end in self.marks:
+                durations[name] = round((self.marks[end] - self.marks[start]) * 1000, 1)
+                metrics.record_latency(f"turn_{name}", durations[name] / 1000)
+
+        origin = self.marks["speech_stopped"]
+        timeline = {
+            "turn": self.turn_count,
+            "started_at": self.started_at.isoformat(),
+            "offsets_ms": {
+                stage: round((self.marks[stage] - origin) * 1000, 1)
+                for stage in self.STAGES if stage in self.marks
+            },
+            "durations_ms": durations
+        }
+        self.marks = None
+
+        logger.info(f"[TURN] Session {self.session_id} turn {self.turn_count}: "
+                    f"{durations.get('speech_to_first_audio')}ms to first audio")
+        return timeline